@@ -0,0 +1,215 @@
+"""
+Time each stage of extraction on synthetic volumes of increasing size, and compare against an earlier run
+    python -m benchmarks.bench_extraction --pages 10 1000 10000 --out bench_extraction.json
+    python -m benchmarks.bench_extraction --pages 10 1000 --compare bench_extraction.json
+Volumes are made with benchmarks.synthetic_xml. Pages are parsed in batches and their trees dropped once their lines
+are extracted, so a 10k page volume doesn't have to fit in memory as trees. Language detection runs at around a
+hundred lines a second, so split_by_language is timed on the first --language-entries entries only, see items.
+"""
+import os
+import sys
+import json
+import shutil
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from functools import partialmethod
+import pandas as pd
+from tqdm import tqdm
+import src.data.xml_extraction as xmle
+from src.data.language import LanguageDetector
+from src.data.reimport_utils import converters, read_entries_csv
+from benchmarks.synthetic_xml import generate_volume
+
+RESULTS_VERSION = 1
+
+
+class _Timings:
+    """
+    Seconds and items processed for each stage, summed over every time the stage is run
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def time(self, stage: str, items: int):
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        totals = self.stages.setdefault(stage, {"seconds": 0.0, "items": 0})
+        totals["seconds"] += seconds
+        totals["items"] += items
+
+    def results(self) -> dict[str: dict]:
+        return {stage: {**totals, "per_second": totals["items"] / totals["seconds"] if totals["seconds"] else 0.0}
+                for stage, totals in self.stages.items()}
+
+
+def bench_volume(xmls: list[str], batch_pages: int = 500, language_entries: int = 200) -> dict[str: dict]:
+    """
+    Run extraction on a volume, timing each stage
+    :param xmls: list[str]: page xmls of one volume
+    :param batch_pages: int: pages parsed into trees at once
+    :param language_entries: int: entries split by language
+    :return: dict[str: dict]: seconds, items and items per second of each stage, items are pages for the parsing
+             stages, lines for the line stages and entries for the entry table stages
+    """
+    timings = _Timings()
+    xmls = xmle._sort_xmls(xmls)
+
+    page_lines = {}
+    for i in range(0, len(xmls), batch_pages):
+        batch = xmls[i: i + batch_pages]
+        with timings.time("gen_xml_trees", len(batch)):
+            roots = xmle.gen_xml_trees(batch)
+        with timings.time("extract_lines", len(batch)):
+            page_lines.update((label, xmle.extract_lines(root)) for label, root in roots.items())
+        del roots
+
+    n_lines = sum(len(x) for x in page_lines.values())
+    with timings.time("extract_lines_for_vol", n_lines):
+        lines, xml_track_df = xmle.extract_lines_for_vol(page_lines)
+    with timings.time("find_headings", n_lines):
+        title_shelfmarks, title_indices, ordered_lines = xmle.find_headings(lines)
+    with timings.time("extract_catalogue_entries", len(title_indices)):
+        entry_df = xmle.extract_catalogue_entries(ordered_lines, title_indices, title_shelfmarks, xml_track_df)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "catalogue_entries.csv")
+        with timings.time("to_csv", len(entry_df)):
+            entry_df.to_csv(csv_path)
+        with timings.time("reimport_converters", len(entry_df)):
+            csv_converters = {k: v for k, v in converters.items() if k in entry_df.columns}
+            pd.read_csv(csv_path, converters=csv_converters, index_col=0)
+        with timings.time("read_entries_csv", len(entry_df)):
+            read_entries_csv(csv_path)
+
+    entries = [x for x in entry_df["entry"][:language_entries] if len(x) > 2]
+    detector = LanguageDetector()  # a fresh cache, so every line is detected
+    with timings.time("split_by_language", sum(len(x) for x in entries)):
+        for entry, languages in zip(entries, detector.detect_entries(entries)):
+            xmle.split_by_language(entry, languages)
+
+    return timings.results()
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(pages: list[int], corpus_dir: str | os.PathLike | None = None, batch_pages: int = 500,
+        language_entries: int = 200, **volume_kwargs) -> dict:
+    """
+    Benchmark extraction of a synthetic volume of each size
+    :param pages: list[int]: volume sizes in pages
+    :param corpus_dir: str | os.PathLike | None: keep the volumes in <corpus_dir>/pages_<n> and reuse them when
+                       run again with the same arguments, None to generate them in a temporary directory
+    :param batch_pages: int
+    :param language_entries: int
+    :param volume_kwargs: passed to generate_volume
+    :return: dict: the run's environment and settings, and the stage results of each size
+    """
+    report = {"version": RESULTS_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": _git_commit(),
+              "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+              "settings": {"batch_pages": batch_pages, "language_entries": language_entries, **volume_kwargs},
+              "results": {}}
+
+    for n_pages in pages:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_root = tmp_dir if corpus_dir is None else os.path.join(corpus_dir, f"pages_{n_pages}")
+            xmls = _cached_volume(data_root, n_pages, volume_kwargs)
+            report["results"][str(n_pages)] = bench_volume(xmls, batch_pages, language_entries)
+        _print_results(n_pages, report["results"][str(n_pages)])
+
+    return report
+
+
+def _cached_volume(data_root: str | os.PathLike, n_pages: int, volume_kwargs: dict) -> list[str]:
+    settings_path = os.path.join(data_root, "synthetic.json")
+    settings = json.loads(json.dumps({"n_pages": n_pages, **volume_kwargs}))  # tuples as they read back, as lists
+    try:
+        with open(settings_path, encoding="utf-8") as f:
+            if json.load(f) == settings:
+                return xmle.gen_xml_paths(os.path.join(data_root, "BMC_*_[24]", "*", "*.pxml"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    shutil.rmtree(data_root, ignore_errors=True)  # pages of other settings may be in the other column's folder
+    xmls, _ = generate_volume(data_root, n_pages, **volume_kwargs)
+    with open(settings_path, "w", encoding="utf-8") as f:
+        json.dump(settings, f)
+    return xmls
+
+
+def _print_results(n_pages: int, results: dict[str: dict]) -> None:
+    print(f"{n_pages} pages")
+    for stage, result in results.items():
+        print(f"  {stage:<26} {result['seconds']:9.3f}s {result['items']:9} items {result['per_second']:12.1f}/s")
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.2) -> list[str]:
+    """
+    The stages that ran slower than in an earlier report, by items per second so sizes run with different settings
+    can still be compared
+    :param report: dict: as returned by run
+    :param baseline: dict: an earlier report
+    :param tolerance: float: the fraction slower a stage may be before it counts as a regression
+    :return: list[str]: a description of each regression
+    """
+    regressions = []
+    for n_pages, results in report["results"].items():
+        for stage, result in results.items():
+            before = baseline["results"].get(n_pages, {}).get(stage)
+            if not before or not before["per_second"] or not result["per_second"]:
+                continue
+            ratio = before["per_second"] / result["per_second"]
+            print(f"{n_pages} pages {stage:<26} {ratio:6.2f}x the time of {baseline.get('commit')}")
+            if ratio > 1 + tolerance:
+                regressions.append(f"{stage} at {n_pages} pages: {result['per_second']:.1f}/s, "
+                                   f"was {before['per_second']:.1f}/s")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--out", default=None, help="write the results to this json")
+    parser.add_argument("--compare", default=None, help="an earlier results json to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="fraction slower that counts as a regression")
+    parser.add_argument("--corpus-dir", default=None, help="keep generated volumes here to reuse")
+    parser.add_argument("--batch-pages", type=int, default=500)
+    parser.add_argument("--language-entries", type=int, default=200)
+    parser.add_argument("--four-region-fraction", type=float, default=0.1)
+    parser.add_argument("--lines-per-region", type=int, nargs=2, default=[50, 65])
+    parser.add_argument("--words-per-line", type=int, nargs=2, default=[5, 11])
+    parser.add_argument("--shelfmark-density", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+    report = run(args.pages, args.corpus_dir, args.batch_pages, args.language_entries,
+                 four_region_fraction=args.four_region_fraction, lines_per_region=args.lines_per_region,
+                 words_per_line=args.words_per_line, shelfmark_density=args.shelfmark_density, seed=args.seed)
+
+    if args.out is not None:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    if args.compare is not None:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Slower: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Time re-opening a processed volume and reading every entry's text from its LineStore, against loading its
+catalogue_entries.parquet, and the memory each holds
+    python -m benchmarks.bench_line_store --pages 1000
+The volume is synthetic, see benchmarks.synthetic_xml, processed once with update_volume to a temporary directory.
+"""
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+from functools import partialmethod
+from tqdm import tqdm
+from src.data.incremental import update_volume, entries_name
+from src.data.entry_store import load_entries
+from src.data.line_store import LineStore, lines_name
+from benchmarks.synthetic_xml import generate_volume
+
+
+def measure(fn) -> tuple[float, int, object]:
+    """
+    Seconds fn takes, the most memory it allocates, and its result
+    """
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+def entry_texts(store: LineStore, titles: list[list[int]]) -> list[str]:
+    starts = [title[0] for title in titles]
+    return [store.text(start, stop) for start, stop in zip(starts, starts[1:] + [len(store)])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    args = parser.parse_args()
+
+    tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        xmls, _ = generate_volume(os.path.join(tmp, "raw"), args.pages)
+        out_dir = os.path.join(tmp, "BMC_3")
+        update_volume(xmls, out_dir)
+        titles = load_entries(os.path.join(out_dir, entries_name), columns=["title"])["title"].tolist()
+
+        def from_parquet():
+            return load_entries(os.path.join(out_dir, entries_name))["entry_text"].tolist()
+
+        def from_store():
+            with LineStore(os.path.join(out_dir, lines_name)) as store:
+                return entry_texts(store, titles)
+
+        def open_store():
+            return LineStore(os.path.join(out_dir, lines_name))
+
+        parquet_seconds, parquet_peak, expected = measure(from_parquet)
+        store_seconds, store_peak, texts = measure(from_store)
+        open_seconds, open_peak, store = measure(open_store)
+        assert texts == expected
+        print(f"{args.pages} pages, {len(store)} lines, {len(titles)} entries, "
+              f"store {os.path.getsize(os.path.join(out_dir, lines_name)) / 2 ** 20:.1f}MB")
+        print(f"load_entries: {parquet_seconds:.3f}s, {parquet_peak / 2 ** 20:.1f}MB allocated")
+        print(f"LineStore entry texts: {store_seconds:.3f}s, {store_peak / 2 ** 20:.1f}MB allocated")
+        print(f"LineStore open: {open_seconds * 1000:.2f}ms, {open_peak / 2 ** 10:.1f}KB allocated")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
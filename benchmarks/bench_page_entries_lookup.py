@@ -0,0 +1,80 @@
+"""
+Time gen_page_entries_lookup against the pairwise list concatenation it replaced, on a synthetic entry table
+    python -m benchmarks.bench_page_entries_lookup --entries 5000
+"""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from src.data.word_coords import WordCoords
+from src.visualise.entry import gen_page_entries_lookup, split_word_locs
+
+
+def synthetic_entries(n_entries: int, lines_per_page: int = 60, seed: int = 0) -> pd.DataFrame:
+    """
+    An entry table shaped like extract_catalogue_entries output, entries of 3 to 30 lines running across pages
+    Word locations view one WordCoords, as they do after extraction
+    """
+    rng = np.random.default_rng(seed)
+    entry_lengths = rng.integers(3, 31, n_entries)
+    n_lines = int(entry_lengths.sum())
+    words_per_line = rng.integers(1, 12, n_lines)
+    points = rng.integers(0, 5000, 4 * int(words_per_line.sum()))
+    coords = WordCoords.from_counts(points, words_per_line, [2] * int(words_per_line.sum()))
+
+    starts = np.concatenate([[0], np.cumsum(entry_lengths)[:-1]])
+    xmls, xml_start_lines, word_locations = [], [], []
+    for start, length in zip(starts.tolist(), entry_lengths.tolist()):
+        first_page, last_page = start // lines_per_page, (start + length - 1) // lines_per_page
+        xmls.append([f"J_2704_aa_30_8_{p:04}_2" for p in range(first_page + 1, last_page + 2)])
+        if first_page == last_page:
+            xml_start_lines.append([length])
+        else:
+            breaks = [(p + 1) * lines_per_page - start for p in range(first_page, last_page)]
+            xml_start_lines.append(breaks + [length])
+        word_locations.append([coords.line(i) for i in range(start, start + length)])
+
+    return pd.DataFrame(data={"xmls": xmls, "xml_start_line": xml_start_lines, "vol_entry_num": range(n_entries),
+                              "word_locations": word_locations})
+
+
+def sum_page_entries_lookup(df):
+    """
+    gen_page_entries_lookup as it was, concatenating lists with sum
+    """
+    xml_list = df["xmls"].sum()
+    word_locs_split = df.apply(split_word_locs, axis=1).sum()
+
+    page_entries_df = pd.DataFrame(data={"xml": xml_list, "word_locs": word_locs_split})
+    page_entries_df["word_locs"] = page_entries_df["word_locs"].apply(lambda x: [x])
+
+    page_entries_lookup = page_entries_df.groupby(by="xml", as_index=False).sum()
+    pages_non_zeroed = page_entries_lookup["xml"].apply(lambda x: int(x.split("_")[-2]))
+    page_entries_lookup["page"] = (pages_non_zeroed - (pages_non_zeroed.min() - 1)).values
+    page_entries_lookup["n_entries"] = page_entries_lookup["word_locs"].apply(len)
+    return page_entries_lookup.set_index("page")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, nargs="+", default=[2000, 8000, 32000])
+    args = parser.parse_args()
+
+    for n_entries in args.entries:
+        df = synthetic_entries(n_entries)
+        start = time.perf_counter()
+        lookup = gen_page_entries_lookup(df)
+        linear = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = sum_page_entries_lookup(df)
+        pairwise = time.perf_counter() - start
+
+        assert lookup["xml"].tolist() == expected["xml"].tolist()
+        assert lookup["word_locs"].tolist() == expected["word_locs"].tolist()
+        assert lookup.index.tolist() == expected.index.tolist()
+        assert lookup["n_entries"].tolist() == expected["n_entries"].tolist()
+        print(f"{n_entries} entries, {len(lookup)} pages: {linear:.3f}s, with sum {pairwise:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
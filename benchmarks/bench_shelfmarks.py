@@ -0,0 +1,79 @@
+"""
+Time find_shelfmark, which only runs the shelfmark regexes where a line holds a candidate, against running all three
+on every line as it did, and check they find the same shelfmarks
+    python -m benchmarks.bench_shelfmarks --data-root data/raw --synthetic-lines 100000
+Lines are those of every volume under the data root, synthetic catalogue lines, and the shelfmarks of
+bll01_index.csv, as test_sm_detection reads them, if it is there.
+"""
+import os
+import glob
+import time
+import argparse
+from functools import partialmethod
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+import src.data.xml_extraction as xmle
+from benchmarks.synthetic_xml import catalogue_lines
+
+
+def volume_lines(data_root: str) -> list[str]:
+    xmls = glob.glob(os.path.join(data_root, "BMC_*_[24]", "*", "*.pxml"))
+    return [str(line) for _, lines in xmle.iter_vol_lines(xmls) for line in lines] if xmls else []
+
+
+def synthetic_lines(n_lines: int, seed: int = 0) -> list[str]:
+    lines = catalogue_lines(np.random.default_rng(seed), (5, 11), 0.05, [])
+    return [next(lines) for _ in range(n_lines)]
+
+
+def bll01_lines(path: str) -> list[str]:
+    if not os.path.exists(path):
+        return []
+    shelfmarks = pd.read_csv(path, encoding="latin-1")["British Library shelfmark (852 $j)"].dropna().tolist()
+    return shelfmarks + ["(" + x for x in shelfmarks]  # as test_sm_detection searches them for C and G shelfmarks
+
+
+def regex_shelfmark(line: str) -> str | None:
+    """
+    find_shelfmark as it was, every regex searched in turn
+    """
+    return xmle._find_shelfmark(line, [xmle.i_re, xmle.g_re, xmle.c_re])
+
+
+def lines_per_second(fn, lines: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        [fn(line) for line in lines]
+        best = min(best, time.perf_counter() - start)
+    return len(lines) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-root", default=os.path.join("data", "raw"))
+    parser.add_argument("--bll01", default=os.path.join("data", "processed", "bll01_index.csv"))
+    parser.add_argument("--synthetic-lines", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+    corpora = {"volumes": volume_lines(args.data_root), "synthetic": synthetic_lines(args.synthetic_lines),
+               "bll01": bll01_lines(args.bll01)}
+
+    for name, lines in corpora.items():
+        if not lines:
+            print(f"{name}: no lines, skipped")
+            continue
+        expected = [regex_shelfmark(line) for line in lines]
+        assert [xmle.find_shelfmark(line) for line in lines] == expected
+        before = lines_per_second(regex_shelfmark, lines, args.repeat)
+        after = lines_per_second(xmle.find_shelfmark, lines, args.repeat)
+        n_found = sum(x is not None for x in expected)
+        print(f"{name}: {len(lines)} lines, {n_found} shelfmarks: {after:,.0f} lines/s, "
+              f"every regex on every line {before:,.0f} lines/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
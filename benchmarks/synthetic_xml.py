@@ -0,0 +1,217 @@
+"""
+Generate a volume of synthetic Transkribus PAGE xmls, laid out as the catalogue scans are, to benchmark and test
+extraction at any size
+    python -m benchmarks.synthetic_xml --out data/synthetic --pages 1000
+Pages are written to <out>/BMC_<vol>_<2|4>/<collection>/J_2704_aa_30_<vol>_<page>.pxml. The text is a stream of
+catalogue entries running across regions and pages: a shelfmark line, sometimes a "Bought in" line, a heading with a
+capitalised author and a date, then English description with runs of Latin.
+"""
+import os
+import json
+import argparse
+from typing import Iterator
+from xml.sax.saxutils import escape
+import numpy as np
+
+PAGE_WIDTH, PAGE_HEIGHT = 4712, 6237
+_NS = "http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15"
+
+_english = ("the of and in with a by on to leaves type lines column printed woodcut initials capitals spaces left "
+            "blank first last text ends begins without signature quires gothic roman headlines marginal notes bound "
+            "copy title page device printer colophon folio recto verso rubricated illuminated border").split()
+_latin = ("et in ad quod est non cum sed per de liber incipit explicit feliciter opus sancti domini anno ecclesie "
+          "sermones summa tractatus questiones epistola vita glosa super librum secundum fratris ordinis").split()
+_authors = ["ARISTOTELES", "AUGUSTINUS", "BOETHIUS", "CICERO", "HIERONYMUS", "THOMAS AQUINAS", "GERSON", "BIBLIA",
+            "BONAVENTURA", "ALBERTUS MAGNUS", "DURANDUS", "NIDER", "VINCENTIUS BELLOVACENSIS", "PLATINA"]
+_months = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+           "November", "December"]
+
+
+def _shelfmark(rng: np.random.Generator) -> str:
+    kind = rng.random()
+    if kind < 0.7:
+        return f"I{'AB'[int(rng.random() < 0.2)]}. {rng.integers(1000, 60000)}"
+    elif kind < 0.9:
+        return f"G. {rng.integers(1000, 12000)}"
+    return f"C. {rng.integers(1, 60)}. {'abcdefgh'[rng.integers(8)]}. {rng.integers(1, 30)}"
+
+
+def _words(rng: np.random.Generator, vocabulary: list[str], n: int) -> str:
+    return " ".join(vocabulary[i] for i in rng.integers(len(vocabulary), size=n))
+
+
+def catalogue_lines(rng: np.random.Generator,
+                    words_per_line: tuple[int, int],
+                    shelfmark_density: float,
+                    shelfmarks: list[str]) -> Iterator[str]:
+    """
+    An endless stream of catalogue lines
+    The shelfmark of each entry is appended to shelfmarks as the last line of its heading is given, so when the
+    stream is stopped shelfmarks holds exactly the headings find_headings can find in the lines taken
+    """
+    def n_words() -> int:
+        return int(rng.integers(words_per_line[0], words_per_line[1] + 1))
+
+    latin = False
+    while True:
+        sm = _shelfmark(rng)
+        # G. and C. shelfmarks are only found after a space, so they end a line of the previous entry as in the scans
+        end = "" if sm[0] == "C" else "."
+        if sm[0] == "I" and rng.random() < 0.5:
+            yield f"{sm}{end}"
+        else:
+            yield f"{_words(rng, _english, max(1, n_words() - 3))} {sm}{end}"
+        if rng.random() < 0.3:
+            yield f"Bought in {_months[rng.integers(12)]}, {rng.integers(1850, 1950)}."
+        yield f"{_authors[rng.integers(len(_authors))]}. {_words(rng, _latin, max(1, n_words() - 2)).capitalize()}"
+        for _ in range(rng.integers(0, 3)):
+            yield _words(rng, _latin, n_words())
+        shelfmarks.append(sm)
+        yield f"*{rng.integers(1, 29)} {_months[rng.integers(12)]}, {rng.integers(1460, 1501)}."
+
+        for _ in range(rng.geometric(shelfmark_density)):
+            if rng.random() < 0.25:
+                latin = not latin
+            if latin:
+                yield _words(rng, _latin, n_words())
+            else:  # measurements, never a date
+                yield f"{_words(rng, _english, max(1, n_words() - 2))} {rng.integers(100, 400)} mm."
+
+
+def _region_xml(region_id: str, lines: list[str], box: tuple[int, int, int, int]) -> list[str]:
+    """
+    The lines of a TextRegion, laid out top to bottom in box with one Word element per word
+    """
+    x0, y0, x1, y1 = box
+    line_height = (y1 - y0) // max(len(lines), 1)
+    out = [f'        <TextRegion orientation="0.0" id="{region_id}" custom="readingOrder {{index:0;}}">',
+           f'            <Coords points="{x0},{y0} {x0},{y1} {x1},{y1} {x1},{y0}"/>']
+    for i, line in enumerate(lines):
+        ly0, ly1 = y0 + i * line_height, y0 + (i + 1) * line_height - 8
+        line_id = f"{region_id}l{i + 1}"
+        out += [f'            <TextLine id="{line_id}" custom="readingOrder {{index:{i};}}">',
+                f'                <Coords points="{x0},{ly1} {x1},{ly1} {x1},{ly0} {x0},{ly0}"/>',
+                f'                <Baseline points="{x0},{ly1 - 12} {x1},{ly1 - 12}"/>']
+        wx = x0 + 10
+        for j, word in enumerate(line.split(" ")):
+            wx1 = min(wx + 28 * len(word), x1)
+            out += [f'                <Word id="{line_id}_w{j + 1}" custom="readingOrder {{index:{j};}}">',
+                    f'                    <Coords points="{wx},{ly0} {wx},{ly1} {wx1},{ly1} {wx1},{ly0}"/>',
+                    f'                    <TextEquiv>',
+                    f'                        <Unicode>{escape(word)}</Unicode>',
+                    f'                    </TextEquiv>',
+                    f'                </Word>']
+            wx = min(wx1 + 30, x1)
+        out += [f'                <TextEquiv>',
+                f'                    <Unicode>{escape(line)}</Unicode>',
+                f'                </TextEquiv>',
+                f'            </TextLine>']
+    out += [f'            <TextEquiv>',
+            f'                <Unicode>{escape(chr(10).join(lines))}</Unicode>',
+            f'            </TextEquiv>',
+            f'        </TextRegion>']
+    return out
+
+
+def page_xml(regions: list[list[str]], page_num: int) -> str:
+    """
+    A PAGE xml of 2 or 4 text regions
+    Regions are given in reading order. 4 region pages are 2 columns split horizontally, and Transkribus lists their
+    regions top left, bottom left, top right, bottom right, which extract_lines puts back in reading order.
+    :param regions: list[list[str]]: the lines of each region, in reading order
+    :param page_num: int
+    :return: str
+    """
+    n_rows = len(regions) // 2
+    row_height = (PAGE_HEIGHT - 1000) // n_rows
+    boxes = [(700 + (r % 2) * 1800, 600 + (r // 2) * row_height, 2200 + (r % 2) * 1800,
+              400 + (r // 2 + 1) * row_height) for r in range(len(regions))]
+    order = list(range(0, len(regions), 2)) + list(range(1, len(regions), 2))  # TL, BL, TR, BR
+
+    out = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+           f'<PcGts xmlns="{_NS}">',
+           '    <Metadata>',
+           '        <Creator>benchmarks.synthetic_xml</Creator>',
+           f'        <TranskribusMetadata pageNr="{page_num}"/>',
+           '    </Metadata>',
+           f'    <Page imageFilename="{page_num}.jpg" imageWidth="{PAGE_WIDTH}" imageHeight="{PAGE_HEIGHT}">',
+           '        <ReadingOrder>',
+           '            <OrderedGroup id="ro_1" caption="Regions reading order">']
+    out += [f'                <RegionRefIndexed index="{i}" regionRef="r{r + 1}"/>' for i, r in enumerate(order)]
+    out += ['            </OrderedGroup>',
+            '        </ReadingOrder>']
+    for r in order:
+        out += _region_xml(f"r{r + 1}", regions[r], boxes[r])
+    out += ['    </Page>',
+            '</PcGts>',
+            '']
+    return "\n".join(out)
+
+
+def generate_volume(out_dir: str | os.PathLike,
+                    n_pages: int,
+                    vol: int = 3,
+                    four_region_fraction: float = 0.1,
+                    lines_per_region: tuple[int, int] = (50, 65),
+                    words_per_line: tuple[int, int] = (5, 11),
+                    shelfmark_density: float = 0.05,
+                    first_page: int = 1,
+                    n_regions: list[int] | None = None,
+                    seed: int = 0) -> tuple[list[str], list[str]]:
+    """
+    Write a volume of synthetic page xmls, the same seed and arguments always give the same pages
+    :param out_dir: str | os.PathLike: the data root to write BMC_<vol>_<2|4> folders to
+    :param n_pages: int
+    :param vol: int: volume number
+    :param four_region_fraction: float: the chance of a page having 4 text regions rather than 2
+    :param lines_per_region: tuple[int, int]: least and most lines in a region
+    :param words_per_line: tuple[int, int]: least and most words in a body line
+    :param shelfmark_density: float: roughly the fraction of description lines that are followed by a new entry,
+                              the scans have around 1 in 20
+    :param first_page: int: number of the first page
+    :param n_regions: list[int] | None: the number of regions, 2 or 4, of each page, None to draw them at random
+    :param seed: int
+    :return: tuple[list[str], list[str]]: the xml paths in page order, and the shelfmark of each complete heading
+    """
+    rng = np.random.default_rng(seed)
+    if n_regions is None:
+        n_regions = [4 if x else 2 for x in rng.random(n_pages) < four_region_fraction]
+    elif len(n_regions) != n_pages or set(n_regions) - {2, 4}:
+        raise ValueError("n_regions needs a region count of 2 or 4 for each page")
+
+    shelfmarks = []
+    lines = catalogue_lines(rng, words_per_line, shelfmark_density, shelfmarks)
+    xmls = []
+    for page_num, page_regions in enumerate(n_regions, start=first_page):
+        collection_dir = os.path.join(out_dir, f"BMC_{vol}_{page_regions}", f"{1000000 + 10 * vol + page_regions}")
+        os.makedirs(collection_dir, exist_ok=True)
+        regions = [[next(lines) for _ in range(rng.integers(lines_per_region[0], lines_per_region[1] + 1))]
+                   for _ in range(page_regions)]
+        xml = os.path.join(collection_dir, f"J_2704_aa_30_{vol}_{page_num:04}.pxml")
+        with open(xml, "w", encoding="utf-8") as f:
+            f.write(page_xml(regions, page_num))
+        xmls.append(xml)
+
+    return xmls, shelfmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="data root to write the volume to")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--vol", type=int, default=3)
+    parser.add_argument("--four-region-fraction", type=float, default=0.1)
+    parser.add_argument("--lines-per-region", type=int, nargs=2, default=[50, 65])
+    parser.add_argument("--words-per-line", type=int, nargs=2, default=[5, 11])
+    parser.add_argument("--shelfmark-density", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    xmls, shelfmarks = generate_volume(args.out, args.pages, args.vol, args.four_region_fraction,
+                                       tuple(args.lines_per_region), tuple(args.words_per_line),
+                                       args.shelfmark_density, seed=args.seed)
+    print(json.dumps({"pages": len(xmls), "headings": len(shelfmarks)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import os
+import re
+import glob
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from PIL import Image
+import src.data.xml_extraction as xmle
+from src.data.word_coords import WordCoords
+from src.data.entry_store import load_entries
+from src.data.reimport_utils import read_entries_csv
+from src.data.incremental import entries_name
+from src.data.line_store import LineStore, lines_name
+from src.visualise.entry import gen_page_entries_lookup, page_boxes
+from src.visualise.image_registry import ImageRegistry, registry_name
+from src.visualise.render import RenderCache, default_cache
+
+_vol_dir_re = re.compile(r"BMC_(\d{1,2})_[24]$")
+
+
+def _coords(value) -> WordCoords | None:
+    """
+    The coordinate arrays a cell's lines or word locations view, found from its first line
+    """
+    while isinstance(value, (list, tuple)) and value:
+        value = value[0]
+    return value if isinstance(value, WordCoords) else getattr(value, "coords", None)
+
+
+def _frame_bytes(df: pd.DataFrame, seen: set | None = None) -> int:
+    """
+    Estimated memory held by a DataFrame, from memory_usage(deep=True) and the nbytes of the coordinate arrays its
+    lines and word locations view
+    The lines of a table view one WordCoords, so each object column's coordinates are found from its first non-empty
+    cell rather than walking every line
+    :param df: pd.DataFrame
+    :param seen: set | None: ids of the WordCoords already counted, to count those several frames share once
+    :return: int
+    """
+    seen = set() if seen is None else seen
+    size = int(df.memory_usage(deep=True).sum())
+    for column in df.columns:
+        values = df[column]
+        if values.dtype != object or not len(values) or not isinstance(values.iloc[0], (list, tuple)):
+            continue  # a column of strings, say
+        coords = next((coords for coords in map(_coords, values) if coords is not None), None)
+        if coords is not None and id(coords) not in seen:
+            seen.add(id(coords))
+            size += coords.points.nbytes + coords.word_offsets.nbytes + coords.line_offsets.nbytes
+    return size
+
+
+class Volume:
+    """
+    One volume of the catalogue, its pages discovered from data_root/BMC_<number>_<cols> and its extracted entries
+    read from out_root/BMC_<number>, each on first use
+    entries is the entry table, from catalogue_entries.parquet, or catalogue_entries.csv if the volume was extracted
+    by the notebook. pages is the page lookup display_page takes, numbered from 1 in page order with every page of
+    the volume, those without entries too. lines is the volume's LineStore, mapped rather than read.
+    Held in a Corpus, loaded entries and pages count towards its memory budget and are dropped together once it's
+    exceeded, as pages hold the same word locations and coordinates as entries.
+    """
+    __slots__ = ("number", "data_root", "out_dir", "corpus", "_xmls", "_loaded", "_lines", "_registry")
+
+    def __init__(self, number: int, data_root: str | os.PathLike, out_root: str | os.PathLike,
+                 corpus: "Corpus | None" = None):
+        self.number = number
+        self.data_root = data_root
+        self.out_dir = os.path.join(out_root, f"BMC_{number}")
+        self.corpus = corpus
+        self._xmls = None
+        self._loaded = {}  # name: entries or pages
+        self._lines = None
+        self._registry = None
+
+    @property
+    def xmls(self) -> list[str]:
+        """
+        The page xmls of the volume, in page order
+        """
+        if self._xmls is None:
+            self._xmls = xmle._sort_xmls(glob.glob(os.path.join(self.data_root, f"BMC_{self.number}_[24]", "*",
+                                                                "*.pxml")))
+        return self._xmls
+
+    @property
+    def labels(self) -> list[str]:
+        """
+        The label of each page, in page order, e.g. J_2704_aa_30_8_0098_4
+        """
+        return [xmle._xml_label(xml) for xml in self.xmls]
+
+    def __len__(self) -> int:
+        return len(self.xmls)
+
+    def _get(self, name: str, load):
+        if name in self._loaded:
+            if self.corpus is not None:
+                self.corpus._used(self)
+            return self._loaded[name]
+        value = self._loaded[name] = load()
+        if self.corpus is not None:
+            self.corpus._added(self)
+        return value
+
+    def _unload(self) -> None:
+        self._loaded = {}
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Estimated memory held by the loaded entries and pages, counting the word locations they share once
+        """
+        seen = set()
+        return sum(_frame_bytes(value, seen) for value in self._loaded.values())
+
+    @property
+    def loaded(self) -> list[str]:
+        return list(self._loaded)
+
+    @property
+    def entries(self) -> pd.DataFrame:
+        return self._get("entries", self._load_entries)
+
+    def _load_entries(self) -> pd.DataFrame:
+        parquet_path = os.path.join(self.out_dir, entries_name)
+        csv_path = os.path.join(self.out_dir, "catalogue_entries.csv")
+        if os.path.exists(parquet_path):
+            return load_entries(parquet_path)
+        if os.path.exists(csv_path):
+            return read_entries_csv(csv_path)[0]
+        raise FileNotFoundError(f"Volume {self.number} hasn't been extracted to {self.out_dir}, "
+                                f"run python -m src.pipeline --volumes {self.number}")
+
+    @property
+    def pages(self) -> pd.DataFrame:
+        return self._get("pages", self._load_pages)
+
+    def _load_pages(self) -> pd.DataFrame:
+        lookup = gen_page_entries_lookup(self.entries).set_index("xml")
+        labels = sorted(set(self.labels) | set(lookup.index), key=lambda x: (int(x.split("_")[-2]), x))
+        word_locs = lookup["word_locs"].to_dict()
+        page_word_locs = [word_locs.get(label, []) for label in labels]
+        return pd.DataFrame(data={"xml": labels, "word_locs": page_word_locs,
+                                  "n_entries": [len(x) for x in page_word_locs]},
+                            index=pd.RangeIndex(1, len(labels) + 1, name="page"))
+
+    @property
+    def lines(self) -> LineStore:
+        """
+        The volume's lines, mapped from the lines.store update_volume writes, not counted towards the memory budget
+        as the operating system pages them in and out
+        """
+        if self._lines is None:
+            self._lines = LineStore(os.path.join(self.out_dir, lines_name))
+        return self._lines
+
+    @property
+    def registry(self) -> ImageRegistry:
+        if self.corpus is not None:
+            return self.corpus.registry
+        if self._registry is None:
+            self._registry = ImageRegistry(self.data_root, os.path.join(os.path.dirname(self.out_dir), registry_name))
+            self._registry.refresh()
+        return self._registry
+
+    def image_path(self, page: int) -> str:
+        """
+        Location of the scan of a page
+        :param page: int: page number, as in pages
+        :return: str
+        """
+        label = self.pages.loc[page, "xml"]
+        if label not in self.registry:
+            self.registry.refresh()  # a scan added since the registry was built
+        return self.registry.image_path(label)
+
+    def render_page(self, page: int, cache: RenderCache | None = None) -> Image.Image:
+        """
+        A page's scan with the words of each entry on it drawn, as display_page shows it
+        :param page: int: page number, as in pages
+        :param cache: RenderCache | None: defaults to the shared default_cache, which bounds the thumbnails held
+        :return: Image.Image
+        """
+        cache = default_cache if cache is None else cache
+        return cache.render(self.image_path(page), page_boxes(self.pages.loc[page, "word_locs"]))
+
+
+class Corpus:
+    """
+    Every volume under a data root, e.g.
+        corpus = Corpus("data/raw", "data/processed")
+        corpus[8].pages
+    Opening lists data_root alone, each volume's pages and entries are read when first used.
+    Loaded entries and pages are kept, least recently used volume first, until their estimated memory exceeds
+    max_bytes, then the entries and pages of the least recently used volumes are dropped and read again if used again.
+    The volume just used is always kept.
+    """
+
+    def __init__(self, data_root: str | os.PathLike = os.path.join("data", "raw"),
+                 out_root: str | os.PathLike = os.path.join("data", "processed"), max_bytes: int = 512 * 2 ** 20):
+        self.data_root = data_root
+        self.out_root = out_root
+        self.max_bytes = max_bytes
+        self.memory = 0
+        self._loaded = OrderedDict()  # volume: estimated bytes of its entries and pages, least recently used first
+        self._registry = None
+
+        numbers = set()
+        with os.scandir(data_root) as vol_dirs:
+            for vol_dir in vol_dirs:
+                match = _vol_dir_re.match(vol_dir.name)
+                if match and vol_dir.is_dir():
+                    numbers.add(int(match.group(1)))
+        self._volumes = {number: Volume(number, data_root, out_root, self) for number in sorted(numbers)}
+
+    @property
+    def volumes(self) -> list[int]:
+        return list(self._volumes)
+
+    def __len__(self) -> int:
+        return len(self._volumes)
+
+    def __contains__(self, number: int) -> bool:
+        return int(number) in self._volumes
+
+    def __getitem__(self, number: int) -> Volume:
+        return self._volumes[int(number)]
+
+    def __iter__(self):
+        return iter(self._volumes.values())
+
+    @property
+    def registry(self) -> ImageRegistry:
+        """
+        The scans of every volume, built or refreshed on first use and saved in out_root, see ImageRegistry
+        """
+        if self._registry is None:
+            self._registry = ImageRegistry(self.data_root, os.path.join(self.out_root, registry_name))
+            self._registry.refresh()
+        return self._registry
+
+    def _used(self, volume: Volume) -> None:
+        self._loaded.move_to_end(volume.number)
+
+    def _added(self, volume: Volume) -> None:
+        nbytes = volume.nbytes
+        self.memory += nbytes - self._loaded.pop(volume.number, 0)
+        self._loaded[volume.number] = nbytes
+        while self.memory > self.max_bytes and len(self._loaded) > 1:
+            number, old_nbytes = self._loaded.popitem(last=False)
+            self._volumes[number]._unload()
+            self.memory -= old_nbytes
+
+    def clear(self) -> None:
+        """
+        Drop everything loaded
+        """
+        for number in self._loaded:
+            self._volumes[number]._unload()
+        self._loaded.clear()
+        self.memory = 0
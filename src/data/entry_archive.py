@@ -0,0 +1,178 @@
+import os
+import json
+import zlib
+import struct
+from typing import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# An archive is one file holding every entry of a volume: header, zlib compressed shards, compressed json index, footer
+# Each shard is the utf-8 text of a run of entries joined end to end. The index holds the offset and length of each
+# shard, and the shard and character span of each entry, so one entry is read by decompressing only its shard.
+# Bump when the layout changes, readers refuse archives of another version
+ARCHIVE_VERSION = 1
+_MAGIC = b"BMCA"
+_HEADER = struct.Struct("<4sI")  # magic, version
+_FOOTER = struct.Struct("<qq4s")  # index offset, index length, magic
+
+
+def entry_key(xml: str, entry_num: int, shelfmark: str | None) -> str:
+    """
+    The name of an entry in an archive, the same as the filename groupby_save gives it, without the .txt
+    :param xml: str: first page of the entry
+    :param entry_num: int
+    :param shelfmark: str | None
+    :return: str
+    """
+    shelfmark = shelfmark if isinstance(shelfmark, str) else ""
+    return f"{xml}_{entry_num}_{shelfmark.replace('.', '_').replace(' ', '')}"
+
+
+def entry_records(entry_df: pd.DataFrame) -> Iterator[tuple[str, str | None, str]]:
+    """
+    The key, shelfmark and text of each entry of an extract_catalogue_entries table
+    :param entry_df: pd.DataFrame
+    :return: Iterator[tuple[str, str | None, str]]
+    """
+    for xmls, entry_num, shelfmark, entry in zip(entry_df["xmls"], entry_df["vol_entry_num"],
+                                                 entry_df["shelfmark"], entry_df["entry"]):
+        shelfmark = shelfmark if isinstance(shelfmark, str) else None
+        yield entry_key(xmls[0], entry_num, shelfmark), shelfmark, "\n".join(entry)
+
+
+def _compress(shard: list[str], level: int) -> bytes:
+    return zlib.compress("".join(shard).encode("utf-8"), level)
+
+
+def write_archive(records: Iterable[tuple[str, str | None, str]],
+                  path: str | os.PathLike,
+                  shard_size: int = 64,
+                  workers: int | None = None,
+                  level: int = 6) -> int:
+    """
+    Write entries to a single archive file in place of one text file per entry
+    Entries are buffered into shards of shard_size, compressed across a thread pool if workers > 1, and written in
+    order. The archive is written to a temporary file and moved into place, so a reader never sees a partial archive.
+    :param records: Iterable[tuple[str, str | None, str]]: the key, shelfmark and text of each entry, see entry_records
+    :param path: str | os.PathLike
+    :param shard_size: int: entries per shard, larger shards compress better but cost more to read one entry from
+    :param workers: int | None: compression threads, None or 1 compresses serially
+    :param level: int: zlib compression level
+    :return: int: number of entries written
+    """
+    entries = []  # key, shelfmark, shard, start, end
+    shards = []  # offset, length
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    executor = ThreadPoolExecutor(max_workers=workers) if workers is not None and workers > 1 else None
+    pending = []  # compressed shards not yet written, kept in order
+
+    def flush(f, limit: int) -> None:
+        while len(pending) > limit:
+            data = pending.pop(0)
+            data = data.result() if executor is not None else data
+            shards.append((f.tell(), len(data)))
+            f.write(data)
+
+    try:
+        with open(tmp_path, "wb", buffering=2 ** 20) as f:
+            f.write(_HEADER.pack(_MAGIC, ARCHIVE_VERSION))
+            shard, n_chars = [], 0
+            for key, shelfmark, text in records:
+                entries.append((key, shelfmark, len(shards) + len(pending), n_chars, n_chars + len(text)))
+                shard.append(text)
+                n_chars += len(text)
+                if len(shard) == shard_size:
+                    pending.append(executor.submit(_compress, shard, level) if executor is not None
+                                   else _compress(shard, level))
+                    shard, n_chars = [], 0
+                    flush(f, 2 * workers if executor is not None else 0)  # bound the shards held in memory
+            if shard:
+                pending.append(executor.submit(_compress, shard, level) if executor is not None
+                               else _compress(shard, level))
+            flush(f, 0)
+
+            index = zlib.compress(json.dumps({"shards": shards, "entries": entries}).encode("utf-8"), level)
+            index_offset = f.tell()
+            f.write(index)
+            f.write(_FOOTER.pack(index_offset, len(index), _MAGIC))
+        os.replace(tmp_path, path)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return len(entries)
+
+
+def save_entries_archive(entry_df: pd.DataFrame, path: str | os.PathLike, **kwargs) -> int:
+    """
+    Write every entry of an extract_catalogue_entries table to one archive, see write_archive
+    :param entry_df: pd.DataFrame
+    :param path: str | os.PathLike
+    :return: int: number of entries written
+    """
+    return write_archive(entry_records(entry_df), path, **kwargs)
+
+
+class EntryArchive:
+    """
+    Read entries from an archive written by write_archive
+    Only the footer and index are read on opening, an entry is read by seeking to and decompressing its shard.
+    The last shard read is kept, so reading neighbouring entries in turn decompresses each shard once.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC or version != ARCHIVE_VERSION:
+                raise ValueError(f"Not a version {ARCHIVE_VERSION} entry archive: {path}")
+            f.seek(-_FOOTER.size, os.SEEK_END)
+            index_offset, index_length, _ = _FOOTER.unpack(f.read(_FOOTER.size))
+            f.seek(index_offset)
+            index = json.loads(zlib.decompress(f.read(index_length)))
+
+        self._shards = index["shards"]
+        self._entries = {key: (shard, start, end) for key, _, shard, start, end in index["entries"]}
+        self.keys = [entry[0] for entry in index["entries"]]
+        self.shelfmarks = {}
+        for key, shelfmark, _, _, _ in index["entries"]:
+            self.shelfmarks.setdefault(shelfmark, []).append(key)
+        self._shard_cache = (None, None)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def _shard(self, i: int) -> str:
+        if self._shard_cache[0] != i:
+            offset, length = self._shards[i]
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                self._shard_cache = (i, zlib.decompress(f.read(length)).decode("utf-8"))
+        return self._shard_cache[1]
+
+    def __getitem__(self, key: str) -> str:
+        """
+        The text of an entry by its key
+        :param key: str: see entry_key
+        :return: str
+        """
+        shard, start, end = self._entries[key]
+        return self._shard(shard)[start: end]
+
+    def find(self, shelfmark: str) -> list[str]:
+        """
+        The text of every entry with a shelfmark, in volume order
+        :param shelfmark: str
+        :return: list[str]
+        """
+        return [self[key] for key in self.shelfmarks.get(shelfmark, [])]
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        for key in self.keys:
+            yield key, self[key]
@@ -0,0 +1,126 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.data.xml_extraction import TextLine
+from src.data.word_coords import WordCoords, LinePoints
+
+# word_locations is stored entry > line > word > (x, y) point, the same nesting as the arrays in WordCoords
+point_type = pa.list_(pa.int32(), 2)
+word_locations_type = pa.list_(pa.list_(pa.list_(point_type)))
+
+entry_schema = pa.schema([
+    ("xmls", pa.list_(pa.string())),
+    ("xml_start_line", pa.list_(pa.int64())),
+    ("vol_entry_num", pa.int64()),
+    ("shelfmark", pa.string()),
+    ("entry", pa.list_(pa.string())),
+    ("title", pa.list_(pa.int64())),
+    ("entry_text", pa.string()),
+    ("word_locations", word_locations_type),
+])
+
+
+def _word_pairs(word: list) -> list[tuple[int, int]]:
+    """
+    Words reloaded from csv are flat [x0, y0, x1, y1], extracted words are [(x0, y0), (x1, y1)]
+    """
+    if word and not isinstance(word[0], (tuple, list)):
+        return list(zip(word[::2], word[1::2]))
+    return word
+
+
+def _word_locations_array(word_locations: pd.Series) -> pa.Array:
+    """
+    Build the nested word_locations column straight from the coordinate arrays, no per-word objects are made
+    for array-backed lines
+    :param word_locations: pd.Series: lists of LinePoints, or of the nested lists reloaded from csv
+    :return: pa.Array
+    """
+    line_points = [lp if isinstance(lp, LinePoints) else WordCoords.from_nested([[_word_pairs(w) for w in lp]]).line(0)
+                   for row in word_locations for lp in row]
+    coords = WordCoords.from_lines(line_points)
+    entry_offsets = np.zeros(len(word_locations) + 1, dtype=np.int32)
+    np.cumsum([len(row) for row in word_locations], out=entry_offsets[1:])
+
+    points = pa.FixedSizeListArray.from_arrays(pa.array(coords.points.ravel(), type=pa.int32()), 2)
+    words = pa.ListArray.from_arrays(pa.array(coords.word_offsets, type=pa.int32()), points)
+    lines = pa.ListArray.from_arrays(pa.array(coords.line_offsets, type=pa.int32()), words)
+    return pa.ListArray.from_arrays(pa.array(entry_offsets), lines)
+
+
+def _offsets(list_array: pa.ListArray) -> np.ndarray:
+    offsets = list_array.offsets.to_numpy()
+    return offsets - offsets[0]
+
+
+def _coords_from_array(word_locations: pa.ChunkedArray) -> tuple[WordCoords, np.ndarray]:
+    """
+    Rebuild the coordinate arrays of a stored word_locations column
+    :param word_locations: pa.ChunkedArray
+    :return: the WordCoords of every line of every entry, and the offsets of each entry's lines
+    """
+    entries = word_locations.combine_chunks()
+    lines = entries.flatten()
+    words = lines.flatten()
+    points = words.flatten().flatten().to_numpy(zero_copy_only=False).reshape(-1, 2)
+
+    return WordCoords(points, _offsets(words), _offsets(lines)), _offsets(entries)
+
+
+def save_entries(entry_df: pd.DataFrame, path: str | os.PathLike) -> None:
+    """
+    Save a catalogue entry table, as made by extract_catalogue_entries, to parquet
+    The list columns are stored natively rather than as strings, so nothing needs parsing on reload
+    :param entry_df: pd.DataFrame
+    :param path: str | os.PathLike
+    :return: None
+    """
+    arrays = []
+    fields = []
+    for column in entry_df.columns:
+        if column == "word_locations":
+            array = _word_locations_array(entry_df[column])
+        elif column in entry_schema.names:
+            array = pa.array(entry_df[column].tolist(), type=entry_schema.field(column).type, from_pandas=True)
+        else:
+            array = pa.array(entry_df[column].tolist(), from_pandas=True)
+        arrays.append(array)
+        fields.append(pa.field(column, array.type))
+
+    table = pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)  # atomic, a reader never sees a partial table
+
+    return None
+
+
+def load_entries(path: str | os.PathLike, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Load a catalogue entry table saved by save_entries
+    Only the requested columns are read, e.g. ["shelfmark", "entry_text"] doesn't touch the coordinate data
+    Lines in entry and word_locations view one WordCoords, as they do straight out of extract_catalogue_entries
+    :param path: str | os.PathLike
+    :param columns: list[str] | None: columns to load, None for all
+    :return: pd.DataFrame
+    """
+    table = pq.read_table(path, columns=columns)
+
+    coords = None
+    if "word_locations" in table.column_names:
+        coords, entry_offsets = _coords_from_array(table.column("word_locations"))
+
+    data = {}
+    for column in table.column_names:
+        if column == "entry" and coords is not None:
+            lines = table.column(column).combine_chunks().flatten().to_pylist()
+            lines = [TextLine(line, coords, i) for i, line in enumerate(lines)]
+            data[column] = [lines[a:b] for a, b in zip(entry_offsets[:-1], entry_offsets[1:])]
+        elif column == "word_locations":
+            data[column] = [[coords.line(i) for i in range(a, b)] for a, b in zip(entry_offsets[:-1], entry_offsets[1:])]
+        else:
+            data[column] = table.column(column).to_pylist()
+
+    return pd.DataFrame(data=data, columns=table.column_names)
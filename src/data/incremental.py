@@ -0,0 +1,204 @@
+import os
+import json
+from copy import copy
+import pandas as pd
+import src.data.xml_extraction as xmle
+from src.data.page_cache import PageCache
+from src.data.entry_store import save_entries, load_entries
+from src.data.line_store import save_lines, lines_name
+from src.data.instrumentation import default_instrumentation
+
+# Bump when the manifest layout or the entry segmentation changes so old manifests force a full rebuild
+MANIFEST_VERSION = 2
+HEADING_LOOKAHEAD = 7  # a heading depends on its shelfmark line and up to 7 lines after it
+
+manifest_name = "manifest.json"
+entries_name = "catalogue_entries.parquet"
+
+
+def page_fingerprint(xml: str) -> list[int]:
+    stat = os.stat(xml)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load_manifest(out_dir: str | os.PathLike) -> dict | None:
+    try:
+        with open(os.path.join(out_dir, manifest_name), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("outputs") != _output_fingerprints(out_dir):
+        return None  # a run that died between writing the tables and the manifest leaves them out of step
+    return manifest
+
+
+def _output_fingerprints(out_dir: str | os.PathLike) -> dict[str: list[int] | None]:
+    """
+    Size and modification time of the entry table and line store, None for one that doesn't exist
+    """
+    fingerprints = {}
+    for name in (entries_name, lines_name):
+        try:
+            fingerprints[name] = page_fingerprint(os.path.join(out_dir, name))
+        except FileNotFoundError:
+            fingerprints[name] = None
+    return fingerprints
+
+
+def _save_manifest(manifest: dict, out_dir: str | os.PathLike) -> None:
+    path = os.path.join(out_dir, manifest_name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _order_lines(lines: list[str], headings: list[list]) -> list[str]:
+    """
+    Apply the "Bought in" swaps find_headings makes to its ordered lines
+    """
+    ordered_lines = copy(lines)
+    for i, _, _, bought_in in headings:
+        if bought_in:
+            ordered_lines[i], ordered_lines[i + 1] = lines[i + 1], lines[i]
+    return ordered_lines
+
+
+def _entry_df(rows: dict[str, list]) -> pd.DataFrame:
+    entry_df = pd.DataFrame(data=rows)
+    entry_df["vol_entry_num"] = entry_df["vol_entry_num"].astype("int64")
+    return entry_df
+
+
+def update_volume(xmls: list[str],
+                  out_dir: str | os.PathLike,
+                  cache: PageCache | None = None) -> tuple[pd.DataFrame, dict]:
+    """
+    Bring a volume's catalogue entries in out_dir up to date with its xmls, re-extracting only changed pages
+    out_dir keeps a manifest of each page's fingerprint and the volume's headings alongside the entry table, and
+    the volume's lines in a LineStore file, see src.data.line_store. The manifest records the size and
+    modification time of both, and if either has changed since, e.g. a run died after writing the tables but before
+    the manifest, the volume is rebuilt in full.
+    On a re-run, headings are searched again only from the 7 lines before the first changed page to the end
+    of the last changed page, and only the entries touching that run are rebuilt. The rest are patched in from
+    the previous table. The result is the same as a full rebuild with extract_catalogue_entries.
+    Unchanged pages are read back from the page cache, by default kept in out_dir.
+    :param xmls: list[str]: the volume's transkribus model output xmls
+    :param out_dir: str | os.PathLike
+    :param cache: PageCache | None
+    :return: tuple[pd.DataFrame, dict]: the entry table, and a summary of the pages and entries that were redone
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    cache = PageCache(os.path.join(out_dir, "page_cache")) if cache is None else cache
+    xmls_sorted = xmle._sort_xmls(xmls)
+    pages = [{"label": xmle._xml_label(xml), "fingerprint": page_fingerprint(xml)} for xml in xmls_sorted]
+
+    manifest = _load_manifest(out_dir)
+    old_pages = manifest["pages"] if manifest is not None else []
+    page_keys = [(page["label"], page["fingerprint"]) for page in pages]
+    old_page_keys = [(page["label"], page["fingerprint"]) for page in old_pages]
+
+    if manifest is not None and page_keys == old_page_keys:
+        summary = {"pages": len(pages), "changed_pages": [], "rebuilt_entries": 0, "full_rebuild": False}
+        return load_entries(os.path.join(out_dir, entries_name)), summary
+
+    # pages shared at the start and end of the volume are unchanged, everything between them is redone
+    n_prefix = 0
+    while n_prefix < min(len(pages), len(old_pages)) and page_keys[n_prefix] == old_page_keys[n_prefix]:
+        n_prefix += 1
+    n_suffix = 0
+    while (n_suffix < min(len(pages), len(old_pages)) - n_prefix
+           and page_keys[-1 - n_suffix] == old_page_keys[-1 - n_suffix]):
+        n_suffix += 1
+    changed = range(n_prefix, len(pages) - n_suffix)
+
+    vol_lines = []
+    with default_instrumentation.stage("read_pages", len(pages)) as stage:
+        for i, xml in enumerate(xmls_sorted):
+            lines = cache.get(xml) if i not in changed else None
+            if lines is None:
+                lines = list(xmle.iter_page_lines(xml))
+                cache.put(xml, lines)
+                if stage:
+                    stage.bytes_read += pages[i]["fingerprint"][0]
+            else:
+                default_instrumentation.count("pages_cached")
+            pages[i]["n_lines"] = len(lines)
+            vol_lines.append((pages[i]["label"], lines))
+    lines, xml_track_df = xmle.extract_lines_for_vol(vol_lines)
+    offsets, labels = xmle.page_offsets(xml_track_df)
+
+    if manifest is None:
+        headings = [list(x) for x in xmle.iter_headings(lines, xmle.find_shelfmarks(lines))]
+        rows = _rows(lines, headings, offsets, labels)
+        entry_df = _entry_df(rows)
+        summary = {"pages": len(pages), "changed_pages": [page["label"] for page in pages],
+                   "rebuilt_entries": len(entry_df), "full_rebuild": True}
+    else:
+        changed_lines = (sum(page["n_lines"] for page in pages[:n_prefix]),
+                         sum(page["n_lines"] for page in pages[:len(pages) - n_suffix]))
+        old_changed_end = sum(page["n_lines"] for page in old_pages[:len(old_pages) - n_suffix])
+        entry_df, headings, n_rebuilt = _patch_entries(lines, offsets, labels, manifest, out_dir,
+                                                       changed_lines, old_changed_end)
+        summary = {"pages": len(pages), "changed_pages": [pages[i]["label"] for i in changed],
+                   "rebuilt_entries": n_rebuilt, "full_rebuild": False}
+
+    save_entries(entry_df, os.path.join(out_dir, entries_name))
+    save_lines(os.path.join(out_dir, lines_name), _order_lines(lines, headings), offsets, labels)
+    _save_manifest({"version": MANIFEST_VERSION, "pages": pages, "headings": headings,
+                    "outputs": _output_fingerprints(out_dir)}, out_dir)
+
+    return entry_df, summary
+
+
+def _rows(lines: list[str], headings: list[list], offsets, labels, first: int = 0, last: int | None = None) -> dict:
+    title_shelfmarks = [sm for _, sm, _, _ in headings]
+    title_indices = [title_index for _, _, title_index, _ in headings]
+    return xmle.catalogue_entry_rows(_order_lines(lines, headings), title_indices, title_shelfmarks,
+                                     offsets, labels, first, last)
+
+
+def _patch_entries(lines: list[str], offsets, labels, manifest: dict, out_dir: str | os.PathLike,
+                   changed_lines: tuple[int, int], old_c1: int) -> tuple[pd.DataFrame, list, int]:
+    """
+    Re-segment the entries around a changed run of lines and patch them into the previous entry table
+    :param changed_lines: the first line of the changed pages and the line after them
+    :param old_c1: the line after the changed pages in the previous run
+    :return: the entry table, the volume's headings, the number of entries rebuilt
+    """
+    c0, c1 = changed_lines
+    delta = c1 - old_c1  # shift of every line after the changed run
+    search_start = max(0, c0 - HEADING_LOOKAHEAD)
+
+    old_headings = manifest["headings"]
+    prefix = [h for h in old_headings if h[0] < search_start]
+    suffix = [[h[0] + delta, h[1], [x + delta for x in h[2]], h[3]] for h in old_headings if h[0] >= old_c1]
+    line_shelfmarks = [None] * len(lines)  # only the lines the redone headings can see are searched
+    for i in range(search_start, min(c1 + HEADING_LOOKAHEAD, len(lines))):
+        line_shelfmarks[i] = xmle.find_shelfmark(lines[i])
+    window = [list(x) for x in xmle.iter_headings(lines, line_shelfmarks, search_start, c1)]
+    headings = prefix + window + suffix
+
+    # entries between two unchanged headings on the same side of the changed run are reused as they were,
+    # the entry ending at the first redone heading and the last entry of the volume are always rebuilt
+    n_prefix = len(prefix)
+    n_old_headings = len(old_headings)
+    reuse_prefix = max(0, n_prefix - 1)
+    reuse_suffix = max(0, len(suffix) - 1)
+    rebuild_first, rebuild_last = reuse_prefix, len(headings) - reuse_suffix - 1
+
+    old_df = load_entries(os.path.join(out_dir, entries_name))
+    old_suffix = old_df.iloc[n_old_headings - 1 - reuse_suffix: n_old_headings - 1].copy()
+    old_suffix["title"] = [[x + delta for x in title] for title in old_suffix["title"]]
+
+    parts = [old_df.iloc[:reuse_prefix],
+             _entry_df(_rows(lines, headings, offsets, labels, rebuild_first, rebuild_last)),
+             old_suffix]
+    if headings and rebuild_last < len(headings):
+        parts.append(_entry_df(_rows(lines, headings, offsets, labels, len(headings) - 1, len(headings))))
+    entry_df = pd.concat([part for part in parts if len(part)], ignore_index=True)
+    entry_df["vol_entry_num"] = range(len(entry_df))
+    # rebuild from the columns so dtypes are inferred as a full rebuild would, concat can fall back to object
+    entry_df = _entry_df({column: entry_df[column].tolist() for column in entry_df.columns})
+
+    return entry_df, headings, (rebuild_last - rebuild_first) + 1
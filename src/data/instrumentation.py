@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import tracemalloc
+from contextlib import nullcontext
+from tqdm import tqdm
+
+# Bump when the report layout changes
+REPORT_VERSION = 1
+
+
+class StageStats:
+    """
+    Totals for one stage over every time it has run
+    peak_memory is the most memory traced by tracemalloc while the stage ran, None unless memory is traced
+    """
+    __slots__ = ("calls", "seconds", "items", "bytes_read", "peak_memory")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.items = 0
+        self.bytes_read = 0
+        self.peak_memory = None
+
+    def as_dict(self) -> dict:
+        return {"calls": self.calls, "seconds": self.seconds, "items": self.items,
+                "items_per_second": self.items / self.seconds if self.seconds else 0.0,
+                "bytes_read": self.bytes_read, "peak_memory": self.peak_memory}
+
+
+class _Stage:
+    """
+    Times one run of a stage, the object given by Instrumentation.stage when enabled
+    Add to items and bytes_read while the stage runs if they aren't known up front
+    """
+    __slots__ = ("instrumentation", "name", "items", "bytes_read", "_start")
+
+    def __init__(self, instrumentation: "Instrumentation", name: str, items: int):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.items = items
+        self.bytes_read = 0
+
+    def __enter__(self) -> "_Stage":
+        self.instrumentation._enter()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        seconds = time.perf_counter() - self._start
+        self.instrumentation.add(self.name, seconds, self.items, self.bytes_read, self.instrumentation._exit())
+
+
+class Instrumentation:
+    """
+    Wall time, items, bytes read and peak memory of each stage of extraction, and named counters
+    Disabled, stage gives a shared no-op context and count returns at once, so instrumented code costs next to
+    nothing. Memory is traced with tracemalloc only if enabled with memory=True, as tracing slows every allocation.
+    progress sets whether progress bars are shown, whether or not stages are recorded.
+    Stages run in worker processes aren't recorded, the stage that sends work to them is.
+    """
+    _disabled = nullcontext()
+
+    def __init__(self, progress: bool = True):
+        self.enabled = False
+        self.memory = False
+        self.progress = progress
+        self.stages = {}
+        self.counters = {}
+        self._peaks = []  # peak memory of each stage currently running, innermost last
+        self._tracing = False  # whether tracemalloc was started here, and so should be stopped here
+
+    def enable(self, memory: bool = False) -> "Instrumentation":
+        self.enabled = True
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        return self
+
+    def disable(self) -> "Instrumentation":
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        self.enabled = False
+        self.memory = False
+        self._peaks = []
+        return self
+
+    def reset(self) -> None:
+        self.stages = {}
+        self.counters = {}
+
+    def stage(self, name: str, items: int = 0):
+        """
+        Time a stage, e.g.
+            with default_instrumentation.stage("find_headings", len(lines)) as stage:
+                ...
+        stage is None when disabled
+        :param name: str
+        :param items: int: items the stage processes, lines or pages say
+        :return: a context manager
+        """
+        if not self.enabled:
+            return self._disabled
+        return _Stage(self, name, items)
+
+    def add(self, name: str, seconds: float = 0.0, items: int = 0, bytes_read: int = 0,
+            peak_memory: int | None = None) -> None:
+        """
+        Add a run of a stage timed elsewhere, e.g. one page of a generator, to its totals
+        """
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.items += items
+        stats.bytes_read += bytes_read
+        if peak_memory is not None:
+            stats.peak_memory = max(stats.peak_memory or 0, peak_memory)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def _enter(self) -> None:
+        if not (self.memory and tracemalloc.is_tracing()):
+            return None
+        if self._peaks:  # keep the peak of the enclosing stage so far before resetting it for this one
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._peaks.append(0)
+
+    def _exit(self) -> int | None:
+        if not (self.memory and tracemalloc.is_tracing() and self._peaks):
+            return None
+        peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        return peak
+
+    def bar(self, iterable=None, **kwargs) -> tqdm:
+        """
+        A tqdm progress bar, hidden unless progress is set
+        With progress set disable is left to tqdm, so a notebook or test that silences tqdm still does
+        """
+        if not self.progress:
+            kwargs["disable"] = True
+        return tqdm(iterable, **kwargs)
+
+    def report(self) -> dict:
+        """
+        :return: dict: the totals of each stage and the counters
+        """
+        return {"version": REPORT_VERSION, "stages": {name: stats.as_dict() for name, stats in self.stages.items()},
+                "counters": dict(self.counters)}
+
+    def save(self, path: str | os.PathLike) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=1)
+        os.replace(tmp_path, path)  # atomic, a reader never sees a partial report
+
+
+default_instrumentation = Instrumentation()  # disabled, enable it to record the stages of a run
@@ -0,0 +1,117 @@
+import time
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+from tqdm import tqdm
+from src.data.instrumentation import default_instrumentation
+
+UNKNOWN = "can't find language"  # what split_by_language records for a line langdetect can't place
+
+_factories = {}  # seed: a DetectorFactory of this process with the profiles loaded
+
+
+def _factory(seed: int) -> DetectorFactory:
+    # a factory of our own, so the seed of langdetect's shared factory, used by its detect, is left alone
+    if seed not in _factories:
+        factory = DetectorFactory()
+        factory.load_profile(PROFILES_DIRECTORY)
+        factory.set_seed(seed)
+        _factories[seed] = factory
+    return _factories[seed]
+
+
+def detect_line(line: str, seed: int = 0) -> str:
+    """
+    Detect the language of a single line
+    langdetect samples at random, seeding it makes a line's language the same on every call
+    :param line: str
+    :param seed: int
+    :return: str: the langdetect language code, or UNKNOWN for anything langdetect fails on, as with the bare except
+             split_by_language used, a line with no letters or a value that isn't a string say
+    """
+    try:
+        detector = _factory(seed).create()
+        detector.append(line)
+        return detector.detect()
+    except Exception:
+        return UNKNOWN
+
+
+def _detect_batch(lines: list[str], seed: int) -> list[str]:
+    return [detect_line(line, seed) for line in lines]
+
+
+class LanguageDetector:
+    """
+    Seeded language detection with a per-line result cache
+    Each distinct line is detected once, later requests for it are read from the cache. The cache keeps the max_lines
+    most recently requested lines, so a run over many volumes doesn't hold every line it has seen.
+    Lines not yet in the cache are detected in batches, across a process pool if workers > 1.
+    n_detected and seconds count the lines actually sent to langdetect, lines_per_second is their rate.
+    """
+
+    def __init__(self, seed: int = 0, workers: int | None = None, batch_size: int = 256, max_lines: int = 2 ** 18):
+        self.seed = seed
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_lines = max_lines
+        self.cache = OrderedDict()  # line: language, least recently requested first
+        self.n_detected = 0
+        self.seconds = 0.0
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.n_detected / self.seconds if self.seconds else 0.0
+
+    def detect(self, lines: list[str]) -> list[str]:
+        """
+        Languages of a list of lines
+        :param lines: list[str]
+        :return: list[str]
+        """
+        languages = {}
+        for line in dict.fromkeys(lines):
+            if line in self.cache:
+                self.cache.move_to_end(line)
+                languages[line] = self.cache[line]
+        new_lines = [line for line in dict.fromkeys(lines) if line not in languages]
+        if new_lines:
+            start = time.perf_counter()
+            batches = [new_lines[i: i + self.batch_size] for i in range(0, len(new_lines), self.batch_size)]
+            detect_batch = partial(_detect_batch, seed=self.seed)
+            with default_instrumentation.bar(total=len(new_lines), unit="line") as progress:
+                if self.workers is None or self.workers <= 1:
+                    self._store(batches, map(detect_batch, batches), progress, languages)
+                else:
+                    with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                        self._store(batches, executor.map(detect_batch, batches), progress, languages)
+            self.n_detected += len(new_lines)
+            self.seconds += time.perf_counter() - start
+
+        return [languages[line] for line in lines]
+
+    def _store(self, batches: list[list[str]], results, progress: tqdm, languages: dict) -> None:
+        for batch, batch_languages in zip(batches, results):
+            for line, language in zip(batch, batch_languages):
+                languages[line] = self.cache[line] = language
+            progress.update(len(batch))
+        while len(self.cache) > self.max_lines:
+            self.cache.popitem(last=False)
+
+    def detect_entries(self, entries: list[list[str]]) -> list[list[str]]:
+        """
+        Languages of the lines of many entries, detected together so batches span entries
+        :param entries: list[list[str]]
+        :return: list[list[str]]
+        """
+        languages = self.detect([line for lines in entries for line in lines])
+        split_languages = []
+        start = 0
+        for lines in entries:
+            split_languages.append(languages[start: start + len(lines)])
+            start += len(lines)
+        return split_languages
+
+
+default_detector = LanguageDetector()  # shared so the cache carries across calls to split_by_language
@@ -0,0 +1,151 @@
+import os
+import mmap
+import struct
+import numpy as np
+from src.data.xml_extraction import TextLine
+from src.data.word_coords import WordCoords
+
+# Bump when the layout changes so a store of another version is never read
+STORE_VERSION = 1
+_MAGIC = b"BMCL"
+_HEADER = struct.Struct("<4sIqqqqqq")  # magic, version, n_lines, n_words, n_points, n_pages, n_label_bytes, n_text_bytes
+
+lines_name = "lines.store"
+
+
+def save_lines(path: str | os.PathLike, lines: list[TextLine], offsets: np.ndarray | None = None,
+               labels: list[str] | None = None) -> None:
+    """
+    Write the lines of a volume, their word coordinates and its pages to one file for LineStore to map
+    The text is a single UTF-8 blob with each line followed by a newline, so the lines of an entry are one
+    contiguous run of bytes that decodes straight to its entry_text
+    :param path: str | os.PathLike
+    :param lines: list[TextLine]: in the order entries are cut from them, e.g. after the "Bought in" swaps
+    :param offsets: np.ndarray | None: the line each page starts at followed by the number of lines, see page_offsets
+    :param labels: list[str] | None: the label of each page
+    :return: None
+    """
+    offsets = np.array([0, len(lines)], dtype=np.int64) if offsets is None else np.asarray(offsets, dtype=np.int64)
+    labels = [""] if labels is None else labels
+    text = [line.encode("utf-8") for line in lines]
+    text_offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum([len(t) + 1 for t in text], out=text_offsets[1:])
+    coords = WordCoords.from_lines(lines)
+    label_bytes = "\n".join(labels).encode("utf-8")
+
+    header = _HEADER.pack(_MAGIC, STORE_VERSION, len(lines), len(coords.word_offsets) - 1, len(coords.points),
+                          len(labels), len(label_bytes), int(text_offsets[-1]))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        for part in (header, text_offsets.tobytes(), coords.line_offsets.astype(np.int64).tobytes(),
+                     coords.word_offsets.astype(np.int64).tobytes(), coords.points.astype(np.int32).tobytes(),
+                     offsets.tobytes(), label_bytes, b"\n".join(text), b"\n" if text else b""):
+            f.write(part)
+    os.replace(tmp_path, path)  # atomic, a reader never sees a partial store
+
+
+class LineStore:
+    """
+    The lines of a volume memory-mapped from a file written by save_lines
+    Opening reads only the header and labels, the text and coordinates are paged in from the file as they're used.
+    coords views the coordinate arrays in place, and every line given shares it, so no coordinates are copied.
+    text decodes a run of lines in one go, an entry's text is never joined from its lines.
+    Pickling sends only the path, so worker processes map the same file and share its pages rather than copies.
+    """
+    __slots__ = ("path", "coords", "page_offsets", "labels", "_mmap", "_text_offsets", "_text_start")
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError(f"Not a line store: {path}")
+        magic, version, n_lines, n_words, n_points, n_pages, n_label_bytes, n_text_bytes = \
+            _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC or version != STORE_VERSION:
+            raise ValueError(f"Not a version {STORE_VERSION} line store: {path}")
+
+        offset = _HEADER.size
+        self._text_offsets = np.frombuffer(self._mmap, dtype=np.int64, count=n_lines + 1, offset=offset)
+        offset += 8 * (n_lines + 1)
+        line_offsets = np.frombuffer(self._mmap, dtype=np.int64, count=n_lines + 1, offset=offset)
+        offset += 8 * (n_lines + 1)
+        word_offsets = np.frombuffer(self._mmap, dtype=np.int64, count=n_words + 1, offset=offset)
+        offset += 8 * (n_words + 1)
+        points = np.frombuffer(self._mmap, dtype=np.int32, count=2 * n_points, offset=offset).reshape(-1, 2)
+        offset += 8 * n_points
+        self.page_offsets = np.frombuffer(self._mmap, dtype=np.int64, count=n_pages + 1, offset=offset)
+        offset += 8 * (n_pages + 1)
+        self.labels = self._mmap[offset: offset + n_label_bytes].decode("utf-8").split("\n")
+        self._text_start = offset + n_label_bytes
+        self.coords = WordCoords(points, word_offsets, line_offsets)
+
+    def __len__(self) -> int:
+        return len(self._text_offsets) - 1
+
+    def __getitem__(self, item: int | slice) -> TextLine | list[TextLine]:
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                raise ValueError("LineStore slices can't have a step")
+            return self.lines(start, stop)
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(item)
+        return self.lines(item, item + 1)[0]
+
+    def __iter__(self):
+        return iter(self.lines())
+
+    def __reduce__(self):
+        return LineStore, (self.path,)
+
+    def _decode(self, start: int, stop: int) -> str:
+        return str(memoryview(self._mmap)[self._text_start + start: self._text_start + stop], "utf-8")
+
+    def lines(self, start: int = 0, stop: int | None = None) -> list[TextLine]:
+        """
+        Lines start to stop, each viewing its word coordinates in coords
+        :param start: int
+        :param stop: int | None: last line + 1, None for the end of the volume
+        :return: list[TextLine]
+        """
+        stop = len(self) if stop is None else stop
+        text_offsets = self._text_offsets[start: stop + 1].tolist()
+        return [TextLine(self._decode(a, b - 1), self.coords, i)
+                for i, a, b in zip(range(start, stop), text_offsets[:-1], text_offsets[1:])]
+
+    def text(self, start: int, stop: int) -> str:
+        """
+        Lines start to stop joined by newlines, decoded from the store in one piece
+        For an entry running from line start to the next entry at line stop this is its entry_text
+        :param start: int
+        :param stop: int: last line + 1
+        :return: str
+        """
+        if stop <= start:
+            return ""
+        return self._decode(int(self._text_offsets[start]), int(self._text_offsets[stop]) - 1)
+
+    def page_lines(self, label: str) -> list[TextLine]:
+        """
+        The lines of one page
+        :param label: str: as given by _xml_label, e.g. J_2704_aa_30_1_0052_2
+        :return: list[TextLine]
+        """
+        page = self.labels.index(label)
+        return self.lines(int(self.page_offsets[page]), int(self.page_offsets[page + 1]))
+
+    def close(self) -> None:
+        self.coords = self.page_offsets = self._text_offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:  # lines given out still view the coordinates, the map goes once they're released
+            pass
+
+    def __enter__(self) -> "LineStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
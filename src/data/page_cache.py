@@ -0,0 +1,216 @@
+import os
+import struct
+import hashlib
+import numpy as np
+from src.data.xml_extraction import TextLine
+from src.data.word_coords import WordCoords
+
+# Bump when the record layout, key or the line extraction changes so stale records are never read back
+CACHE_VERSION = 4
+_MAGIC = b"BMCP"
+_HEADER = struct.Struct("<4sIqqqq")  # magic, version, n_lines, n_words, n_points, n_text_bytes
+
+
+def _encode_lines(lines: list[TextLine]) -> bytes:
+    """
+    Pack the lines of a page and their word coordinates into a compact binary record
+    :param lines: list[TextLine]
+    :return: bytes
+    """
+    text = [line.encode("utf-8") for line in lines]
+    text_offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in text], out=text_offsets[1:])
+    coords = WordCoords.from_lines(lines)
+
+    header = _HEADER.pack(_MAGIC, CACHE_VERSION, len(lines), len(coords.word_offsets) - 1, len(coords.points),
+                          int(text_offsets[-1]))
+    return b"".join([header, text_offsets.tobytes(), coords.line_offsets.astype(np.int64).tobytes(),
+                     coords.word_offsets.astype(np.int64).tobytes(), coords.points.astype(np.int32).tobytes(), *text])
+
+
+def _decode_lines(record: bytes) -> list[TextLine] | None:
+    """
+    Unpack a record written by _encode_lines, None if it isn't a record of the current version
+    The lines view the coordinate arrays in place, no per-word objects are made
+    :param record: bytes
+    :return: list[TextLine] | None
+    """
+    if len(record) < _HEADER.size:
+        return None
+    magic, version, n_lines, n_words, n_points, n_text_bytes = _HEADER.unpack_from(record)
+    if magic != _MAGIC or version != CACHE_VERSION:
+        return None
+
+    offset = _HEADER.size
+    text_offsets = np.frombuffer(record, dtype=np.int64, count=n_lines + 1, offset=offset).tolist()
+    offset += 8 * (n_lines + 1)
+    line_offsets = np.frombuffer(record, dtype=np.int64, count=n_lines + 1, offset=offset)
+    offset += 8 * (n_lines + 1)
+    word_offsets = np.frombuffer(record, dtype=np.int64, count=n_words + 1, offset=offset)
+    offset += 8 * (n_words + 1)
+    points = np.frombuffer(record, dtype=np.int32, count=2 * n_points, offset=offset).reshape(-1, 2)
+    offset += 8 * n_points
+    text = record[offset: offset + n_text_bytes]
+
+    coords = WordCoords(points, word_offsets, line_offsets)
+    return [TextLine(text[text_offsets[i]: text_offsets[i + 1]].decode("utf-8"), coords, i) for i in range(n_lines)]
+
+
+class PageCache:
+    """
+    On-disk cache of the lines extracted from each page xml
+    Records are keyed by the xml's absolute path, size and modification time, so an edited or re-exported
+    page misses and is parsed again, and its record for the old contents is removed when the new one is put.
+    Each page's records are kept in a folder of their own, named by the hash of its path, so finding them lists
+    that folder alone rather than the whole cache.
+    Set hash_content to key on a hash of the file's bytes instead.
+    Once the directory holds more than max_bytes the least recently used records are evicted.
+    Pass cache=None to the extraction functions to bypass it.
+    """
+    suffix = ".page"
+
+    def __init__(self, directory: str | os.PathLike, max_bytes: int = 512 * 2 ** 20, hash_content: bool = False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hash_content = hash_content
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # total bytes on disk, counted on the first write
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, xml: str | os.PathLike) -> str:
+        """
+        The cache key for a page xml, a hash of its path then a hash of its contents, so every record of a page
+        shares a prefix, the folder its records are kept in
+        :param xml: location of a transkribus model output xml
+        :return: str
+        """
+        path = os.path.abspath(xml)
+        if self.hash_content:
+            with open(path, "rb") as f:
+                fingerprint = hashlib.sha1(f.read()).hexdigest()
+        else:
+            stat = os.stat(path)
+            fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+        path_key = hashlib.sha1(f"{CACHE_VERSION}:{path}".encode("utf-8")).hexdigest()
+        return path_key + "_" + hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+
+    def _page_dir(self, key: str) -> str:
+        return os.path.join(self.directory, key.split("_")[0])
+
+    def _record_path(self, key: str) -> str:
+        return os.path.join(self._page_dir(key), key.split("_")[1] + self.suffix)
+
+    def get(self, xml: str | os.PathLike) -> list[TextLine] | None:
+        """
+        Lines for a page if there is a record for its current contents, else None
+        :param xml: location of a transkribus model output xml
+        :return: list[TextLine] | None
+        """
+        record_path = self._record_path(self.key(xml))
+        try:
+            with open(record_path, "rb") as f:
+                lines = _decode_lines(f.read())
+        except FileNotFoundError:
+            lines = None
+
+        if lines is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        os.utime(record_path)  # mark as recently used for eviction
+        return lines
+
+    def put(self, xml: str | os.PathLike, lines: list[TextLine]) -> None:
+        """
+        Store the lines extracted from a page
+        :param xml: location of a transkribus model output xml
+        :param lines: list[TextLine]
+        :return: None
+        """
+        record = _encode_lines(lines)
+        key = self.key(xml)
+        record_path = self._record_path(key)
+        # records of the page's earlier contents, and this one if it's being overwritten, no longer count
+        replaced = [(path, size) for path, size, _ in self._records(self._page_dir(key))]
+        os.makedirs(self._page_dir(key), exist_ok=True)
+        tmp_path = f"{record_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(record)
+        os.replace(tmp_path, record_path)  # atomic, a reader never sees a partial record
+        for path, _ in replaced:
+            if path != record_path:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:  # removed by another process sharing the cache
+                    pass
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._records())
+        else:
+            self._size += len(record) - sum(size for _, size in replaced)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def invalidate(self, xml: str | os.PathLike) -> None:
+        """
+        Remove the records for a page, if any
+        :param xml: location of a transkribus model output xml
+        :return: None
+        """
+        page_dir = self._page_dir(self.key(xml))
+        for path, _, _ in self._records(page_dir):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._remove_dir(page_dir)
+        self._size = None
+
+    def clear(self) -> None:
+        """
+        Remove every record
+        :return: None
+        """
+        for path, _, _ in self._records():
+            os.remove(path)
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_dir():
+                    self._remove_dir(entry.path)
+        self._size = 0
+
+    @staticmethod
+    def _remove_dir(page_dir: str) -> None:
+        try:
+            os.rmdir(page_dir)
+        except OSError:  # not empty, a record put by another process sharing the cache, or already removed
+            pass
+
+    def _records(self, page_dir: str | None = None) -> list[tuple[str, int, int]]:
+        """
+        (path, size, last used) of every record on disk, or of those in one page's folder
+        """
+        if page_dir is not None:
+            try:
+                with os.scandir(page_dir) as it:
+                    return [(entry.path, entry.stat().st_size, entry.stat().st_mtime_ns) for entry in it
+                            if entry.name.endswith(self.suffix)]
+            except FileNotFoundError:
+                return []
+        with os.scandir(self.directory) as it:
+            return [record for entry in it if entry.is_dir() for record in self._records(entry.path)]
+
+    def _evict(self) -> None:
+        """
+        Remove least recently used records until the cache is back under max_bytes
+        """
+        records = sorted(self._records(), key=lambda x: x[2])
+        self._size = sum(size for _, size, _ in records)
+        for path, size, _ in records:
+            if self._size <= self.max_bytes:
+                break
+            os.remove(path)
+            self._remove_dir(os.path.dirname(path))
+            self._size -= size
@@ -0,0 +1,121 @@
+from typing import Iterable
+import numpy as np
+
+
+def word_counts(lines: list[str]) -> np.ndarray:
+    """
+    Number of words in each line
+    :param lines: list[str]
+    :return: np.ndarray: int32
+    """
+    return np.fromiter((len(x.split()) for x in lines), dtype=np.int32, count=len(lines))
+
+
+def page_word_counts(pages: Iterable[list[str]]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Word counts of every line of a run of pages, in one array
+    :param pages: Iterable[list[str]]: the lines of each page
+    :return: tuple[np.ndarray, np.ndarray]: word counts, offsets of each page's lines followed by the total
+    """
+    return _concat_pages([word_counts(lines) for lines in pages])
+
+
+def _concat_pages(page_counts: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(page_counts) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in page_counts], out=offsets[1:])
+    return np.concatenate(page_counts) if page_counts else np.zeros(0, dtype=np.int32), offsets
+
+
+class CorpusStats:
+    """
+    Running mean and standard deviation of line word counts, updated a volume at a time
+    Batches are combined exactly (Chan et al.), so stats over many volumes never need their counts held together.
+    std is the population standard deviation, as np.std
+    """
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared differences from the mean
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / self.n)) if self.n else 0.0
+
+    def update(self, counts: np.ndarray) -> "CorpusStats":
+        """
+        Add a batch of word counts
+        :param counts: np.ndarray
+        :return: CorpusStats: self
+        """
+        if len(counts) == 0:
+            return self
+        batch = CorpusStats()
+        batch.n = len(counts)
+        batch.mean = float(np.mean(counts))
+        batch.m2 = float(np.sum((counts - batch.mean) ** 2))
+        return self.merge(batch)
+
+    def merge(self, other: "CorpusStats") -> "CorpusStats":
+        """
+        Combine with stats gathered elsewhere, e.g. in another process
+        :param other: CorpusStats
+        :return: CorpusStats: self
+        """
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta ** 2 * self.n * other.n / n
+        self.n = n
+        return self
+
+
+def outliers_per_page(counts: np.ndarray, offsets: np.ndarray, mean: float, std: float,
+                      threshold: float = 2) -> np.ndarray:
+    """
+    Number of lines on each page whose word count z-score is above threshold, too long for a well scanned line
+    :param counts: np.ndarray: from page_word_counts
+    :param offsets: np.ndarray: from page_word_counts
+    :param mean: float
+    :param std: float
+    :param threshold: float
+    :return: np.ndarray
+    """
+    outlier = (counts - mean) / std > threshold
+    cumulative = np.concatenate([[0], np.cumsum(outlier)])
+    return cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+
+
+def corpus_poorly_scanned_pages(volumes: Iterable[Iterable[tuple[str, list[str]]]],
+                                threshold: float = 2,
+                                max_outliers: int = 5) -> list[str]:
+    """
+    Poorly scanned pages across many volumes, scored against statistics for the whole corpus
+    Pages are streamed, e.g. from iter_vol_lines, and only their word counts are kept
+    :param volumes: Iterable[Iterable[tuple[str, list[str]]]]: the (label, lines) of each page of each volume
+    :param threshold: float: z-score above which a line is an outlier
+    :param max_outliers: int: pages with more outlying lines than this are poorly scanned
+    :return: list[str]: page labels
+    """
+    stats = CorpusStats()
+    vol_counts = []
+    for pages in volumes:
+        labels, page_counts = [], []
+        for label, lines in pages:
+            labels.append(label)
+            page_counts.append(word_counts(lines))
+        counts, offsets = _concat_pages(page_counts)
+        stats.update(counts)
+        vol_counts.append((counts, offsets, labels))
+
+    poorly_scanned = []
+    for counts, offsets, labels in vol_counts:
+        outliers = outliers_per_page(counts, offsets, stats.mean, stats.std, threshold)
+        poorly_scanned += [label for label, n in zip(labels, outliers) if n > max_outliers]
+    return poorly_scanned
@@ -0,0 +1,157 @@
+"""
+Reconcile the shelfmarks extracted from every processed volume with the record IDs of the bll01 catalogue index
+    python -m src.data.reconcile data/processed --bll01 data/processed/bll01_index.csv
+Shelfmarks on both sides are reduced to the same key, and the entries joined to the index records on it in bulk.
+Entries are matched to one record, ambiguous between several, or unmatched; index records no entry matched are
+listed as well. The four tables are written as csvs to <out>/reconciliation.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import pandas as pd
+from src.data.entry_store import load_entries
+from src.data.incremental import entries_name
+from src.data.search_index import shelfmark_parts, normalise_shelfmark
+
+bll01_columns = {"British Library shelfmark (852 $j)": "bll01_shelfmark", "Record IDs (001)": "record_id"}
+reconciliation_dir = "reconciliation"
+
+_prefixes = {"IA", "IB", "IC", "G", "C"}
+_copy_re = re.compile(r"\(\s*(\d[\d.,\- ]*)\)")  # a bracketed copy number, e.g. the (1. ) of G. 7726. (1. )
+_split_re = re.compile(r"\s*;\s*|\s*&\s*(?=[A-Za-z])")  # between the shelfmarks of a record, e.g. IB. 1. ; IB. 2
+_vol_dir_re = re.compile(r"BMC_(\d{1,2})$")
+
+
+def shelfmark_key(shelfmark: str) -> tuple[str | None, str | None]:
+    """
+    The key a shelfmark is joined on, and its copy number
+    The key runs from the first IA, IB, IC, G or C to the first word after it, so spacing, punctuation, asterisks,
+    anything before the shelfmark (MAPS Maps C. 1. d. 3) and notes after it (IA. 55330. Fragment: ...) are ignored.
+    A bracketed copy number is left out of the key and given separately.
+    :param shelfmark: str: e.g. G. 7726. (1. ) gives (G.7726, 1)
+    :return: tuple[str | None, str | None]: the key, None if there's no shelfmark prefix, and the copy number
+    """
+    copies = _copy_re.findall(shelfmark)
+    copy = normalise_shelfmark(copies[0]) if copies else None
+    parts = shelfmark_parts(_copy_re.sub(" ", shelfmark).upper())
+
+    for i, part in enumerate(parts):
+        if part in _prefixes:
+            break
+    else:
+        return None, copy
+    key = [parts[i]]
+    for part in parts[i + 1:]:
+        if part.isalpha() and len(part) > 2:  # a word, the shelfmark has ended
+            break
+        key.append(part)
+    return ".".join(key), copy
+
+
+def _with_keys(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    keys = [shelfmark_key(x) for x in df[column]]
+    df = df.assign(key=[x[0] for x in keys], copy=[x[1] for x in keys])
+    return df[df["key"].notna()]
+
+
+def read_bll01_index(path: str | os.PathLike) -> pd.DataFrame:
+    """
+    Read the bll01 index, one row per shelfmark, so a record holding several (IB. 20307. ; IB. 20297) has a row each
+    :param path: str | os.PathLike: bll01_index.csv
+    :return: pd.DataFrame: record_id, bll01_shelfmark, and the shelfmark of the row
+    """
+    index_df = pd.read_csv(path, encoding="latin-1", usecols=list(bll01_columns), dtype=str)
+    index_df = index_df.rename(columns=bll01_columns).dropna()
+    index_df["shelfmark"] = index_df["bll01_shelfmark"].apply(_split_re.split)
+    return index_df.explode("shelfmark", ignore_index=True)
+
+
+def volume_shelfmarks(out_root: str | os.PathLike) -> pd.DataFrame:
+    """
+    The shelfmark of every entry of every volume processed to out_root, read from their entry tables
+    :param out_root: str | os.PathLike: a pipeline output directory, holding BMC_<vol>/catalogue_entries.parquet
+    :return: pd.DataFrame: volume, vol_entry_num, shelfmark, xmls
+    """
+    volumes = []
+    with os.scandir(out_root) as vol_dirs:
+        for vol_dir in vol_dirs:
+            match = _vol_dir_re.match(vol_dir.name)
+            table_path = os.path.join(vol_dir.path, entries_name)
+            if vol_dir.is_dir() and match and os.path.exists(table_path):
+                entry_df = load_entries(table_path, columns=["vol_entry_num", "shelfmark", "xmls"])
+                volumes.append(entry_df.assign(volume=int(match.group(1))))
+    if not volumes:
+        return pd.DataFrame(columns=["volume", "vol_entry_num", "shelfmark", "xmls"])
+    entries_df = pd.concat(volumes, ignore_index=True)[["volume", "vol_entry_num", "shelfmark", "xmls"]]
+    return entries_df.sort_values(["volume", "vol_entry_num"], ignore_index=True)
+
+
+def reconcile(entries_df: pd.DataFrame, index_df: pd.DataFrame) -> dict[str: pd.DataFrame]:
+    """
+    Join extracted shelfmarks to index records on their keys
+    An entry whose key belongs to several records is matched if its copy number picks out one of them
+    :param entries_df: pd.DataFrame: volume, vol_entry_num and shelfmark of each entry, see volume_shelfmarks
+    :param index_df: pd.DataFrame: record_id and shelfmark of each record, see read_bll01_index
+    :return: dict[str: pd.DataFrame]:
+             matched: each entry with a key and the record_id it matched
+             ambiguous: each entry with a key and the record_ids it could be
+             unmatched: each entry with a key that no record has
+             unmatched_records: each index record that no entry matched
+    """
+    entries = _with_keys(entries_df[entries_df["shelfmark"].notna()], "shelfmark")
+    records = _with_keys(index_df, "shelfmark").drop_duplicates(["record_id", "key", "copy"])
+
+    candidates = (records.groupby("key", sort=False)["record_id"].agg(lambda x: list(dict.fromkeys(x)))
+                  .rename("record_ids"))
+    joined = entries.join(candidates, on="key")
+    n_candidates = joined["record_ids"].apply(lambda x: len(x) if isinstance(x, list) else 0)
+
+    # of entries with several candidates, those whose copy number is on exactly one of them are matched to it
+    copies = {key: list(dict.fromkeys(ids)) for key, ids in
+              records[records["copy"].notna()].groupby(["key", "copy"], sort=False)["record_id"]}
+    several = joined[n_candidates > 1]
+    resolved = {}
+    for i, key, copy in zip(several.index, several["key"], several["copy"]):
+        ids = copies.get((key, copy), [])
+        if len(ids) == 1:
+            resolved[i] = ids[0]
+
+    joined["record_id"] = [ids[0] if n == 1 else resolved.get(i)
+                           for i, ids, n in zip(joined.index, joined["record_ids"], n_candidates)]
+    matched = joined[joined["record_id"].notna()].drop(columns="record_ids")
+    ambiguous = several[~several.index.isin(list(resolved))]
+    unmatched = joined[n_candidates == 0].drop(columns=["record_ids", "record_id"])
+    unmatched_records = index_df[~index_df["record_id"].isin(matched["record_id"])]
+    unmatched_records = unmatched_records.drop_duplicates("record_id")[["record_id", "bll01_shelfmark"]]
+
+    return {"matched": matched.reset_index(drop=True), "ambiguous": ambiguous.reset_index(drop=True),
+            "unmatched": unmatched.reset_index(drop=True), "unmatched_records": unmatched_records.reset_index(drop=True)}
+
+
+def save_reconciliation(result: dict[str: pd.DataFrame], out_dir: str | os.PathLike) -> None:
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in result.items():
+        path = os.path.join(out_dir, f"{name}.csv")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)  # atomic, a reader never sees a partial table
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_root", help="pipeline output directory")
+    parser.add_argument("--bll01", default=os.path.join("data", "processed", "bll01_index.csv"))
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    result = reconcile(volume_shelfmarks(args.out_root), read_bll01_index(args.bll01))
+    save_reconciliation(result, os.path.join(args.out_root, reconciliation_dir))
+    print(", ".join(f"{len(df)} {name.replace('_', ' ')}" for name, df in result.items())
+          + f" in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,8 @@
+import os
 import re
+import numpy as np
+import pandas as pd
+from src.data.word_coords import WordCoords, LinePoints
 
 def reconstruct_word_coords(s):
     line_re = re.compile(r"\[\[.*?\]\]")
@@ -27,3 +31,99 @@ def reconstruct_xml_start_line(s):
 
 converters = {"word_locations": reconstruct_word_coords, "en_only": reconstruct_en_entry, "xmls": reconstruct_xmls,
               "xml_start_line": reconstruct_xml_start_line}
+
+
+_allowed_chars = np.zeros(256, dtype=bool)
+_allowed_chars[np.frombuffer(b"[](), -0123456789", dtype=np.uint8)] = True
+
+
+def parse_word_locations(cells: pd.Series) -> tuple[list[list[LinePoints] | None], list]:
+    """
+    Parse a whole column of stringified word_locations in one vectorised pass over its characters
+    Cells look like [[[(x0, y0), (x1, y1)], ...], ...] - entry > line > word > point, as written by to_csv
+    Unlike reconstruct_word_coords, lines without words are kept so lines stay aligned with xml_start_line
+    :param cells: pd.Series: the raw word_locations strings
+    :return: the LinePoints of each line of each row, viewing one WordCoords, None for rows that can't be parsed,
+             and the index labels of those rows
+    """
+    cells = cells.where(cells.apply(lambda x: isinstance(x, str)), "")
+    text = "\n".join(cells).encode("ascii", errors="replace")  # replaced chars fail the allowed check below
+    c = np.frombuffer(text, dtype=np.uint8)
+    n_cells = len(cells)
+
+    cell_lengths = np.fromiter((len(x) for x in cells), dtype=np.int64, count=n_cells)
+    cell_starts = np.zeros(n_cells, dtype=np.int64)
+    np.cumsum(cell_lengths[:-1] + 1, out=cell_starts[1:])
+    cell_ends = cell_starts + cell_lengths
+    char_cell = np.repeat(np.arange(n_cells), cell_lengths + 1)[:len(c)]  # the newline joining cells counts as the cell before
+
+    opens = c == ord("[")
+    closes = c == ord("]")
+    depth = np.cumsum(opens.astype(np.int64) - closes)  # depth after each char
+    depth -= np.concatenate([[0], depth])[cell_starts][char_cell]  # counted from the start of each cell
+    is_digit = (c >= ord("0")) & (c <= ord("9"))
+
+    # a row is bad if it isn't exactly one list nested at most 3 deep holding only numbers in words
+    bad = cell_lengths == 0
+    bad |= np.bincount(char_cell[~(_allowed_chars[c] | (c == ord("\n")))], minlength=n_cells) > 0
+    nonempty = cell_lengths > 0
+    first = np.where(nonempty, cell_starts, 0)
+    last = np.where(nonempty, cell_ends - 1, 0)
+    bad |= nonempty & ((c[first] != ord("[")) | (c[last] != ord("]")))
+    bad |= nonempty & (depth[last] != 0)
+    bad |= nonempty & (np.bincount(char_cell[opens & (depth == 1)], minlength=n_cells) != 1)
+    inside = char_cell[(depth > 3) | (depth < 0) | ((depth == 0) & ~closes & (c != ord("\n")))]
+    bad |= np.bincount(inside, minlength=n_cells) > 0
+    bad |= np.bincount(char_cell[is_digit & (depth != 3)], minlength=n_cells) > 0
+
+    # numbers are runs of digits, optionally signed
+    starts = np.flatnonzero(is_digit & ~np.concatenate([[False], is_digit[:-1]]))
+    ends = np.flatnonzero(is_digit & ~np.concatenate([is_digit[1:], [False]])) + 1
+    bad |= np.bincount(char_cell[starts[ends - starts > 9]], minlength=n_cells) > 0  # would overflow int32
+    run_ends = np.repeat(ends, ends - starts)
+    digits = np.flatnonzero(is_digit)
+    place = np.power(10, (run_ends - digits - 1).clip(0, 9), dtype=np.int64)
+    values = np.add.reduceat((c[digits] - ord("0")) * place, np.searchsorted(digits, starts)) if len(starts) else \
+        np.zeros(0, dtype=np.int64)
+    values = np.where(c[np.maximum(starts - 1, 0)] == ord("-"), -values, values)
+
+    line_starts = np.flatnonzero(opens & (depth == 2))
+    word_starts = np.flatnonzero(opens & (depth == 3))
+    number_word = np.searchsorted(word_starts, starts, side="right") - 1
+    bad |= np.bincount(char_cell[starts[(number_word < 0) | (char_cell[word_starts[number_word]] != char_cell[starts])]],
+                       minlength=n_cells) > 0
+    numbers_per_word = np.bincount(number_word[number_word >= 0], minlength=len(word_starts))
+    bad |= np.bincount(char_cell[word_starts[numbers_per_word % 2 == 1]], minlength=n_cells) > 0
+
+    # keep only the lines, words and numbers of good rows
+    line_starts = line_starts[~bad[char_cell[line_starts]]]
+    word_starts = word_starts[~bad[char_cell[word_starts]]]
+    good_numbers = ~bad[char_cell[starts]]
+    starts, values = starts[good_numbers], values[good_numbers]
+    numbers_per_word = np.bincount(np.searchsorted(word_starts, starts, side="right") - 1, minlength=len(word_starts))
+    words_per_line = np.bincount(np.searchsorted(line_starts, word_starts, side="right") - 1, minlength=len(line_starts))
+    coords = WordCoords.from_counts(values, words_per_line, numbers_per_word // 2)
+
+    lines_per_cell = np.bincount(char_cell[line_starts], minlength=n_cells)
+    cell_line_offsets = np.concatenate([[0], np.cumsum(lines_per_cell)]).tolist()
+    word_locations = [None if bad[i] else [coords.line(j) for j in range(cell_line_offsets[i], cell_line_offsets[i + 1])]
+                      for i in range(n_cells)]
+
+    return word_locations, cells.index[bad].tolist()
+
+
+def read_entries_csv(path: str | os.PathLike) -> tuple[pd.DataFrame, list]:
+    """
+    Bulk load a legacy catalogue_entries.csv, parsing word_locations in a single pass rather than per cell
+    :param path: str | os.PathLike
+    :return: the entry table, and the index labels of rows whose word_locations couldn't be parsed,
+             which are left as None rather than an empty list
+    """
+    csv_converters = {k: v for k, v in converters.items() if k != "word_locations"}
+    entry_df = pd.read_csv(path, converters=csv_converters, index_col=0, dtype={"word_locations": object})
+    bad_rows = []
+    if "word_locations" in entry_df.columns:
+        word_locations, bad_rows = parse_word_locations(entry_df["word_locations"])
+        entry_df["word_locations"] = pd.Series(word_locations, index=entry_df.index, dtype=object)
+
+    return entry_df, bad_rows
@@ -0,0 +1,256 @@
+"""
+Find catalogue entries across every processed volume by shelfmark or by the words of their text
+    python -m src.data.search_index data/processed --shelfmark "IA. 52359"
+    python -m src.data.search_index data/processed --prefix "IA. 523"
+    python -m src.data.search_index data/processed --text "ars moriendi"
+The index is a sqlite database in the output directory, built from the catalogue_entries.parquet of each volume and
+refreshed only for volumes whose table has changed. Queries read the index alone, never the entry tables.
+"""
+import os
+import re
+import sys
+import json
+import sqlite3
+import argparse
+import unicodedata
+from typing import Iterable
+import pandas as pd
+from src.data.entry_store import load_entries
+from src.data.incremental import entries_name
+
+# Bump when the schema or the normalisation of shelfmarks or tokens changes, an index of another version is rebuilt
+INDEX_VERSION = 1
+index_name = "search_index.sqlite"
+
+_vol_dir_re = re.compile(r"BMC_(\d{1,2})$")
+_token_re = re.compile(r"\w+")
+_shelfmark_part_re = re.compile(r"[^\W\d_]+|\d+")
+_MAX_CHAR = chr(0x10FFFF)  # sorts after any character, so prefix <= x < prefix + _MAX_CHAR is a prefix range
+
+_schema = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS volumes (volume INTEGER PRIMARY KEY, size INTEGER, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    volume INTEGER,
+    vol_entry_num INTEGER,
+    shelfmark TEXT,
+    shelfmark_key TEXT,
+    pages TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_shelfmark ON entries (shelfmark_key);
+CREATE INDEX IF NOT EXISTS entries_volume ON entries (volume, vol_entry_num);
+CREATE TABLE IF NOT EXISTS postings (token TEXT, entry_id INTEGER, PRIMARY KEY (token, entry_id)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_entry ON postings (entry_id);
+"""
+
+
+def shelfmark_parts(shelfmark: str) -> list[str]:
+    """
+    The runs of letters and of digits of a shelfmark, whatever separates them, e.g. ["IA", "52359"] for "IA. 52359"
+    Shelfmarks are compared by these parts, here and when reconciling them with the bll01 index, see src.data.reconcile
+    :param shelfmark: str
+    :return: list[str]
+    """
+    return _shelfmark_part_re.findall(shelfmark)
+
+
+def normalise_shelfmark(shelfmark: str) -> str:
+    """
+    The form shelfmarks are indexed and looked up by, so "IA. 52359", "IA.52359", "IA 52359" and "ia, 52359." are all
+    IA.52359. The runs of letters and of digits are kept, joined by stops, whatever separated them.
+    :param shelfmark: str: e.g. a shelfmark found by i_re, g_re or c_re
+    :return: str
+    """
+    return ".".join(shelfmark_parts(shelfmark)).upper()
+
+
+def tokenise(text: str) -> list[str]:
+    """
+    The words of some text as they are indexed: casefolded and without accents, so bûch is found by buch
+    :param text: str
+    :return: list[str]
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return _token_re.findall("".join(c for c in text if not unicodedata.combining(c)))
+
+
+class SearchIndex:
+    """
+    Shelfmark and full-text lookup of the entries of many volumes, kept in a sqlite database
+    Shelfmarks are stored normalised with an index, so exact and prefix lookups are a range scan. Each distinct
+    token of an entry's text is stored against the entry, so a word query reads only the postings of its words.
+    Results give each entry's volume, vol_entry_num, shelfmark and pages, in volume order.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        version = None
+        try:
+            version = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        except sqlite3.OperationalError:
+            pass
+        if version is None or int(version[0]) != INDEX_VERSION:
+            self._create()
+
+    def _create(self) -> None:
+        with self.connection:
+            for table in ("meta", "volumes", "entries", "postings"):
+                self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+            self.connection.executescript(_schema)
+            self.connection.execute("INSERT INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def volumes(self) -> list[int]:
+        return [row[0] for row in self.connection.execute("SELECT volume FROM volumes ORDER BY volume")]
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def add_volume(self, volume: int, entry_df: pd.DataFrame, size: int = 0, mtime_ns: int = 0) -> None:
+        """
+        Index the entries of a volume, replacing any already indexed for it
+        :param volume: int
+        :param entry_df: pd.DataFrame: needs the xmls, vol_entry_num, shelfmark and entry_text columns
+        :param size: int: size of the table the entries were read from, see refresh
+        :param mtime_ns: int: modification time of the table the entries were read from
+        :return: None
+        """
+        with self.connection:
+            self._remove_volume(volume)
+            self.connection.execute("INSERT INTO volumes VALUES (?, ?, ?)", (volume, size, mtime_ns))
+            for xmls, entry_num, shelfmark, text in zip(entry_df["xmls"], entry_df["vol_entry_num"],
+                                                        entry_df["shelfmark"], entry_df["entry_text"]):
+                shelfmark = shelfmark if isinstance(shelfmark, str) else None
+                key = normalise_shelfmark(shelfmark) if shelfmark else None
+                entry_id = self.connection.execute(
+                    "INSERT INTO entries (volume, vol_entry_num, shelfmark, shelfmark_key, pages) "
+                    "VALUES (?, ?, ?, ?, ?)", (volume, int(entry_num), shelfmark, key, json.dumps(list(xmls)))
+                ).lastrowid
+                tokens = set(tokenise(text)) if isinstance(text, str) else set()
+                self.connection.executemany("INSERT INTO postings VALUES (?, ?)",
+                                            ((token, entry_id) for token in tokens))
+
+    def remove_volume(self, volume: int) -> None:
+        with self.connection:
+            self._remove_volume(volume)
+
+    def _remove_volume(self, volume: int) -> None:
+        self.connection.execute("DELETE FROM postings WHERE entry_id IN (SELECT id FROM entries WHERE volume = ?)",
+                                (volume,))
+        self.connection.execute("DELETE FROM entries WHERE volume = ?", (volume,))
+        self.connection.execute("DELETE FROM volumes WHERE volume = ?", (volume,))
+
+    def refresh(self, out_root: str | os.PathLike) -> dict:
+        """
+        Bring the index up to date with the entry tables of the volumes processed to out_root
+        Only volumes whose catalogue_entries.parquet has changed size or modification time are read again
+        :param out_root: str | os.PathLike: a pipeline output directory, holding BMC_<vol>/catalogue_entries.parquet
+        :return: dict: the volumes added or updated, and removed
+        """
+        tables = {}
+        with os.scandir(out_root) as vol_dirs:
+            for vol_dir in vol_dirs:
+                match = _vol_dir_re.match(vol_dir.name)
+                table_path = os.path.join(vol_dir.path, entries_name)
+                if vol_dir.is_dir() and match and os.path.exists(table_path):
+                    tables[int(match.group(1))] = table_path
+
+        indexed = {row[0]: tuple(row[1:]) for row in self.connection.execute("SELECT * FROM volumes")}
+        updated, removed = [], sorted(set(indexed) - set(tables))
+        for volume in removed:
+            self.remove_volume(volume)
+        for volume, table_path in sorted(tables.items()):
+            stat = os.stat(table_path)
+            if indexed.get(volume) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            entry_df = load_entries(table_path, columns=["xmls", "vol_entry_num", "shelfmark", "entry_text"])
+            self.add_volume(volume, entry_df, stat.st_size, stat.st_mtime_ns)
+            updated.append(volume)
+
+        return {"updated": updated, "removed": removed}
+
+    def _results(self, where: str, params: Iterable, limit: int | None) -> list[dict]:
+        query = (f"SELECT volume, vol_entry_num, shelfmark, pages FROM entries WHERE {where} "
+                 f"ORDER BY volume, vol_entry_num" + (" LIMIT ?" if limit is not None else ""))
+        params = list(params) + ([limit] if limit is not None else [])
+        return [{"volume": volume, "vol_entry_num": entry_num, "shelfmark": shelfmark, "pages": json.loads(pages)}
+                for volume, entry_num, shelfmark, pages in self.connection.execute(query, params)]
+
+    def shelfmark(self, shelfmark: str, limit: int | None = None) -> list[dict]:
+        """
+        Entries with a shelfmark, however it is spaced or punctuated
+        :param shelfmark: str: e.g. IA. 52359
+        :param limit: int | None: most results to give, None for all
+        :return: list[dict]: volume, vol_entry_num, shelfmark and pages of each entry
+        """
+        return self._results("shelfmark_key = ?", [normalise_shelfmark(shelfmark)], limit)
+
+    def shelfmark_prefix(self, prefix: str, limit: int | None = None) -> list[dict]:
+        """
+        Entries with a shelfmark starting with prefix, e.g. "IA. 523" for IA. 52359 or "C. 9" for C. 9. d. 12
+        :param prefix: str
+        :param limit: int | None: most results to give, None for all
+        :return: list[dict]: volume, vol_entry_num, shelfmark and pages of each entry
+        """
+        key = normalise_shelfmark(prefix)
+        return self._results("shelfmark_key >= ? AND shelfmark_key < ?", [key, key + _MAX_CHAR], limit)
+
+    def search(self, text: str, limit: int | None = None) -> list[dict]:
+        """
+        Entries holding every word of text, a word ending in * matches any word it starts
+        :param text: str: e.g. "ars moriendi" or "moriend*"
+        :param limit: int | None: most results to give, None for all
+        :return: list[dict]: volume, vol_entry_num, shelfmark and pages of each entry
+        """
+        terms, params = [], []
+        for word in text.split():
+            for token in tokenise(word):
+                if word.endswith("*"):
+                    terms.append("SELECT entry_id FROM postings WHERE token >= ? AND token < ?")
+                    params += [token, token + _MAX_CHAR]
+                else:
+                    terms.append("SELECT entry_id FROM postings WHERE token = ?")
+                    params.append(token)
+        if not terms:
+            return []
+        return self._results(f"id IN ({' INTERSECT '.join(terms)})", params, limit)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_root", help="pipeline output directory, the index is kept in it")
+    query = parser.add_mutually_exclusive_group(required=True)
+    query.add_argument("--shelfmark", help="entries with this shelfmark")
+    query.add_argument("--prefix", help="entries with a shelfmark starting with this")
+    query.add_argument("--text", help="entries holding all these words")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with SearchIndex(os.path.join(args.out_root, index_name)) as index:
+        index.refresh(args.out_root)
+        if args.shelfmark is not None:
+            results = index.shelfmark(args.shelfmark, args.limit)
+        elif args.prefix is not None:
+            results = index.shelfmark_prefix(args.prefix, args.limit)
+        else:
+            results = index.search(args.text, args.limit)
+
+    for result in results:
+        print(f"Volume {result['volume']} entry {result['vol_entry_num']} {result['shelfmark']}: "
+              f"{', '.join(result['pages'])}")
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
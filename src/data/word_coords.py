@@ -0,0 +1,156 @@
+import numpy as np
+
+
+class WordCoords:
+    """
+    Ragged word coordinates for a run of lines, e.g. every line of a volume
+    points holds the (x, y) coordinates of every word contiguously as int32
+    word_offsets[w]: word_offsets[w + 1] are the rows of points for word w
+    line_offsets[i]: line_offsets[i + 1] are the words of line i
+    """
+    __slots__ = ("points", "word_offsets", "line_offsets")
+
+    def __init__(self, points: np.ndarray, word_offsets: np.ndarray, line_offsets: np.ndarray):
+        self.points = points
+        self.word_offsets = word_offsets
+        self.line_offsets = line_offsets
+
+    def __len__(self) -> int:
+        return len(self.line_offsets) - 1
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, WordCoords):
+            return NotImplemented
+        return (np.array_equal(self.points, other.points) and np.array_equal(self.word_offsets, other.word_offsets)
+                and np.array_equal(self.line_offsets, other.line_offsets))
+
+    @classmethod
+    def from_counts(cls, points: np.ndarray, words_per_line: list[int], points_per_word: list[int]) -> "WordCoords":
+        """
+        Build from flat points and the number of words in each line and points in each word
+        :param points: array-like of ints, x, y pairs
+        :param words_per_line: list[int]
+        :param points_per_word: list[int]
+        :return: WordCoords
+        """
+        line_offsets = np.zeros(len(words_per_line) + 1, dtype=np.int64)
+        np.cumsum(words_per_line, out=line_offsets[1:])
+        word_offsets = np.zeros(len(points_per_word) + 1, dtype=np.int64)
+        np.cumsum(points_per_word, out=word_offsets[1:])
+        return cls(np.asarray(points, dtype=np.int32).reshape(-1, 2), word_offsets, line_offsets)
+
+    @classmethod
+    def from_nested(cls, lines_points: list[list[list[tuple[int, int]]]]) -> "WordCoords":
+        """
+        Build from the nested lists of a line, word and (x, y) point
+        :param lines_points: list[list[list[tuple[int, int]]]]
+        :return: WordCoords
+        """
+        words = [word for line_points in lines_points for word in line_points]
+        points = [c for word in words for xy in word for c in xy]
+        return cls.from_counts(points, [len(x) for x in lines_points], [len(word) for word in words])
+
+    @classmethod
+    def from_lines(cls, lines: list) -> "WordCoords":
+        """
+        Gather the coordinates viewed by each of a list of lines into one contiguous WordCoords
+        Consecutive lines viewing consecutive rows of the same store, e.g. the lines of a page, are copied as one slice
+        :param lines: list[TextLine]
+        :return: WordCoords
+        """
+        runs = []  # [store, first line, last line + 1]
+        for line in lines:
+            coords, index = line.coords, line.index
+            if coords is None:
+                coords, index = cls.from_nested([[]]), 0
+            if runs and runs[-1][0] is coords and runs[-1][2] == index:
+                runs[-1][2] += 1
+            else:
+                runs.append([coords, index, index + 1])
+
+        points, word_offsets, line_offsets = [], [np.zeros(1, dtype=np.int64)], [np.zeros(1, dtype=np.int64)]
+        n_points, n_words = 0, 0
+        for coords, start, stop in runs:
+            w0, w1 = coords.line_offsets[start], coords.line_offsets[stop]
+            p0, p1 = coords.word_offsets[w0], coords.word_offsets[w1]
+            points.append(coords.points[p0: p1])
+            word_offsets.append(coords.word_offsets[w0 + 1: w1 + 1] - p0 + n_points)
+            line_offsets.append(coords.line_offsets[start + 1: stop + 1] - w0 + n_words)
+            n_points += p1 - p0
+            n_words += w1 - w0
+
+        return cls(np.concatenate(points) if points else np.zeros((0, 2), dtype=np.int32),
+                   np.concatenate(word_offsets), np.concatenate(line_offsets))
+
+    def line(self, i: int) -> "LinePoints":
+        return LinePoints(self, i)
+
+    def word_range(self, i: int) -> tuple[int, int]:
+        return int(self.line_offsets[i]), int(self.line_offsets[i + 1])
+
+    def boxes(self, start: int, stop: int | None = None) -> np.ndarray:
+        """
+        The rectangle of each word in lines start to stop as rows of x0, y0, x1, y1
+        Words are stored as their 0th and 2nd corners, so these are the first two points of each word
+        :param start: int: first line
+        :param stop: int: last line + 1, defaults to start + 1
+        :return: np.ndarray
+        """
+        stop = start + 1 if stop is None else stop
+        first = self.word_offsets[self.line_offsets[start]: self.line_offsets[stop]]
+        return np.hstack([self.points[first], self.points[first + 1]])
+
+    def tolist(self, i: int) -> list[list[tuple[int, int]]]:
+        """
+        The nested lists of word and (x, y) point for line i, as extract_lines used to store them
+        :param i: int
+        :return: list[list[tuple[int, int]]]
+        """
+        w0, w1 = self.word_range(i)
+        offsets = self.word_offsets[w0: w1 + 1].tolist()
+        points = [tuple(xy) for xy in self.points[offsets[0]: offsets[-1]].tolist()]
+        start = offsets[0]
+        return [points[a - start: b - start] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+class LinePoints:
+    """
+    A view of the word coordinates of one line of a WordCoords
+    Behaves like the list of words, each a list of (x, y) points, that extract_lines used to attach to a line
+    """
+    __slots__ = ("coords", "index")
+
+    def __init__(self, coords: WordCoords, index: int):
+        self.coords = coords
+        self.index = index
+
+    def __len__(self) -> int:
+        w0, w1 = self.coords.word_range(self.index)
+        return w1 - w0
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, item):
+        return self.tolist()[item]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LinePoints):
+            other = other.tolist()
+        return self.tolist() == other
+
+    def __repr__(self) -> str:
+        # Same text as the nested lists, so stringified word_locations columns are unchanged
+        w0, w1 = self.coords.word_range(self.index)
+        offsets = self.coords.word_offsets[w0: w1 + 1].tolist()
+        xy = self.coords.points[offsets[0]: offsets[-1]].tolist() if offsets else []
+        start = offsets[0]
+        words = [", ".join(f"({x}, {y})" for x, y in xy[a - start: b - start])
+                 for a, b in zip(offsets[:-1], offsets[1:])]
+        return "[" + ", ".join(f"[{w}]" for w in words) + "]"
+
+    def boxes(self) -> np.ndarray:
+        return self.coords.boxes(self.index)
+
+    def tolist(self) -> list[list[tuple[int, int]]]:
+        return self.coords.tolist(self.index)
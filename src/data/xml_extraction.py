@@ -1,14 +1,19 @@
 import os
 import re
 import glob
+import time
 from copy import copy
 from xml.dom import minidom
-from functools import partial
+from typing import BinaryIO, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
-from langdetect import detect
-from tqdm import tqdm
 from xml.etree import ElementTree as ET
+from src.data.word_coords import WordCoords, LinePoints
+from src.data.language import LanguageDetector, default_detector
+from src.data.entry_archive import write_archive
+from src.data.page_quality import CorpusStats, word_counts, page_word_counts, outliers_per_page
+from src.data.instrumentation import default_instrumentation
 
 
 def gen_xml_paths(path: str | os.PathLike) -> list[str]:
@@ -33,48 +38,190 @@ def gen_xml_paths(path: str | os.PathLike) -> list[str]:
     return xmls
 
 
-def gen_xml_trees(xmls: list[str]) -> dict[str: ET.ElementTree]:
+def _xml_label(xml: str) -> str:
+    """
+    Label a page xml with its filename and the number of columns in its section of the volume
+    :param xml: str : location of a transkribus model output xml
+    :return: str
+    """
+    p = re.compile(r"BMC_\d{1,2}_[24]")
+    n_cols = p.search(xml).group()[-1]
+    return os.path.basename(xml)[:-5] + f"_{n_cols}"  # take the label that spans different sections of a volume
+
+
+def _sort_xmls(xmls: list[str]) -> list[str]:
+    """
+    Sort xmls by page number, interleaving the 2 col and 4 col sections of a volume
+    :param xmls: list[str]
+    :return: list[str]
+    """
+    return sorted(xmls, key=lambda x: int(x.split("_")[-1].split(".")[0]))
+
+
+def _open_xml(xml: str) -> BinaryIO:
+    """
+    Open a single xml, retrying as the network path failed occasionally
+    :param xml: str : location of a transkribus model output xml
+    :return: BinaryIO
+    """
+    attempts = 0
+    while attempts < 3:
+        try:
+            return open(xml, "rb")
+        except FileNotFoundError:
+            attempts += 1
+            continue
+    else:
+        raise FileNotFoundError(f"Failed to connect to: {xml}")
+
+
+def _parse_xml(xml: str) -> ET.Element:
+    """
+    Parse a single xml
+    Module level so it can be sent to worker processes
+    :param xml: str : location of a transkribus model output xml
+    :return: ET.Element
+    """
+    with _open_xml(xml) as f:
+        return ET.parse(f).getroot()
+
+
+def gen_xml_trees(xmls: list[str], workers: int | None = None) -> dict[str: ET.Element]:
     """
     Collect and correctly sort all the 2 col and 4 col xmls from a network root
+    Set workers to parse the xmls across a process pool, the returned dict is the same either way
     :param xmls: str : A list of locations of transkribus model output xmls
+    :param workers: int | None : number of worker processes, None or 1 parses serially
     :return: dict[xml.etree.ET]
     """
-    xmls_sorted = sorted(xmls, key=lambda x: int(x.split("_")[-1].split(".")[0]))
-    xmlroots = {}
+    xmls_sorted = _sort_xmls(xmls)
 
-    for xml in tqdm(xmls_sorted):
-        attempts = 0
-        while attempts < 3:
-            try:
-                tree = ET.parse(xml)
-                break
-            except FileNotFoundError:
-                attempts += 1
-                continue
-        else:
-            raise FileNotFoundError(f"Failed to connect to: {xml}")
-        root = tree.getroot()
-        p = re.compile(r"BMC_\d{1,2}_[24]")
-        n_cols = p.search(xml).group()[-1]
-        xmlroots[os.path.basename(xml)[:-5] + f"_{n_cols}"] = root  # take the label that spans different sections of a volume
+    with default_instrumentation.stage("gen_xml_trees", len(xmls_sorted)) as stage:
+        roots = _map_xmls(_parse_xml, xmls_sorted, workers)
+        if stage:
+            stage.bytes_read = _bytes(xmls_sorted)
+    xmlroots = {_xml_label(xml): root for xml, root in zip(xmls_sorted, roots)}
 
     return xmlroots
 
 
+def _parse_xml_lines(xml: str) -> list["TextLine"]:
+    """
+    Parse a single xml and extract its lines, the lines pickle far smaller than the full xml root
+    :param xml: str : location of a transkribus model output xml
+    :return: list[TextLine]
+    """
+    return extract_lines(_parse_xml(xml))
+
+
+def gen_xml_lines(xmls: list[str], workers: int | None = None, cache=None) -> dict[str: list["TextLine"]]:
+    """
+    As gen_xml_trees, but extract the lines of each page where it is parsed
+    With workers set only the compact per-page lines are sent back from the worker processes
+    With a cache only the pages that have changed since they were cached are parsed
+    :param xmls: str : A list of locations of transkribus model output xmls
+    :param workers: int | None : number of worker processes, None or 1 parses serially
+    :param cache: src.data.page_cache.PageCache | None : None to always parse
+    :return: dict[list[TextLine]]
+    """
+    xmls_sorted = _sort_xmls(xmls)
+    page_lines = {xml: cache.get(xml) for xml in xmls_sorted} if cache is not None else {}
+
+    to_parse = [xml for xml in xmls_sorted if page_lines.get(xml) is None]
+    with default_instrumentation.stage("gen_xml_lines", len(to_parse)) as stage:
+        for xml, lines in zip(to_parse, _map_xmls(_parse_xml_lines, to_parse, workers)):
+            page_lines[xml] = lines
+            if cache is not None:
+                cache.put(xml, lines)
+        if stage:
+            stage.bytes_read = _bytes(to_parse)
+    if cache is not None:
+        default_instrumentation.count("pages_cached", len(xmls_sorted) - len(to_parse))
+
+    return {_xml_label(xml): page_lines[xml] for xml in xmls_sorted}
+
+
+def _map_xmls(fn, xmls_sorted: list[str], workers: int | None) -> list:
+    """
+    Apply fn to each xml, serially or across a process pool, keeping the order of xmls_sorted
+    :param fn: a module level function of one xml path
+    :param xmls_sorted: list[str]
+    :param workers: int | None : number of worker processes, None or 1 runs serially
+    :return: list
+    """
+    if workers is None or workers <= 1:
+        return [fn(xml) for xml in default_instrumentation.bar(xmls_sorted)]
+
+    # results are pickled back from the workers, chunk so each worker handles a run of pages per round trip
+    chunksize = max(1, len(xmls_sorted) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(default_instrumentation.bar(executor.map(fn, xmls_sorted, chunksize=chunksize),
+                                                total=len(xmls_sorted)))
+
+
+def _bytes(xmls: list[str]) -> int:
+    """
+    Total size of a list of xmls, the bytes a stage reads parsing them
+    """
+    return sum(os.path.getsize(xml) for xml in xmls)
+
+
 class TextLine(str):
-    points = None
+    """
+    A line of text that views its word coordinates in a shared WordCoords rather than holding its own lists
+    """
+    __slots__ = ("coords", "index")
+
+    def __new__(cls, text: str, coords: WordCoords | None = None, index: int = 0):
+        line = super().__new__(cls, text)
+        line.coords = coords
+        line.index = index
+        return line
+
+    @property
+    def points(self) -> LinePoints | None:
+        return self.coords.line(self.index) if self.coords is not None else None
+
+    @points.setter
+    def points(self, points: LinePoints | list[list[tuple[int, int]]] | None):
+        if points is None:
+            self.coords, self.index = None, 0
+        elif isinstance(points, LinePoints):
+            self.coords, self.index = points.coords, points.index
+        else:
+            self.coords, self.index = WordCoords.from_nested([points]), 0
 
 
-def extract_lines(root: ET.Element) -> list[TextLine]:
+def _region_lines(text_region: ET.Element) -> list[tuple[str, list[str]]]:
     """
-    Extract the text lines from a page xml
-    :param root: ET.Element: an xml root
-    :return: list[str]: a list of the text lines in the xml
+    Extract the text and word coordinate strings of the text lines in a single text region
+    :param text_region: ET.Element: a TextRegion element
+    :return: list[tuple[str, list[str]]]: the text and the "x,y" points of each word for each line
     """
     lines = []
+    text_lines = text_region[1:-1]  # Skip coordinate data in first child
+    for text_line in text_lines:
+        points = [x[0].attrib['points'].split(" ")[::2] for x in text_line[2:-1]]  # only need 0th and 2nd
+        lines.append((text_line[-1][0].text, points))
+
+    return lines
+
+
+def _build_lines(raw_lines: list[tuple[str, list[str]]]) -> list[TextLine]:
+    """
+    Make TextLines for the lines of a page, all viewing one WordCoords for the page
+    :param raw_lines: list[tuple[str, list[str]]]: as returned by _region_lines
+    :return: list[TextLine]
+    """
+    words = [word for _, line_points in raw_lines for word in line_points]
+    flat_points = ",".join(p for word in words for p in word)
+    points = np.fromstring(flat_points, dtype=np.int32, sep=",") if flat_points else []
+    coords = WordCoords.from_counts(points, [len(x) for _, x in raw_lines], [len(word) for word in words])
+
+    return [TextLine(text, coords, i) for i, (text, _) in enumerate(raw_lines)]
 
-    text_regions = [x for x in root[1] if len(x) > 2]  # Empty Text Regions Removed
 
+def _order_text_regions(text_regions: list) -> list:
     """"
     Tkb assigns reading order top to bottom then left to right
     RA/ID split Tkb pages into 2 or 4 'columns' - i.e. text regions
@@ -91,30 +238,100 @@ def extract_lines(root: ET.Element) -> list[TextLine]:
             new_text_regions.append(text_regions[x + half])
         text_regions = new_text_regions
 
-    for text_region in text_regions:
-        text_lines = text_region[1:-1]  # Skip coordinate data in first child
-        for text_line in text_lines:
-            points = [x[0].attrib['points'].split(" ")[::2] for x in text_line[2:-1]]  # only need 0th and 2nd
-            points = [[(int(p.split(",")[0]), int(p.split(",")[1])) for p in line_points] for line_points in points]
-            line = TextLine(text_line[-1][0].text)
-            line.points = points
-            lines.append(line)
+    return text_regions
+
+
+def extract_lines(root: ET.Element) -> list[TextLine]:
+    """
+    Extract the text lines from a page xml
+    :param root: ET.Element: an xml root
+    :return: list[str]: a list of the text lines in the xml
+    """
+    raw_lines = []
+
+    text_regions = [x for x in root[1] if len(x) > 2]  # Empty Text Regions Removed
+    for text_region in _order_text_regions(text_regions):
+        raw_lines += _region_lines(text_region)
+    lines = _build_lines(raw_lines)
 
     return [x for x in lines if x is not None]
 
 
-def extract_lines_for_vol(vol: dict[str: ET.Element]) -> tuple[list[str], pd.DataFrame]:
+def iter_page_lines(xml: str) -> Iterator[TextLine]:
+    """
+    Stream the text lines from a page xml without building the full page tree
+    Each text region is cleared once its lines are extracted, so only one region's elements are held at a time
+    Gives the same lines as extract_lines(ET.parse(xml).getroot())
+    :param xml: str : location of a transkribus model output xml
+    :return: Iterator[TextLine]
+    """
+    region_lines = []
+    level = 0
+    n_root_children = 0
+    with _open_xml(xml) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                level += 1
+                if level == 2:
+                    n_root_children += 1
+                continue
+
+            if level == 3 and n_root_children == 2:  # children of root[1], the Page element
+                if len(elem) > 2:  # Empty Text Regions Removed
+                    region_lines.append(_region_lines(elem))
+                elem.clear()
+            elif level == 2:
+                elem.clear()
+            level -= 1
+
+    yield from _build_lines([line for lines in _order_text_regions(region_lines) for line in lines])
+
+
+def iter_vol_lines(xmls: list[str], cache=None) -> Iterator[tuple[str, list[TextLine]]]:
+    """
+    Stream the lines of a volume page by page, in the same order and with the same labels as gen_xml_trees
+    Peak memory depends on a single page rather than the whole volume
+    Consumed directly by extract_lines_for_vol
+    :param xmls: str : A list of locations of transkribus model output xmls
+    :param cache: src.data.page_cache.PageCache | None : skip parsing pages that haven't changed, None to always parse
+    :return: Iterator[tuple[str, list[TextLine]]]: (label, lines) for each page
+    """
+    for xml in default_instrumentation.bar(_sort_xmls(xmls)):
+        lines = cache.get(xml) if cache is not None else None
+        if lines is None:
+            start = time.perf_counter()
+            lines = list(iter_page_lines(xml))
+            if cache is not None:
+                cache.put(xml, lines)
+            if default_instrumentation.enabled:  # timed page by page, the consumer's time between pages isn't
+                default_instrumentation.add("iter_vol_lines", time.perf_counter() - start, 1, os.path.getsize(xml))
+        else:
+            default_instrumentation.count("pages_cached")
+        yield _xml_label(xml), lines
+
+
+def extract_lines_for_vol(vol: dict[str, ET.Element | list[TextLine]] | Iterable[tuple[str, list[TextLine]]]
+                          ) -> tuple[list[str], pd.DataFrame]:
     """
     Extract lines for a dict of xml roots
-    :param vol: a dict of xml paths and corresponding ET roots
+    :param vol: a dict of xml paths and corresponding ET roots, or already extracted lines from gen_xml_lines,
+                or the (label, lines) pairs streamed by iter_vol_lines
     :return:
     """
     lines = []
     xml_idx = []
-    for xml, root in vol.items():
-        root_lines = extract_lines(root)
-        lines += root_lines
-        xml_idx += [xml] * len(root_lines)
+    with default_instrumentation.stage("extract_lines") as stage:
+        for xml, root in (vol.items() if isinstance(vol, dict) else vol):
+            root_lines = root if isinstance(root, list) else extract_lines(root)
+            lines += root_lines
+            xml_idx += [xml] * len(root_lines)
+
+        # gather the word coordinates of every page into one contiguous array for the volume, on new lines so the
+        # lines given, which a PageCache or the caller may still hold, keep viewing their own page's coordinates
+        vol_coords = WordCoords.from_lines(lines)
+        lines = [TextLine(line, vol_coords, i) for i, line in enumerate(lines)]
+        if stage:
+            stage.items = len(lines)
     xml_track_df = pd.DataFrame(
         data={
             "xml": xml_idx,
@@ -180,105 +397,227 @@ def _find_shelfmark(title: str, res: list[re.Pattern]) -> str | None:
     :param res: regexes - list[re.pattern]
     :return:
     """
-    for re in res:
-        if re.search(title):
-            return re.search(title).group()
+    for regex in res:
+        match = regex.search(title)
+        if match:
+            return match.group()
 
 
-find_shelfmark = partial(_find_shelfmark, res=[i_re, g_re, c_re])
+# Each shelfmark regex can only match at the start of a literal: I[ABC] for i_re, a space or ( then G for g_re, and a
+# space or ( then C. for c_re. The literal is looked for first, with a plain substring test before the candidate
+# regex, and the full regex is only tried where a candidate is found: (regex, substring, candidate regex, offset of
+# the shelfmark in the candidate)
+_shelfmark_prefilters = [
+    (i_re, "I", re.compile("I[ABC]"), 0),
+    (g_re, "G", re.compile("[( ]G"), 1),
+    (c_re, "C.", re.compile(r"[( ]C\."), 1),
+]
 
 
-def find_headings(lines: list[str]) -> tuple[list[str], list[list[int]], list[str]]:
+def find_shelfmark(title: str) -> str | None:
     """
-    Finds all headings from a list of lines
+    Finds the associated title reference from a given line
+    The same as _find_shelfmark(title, [i_re, g_re, c_re]), but most lines hold no candidate for any of the regexes,
+    and are passed over without running them
+    :param title: str
+    :return: str | None
+    """
+    for regex, substring, candidate_re, offset in _shelfmark_prefilters:
+        if substring in title:
+            for candidate in candidate_re.finditer(title):
+                match = regex.match(title, candidate.start() + offset)  # lookbehinds still see the preceding text
+                if match:
+                    return match.group()
+    return None
+
+
+def find_shelfmarks(lines: list[str]) -> list[str | None]:
+    """
+    Scan a list of lines once for shelfmarks, the index find_headings works from
     :param lines: list[str]
+    :return: list[str | None]: the shelfmark found in each line, None where there isn't one
+    """
+    with default_instrumentation.stage("find_shelfmarks", len(lines)):
+        line_shelfmarks = [find_shelfmark(line) for line in lines]
+    if default_instrumentation.enabled:
+        _count_shelfmarks(line_shelfmarks)
+    return line_shelfmarks
+
+
+def _count_shelfmarks(line_shelfmarks: list[str | None]) -> None:
+    """
+    Count the lines each shelfmark regex matched, and the lines none did
+    Each regex matches shelfmarks starting with its own letter, so the match gives the regex
+    """
+    hits = {"I": 0, "G": 0, "C": 0}
+    for sm in line_shelfmarks:
+        if sm is not None:
+            hits[sm[0]] += 1
+    for letter, regex_name in (("I", "i_re"), ("G", "g_re"), ("C", "c_re")):
+        default_instrumentation.count(f"shelfmark_hits.{regex_name}", hits[letter])
+    default_instrumentation.count("shelfmark_misses", len(line_shelfmarks) - sum(hits.values()))
+
+
+def iter_headings(lines: list[str], line_shelfmarks: list[str | None],
+                  start: int = 0, stop: int | None = None) -> Iterator[tuple[int, str, list[int], bool]]:
+    """
+    Finds the headings starting at lines start to stop
+    Only lines holding a shelfmark can start a heading, so the search runs from the per-line shelfmark index
+    A heading only depends on its own line and the 7 after it, so a run of lines can be searched on its own
+    :param lines: list[str]
+    :param line_shelfmarks: the output of find_shelfmarks(lines)
+    :param start: int: first line a heading may start at
+    :param stop: int | None: line headings must start before, None for the end of lines
+    :return: Iterator[tuple[int, str, list[int], bool]]: (shelfmark line, shelfmark, title indices, bought in) for
+             each heading, where a "Bought in" line following the shelfmark is left out of the title indices
+    """
+    stop = len(lines) if stop is None else stop
+    sm_lines = [i for i in range(start, min(stop + 7, len(lines))) if line_shelfmarks[i]]
+
+    for k, i in enumerate(sm_lines):
+        if i >= stop:
+            break
+        # a heading runs for up to 7 lines, or until a new catalogue entry begins during the current title
+        next_sm = sm_lines[k + 1] if k + 1 < len(sm_lines) else len(lines)
+        title = [lines[i]]
+        title_index = []
+        has_caps = caps_regex.search(lines[i])  # caps can't match across the " " joining title lines
+        for title_part_index in range(i + 1, min(i + 8, next_sm)):
+            title_part = lines[title_part_index]
+            title.append(title_part)
+            title_index.append(title_part_index)
+            has_caps = has_caps or caps_regex.search(title_part)
+
+            if date_check(title_part) and has_caps:  # Date marks the end of a heading
+                if "Bought in" in title[1]:  # not .lower() - these "Bought in" should all be capitalised
+                    yield i, line_shelfmarks[i], title_index[1:], True
+                else:
+                    yield i, line_shelfmarks[i], title_index, False
+                break
+
+
+def find_headings(lines: Iterable[str],
+                  line_shelfmarks: list[str | None] | None = None) -> tuple[list[str], list[list[int]], list[str]]:
+    """
+    Finds all headings from a list of lines
+    Runs from a per-line shelfmark index rather than running the shelfmark regexes on every line
+    and again on every lookahead line
+    :param lines: Iterable[str]
+    :param line_shelfmarks: the output of find_shelfmarks(lines) if already computed
     :return: tuple[list[str], list[list[int]]
     """
-    sm_titles = []  # The names of the titles
+    if not isinstance(lines, list):  # e.g. lines streamed from iter_page_lines
+        lines = list(lines)
+    if line_shelfmarks is None:
+        line_shelfmarks = find_shelfmarks(lines)
+
+    title_shelfmarks = []
     title_indices = []
     ordered_lines = copy(lines)
     # TODO include the first catalogue entry as well
-    for i, l in enumerate(lines):
-        sm = find_shelfmark(l)
-        if sm:
-            title = [l]
-            title_index = []
-            j = 1
-            while i + j < len(lines) and j < 8:
-                title_part = lines[i + j]
-                if find_shelfmark(title_part):  # If a new catalogue entry begins during the current title
-                    break
-
-                title.append(title_part)
-                title_index.append(i + j)
-                j += 1
-
-                if date_check(title_part) and caps_regex.search(" ". join(title)):  # Date marks the end of a heading
-                    sm_titles.append([sm, title])
-                    if "Bought in" in title[1]:  # not .lower() - these "Bought in" should all be capitalised
-                        sm, bought_in = lines[i], lines[i+1]
-                        ordered_lines[i], ordered_lines[i+1] = bought_in, sm
-                        title_indices.append(title_index[1:])
-                    else:
-                        title_indices.append(title_index)
-                    break
-
-    title_shelfmarks = [t[0] for t in sm_titles]
+    with default_instrumentation.stage("find_headings", len(lines)):
+        for i, sm, title_index, bought_in in iter_headings(lines, line_shelfmarks):
+            title_shelfmarks.append(sm)
+            title_indices.append(title_index)
+            if bought_in:  # put the shelfmark after "Bought in" so it leads the entry's title
+                ordered_lines[i], ordered_lines[i+1] = lines[i+1], lines[i]
+    default_instrumentation.count("headings", len(title_indices))
 
     return title_shelfmarks, title_indices, ordered_lines
 
 
+def page_offsets(xml_track_df: pd.DataFrame) -> tuple[np.ndarray, list[str]]:
+    """
+    The line each page starts at, from the xml_track_df made by extract_lines_for_vol
+    :param xml_track_df: pd.DataFrame
+    :return: tuple[np.ndarray, list[str]]: start line of each page followed by the total number of lines, page labels
+    """
+    xml = xml_track_df["xml"].to_numpy()
+    starts = np.flatnonzero(xml[1:] != xml[:-1]) + 1
+    starts = np.concatenate([[0], starts, [len(xml)]]) if len(xml) else np.zeros(1, dtype=np.int64)
+
+    return starts, xml[starts[:-1]].tolist()
+
+
+def _entry_pages(start: int, end: int, n_lines: int, offsets: np.ndarray, labels: list[str]) -> tuple[list[str], list[int]]:
+    """
+    The pages an entry spans and the cumulative count of its lines on each page
+    As with the counts this replaced, the line count includes the first line of the next entry (line end)
+    when the entry spans more than one page
+    :param start: int: first line of the entry
+    :param end: int: first line of the next entry, the last line of the volume for the last entry
+    :param n_lines: int: number of lines in the entry
+    :param offsets: np.ndarray: from page_offsets
+    :param labels: list[str]: from page_offsets
+    :return: tuple[list[str], list[int]]: xmls, xml_start_line
+    """
+    first_page = int(np.searchsorted(offsets, start, side="right")) - 1
+    last_page = int(np.searchsorted(offsets, end, side="right")) - 1
+    if first_page == last_page:
+        return [labels[first_page]], [n_lines]
+
+    page_ends = np.minimum(offsets[first_page + 1: last_page + 2], end + 1)
+    page_starts = np.maximum(offsets[first_page: last_page + 1], start)
+    return labels[first_page: last_page + 1], np.cumsum(page_ends - page_starts).tolist()
+
+
+def catalogue_entry_rows(lines: list[str],
+                         title_indices: list[list[int]],
+                         title_shelfmarks: list[str],
+                         offsets: np.ndarray,
+                         labels: list[str],
+                         first: int = 0,
+                         last: int | None = None) -> dict[str, list]:
+    """
+    The columns of extract_catalogue_entries for entries first to last, so a run of entries can be rebuilt on its own
+    :param lines:
+    :param title_indices:
+    :param title_shelfmarks:
+    :param offsets: from page_offsets
+    :param labels: from page_offsets
+    :param first: int: first entry
+    :param last: int | None: entry to stop before, None for all the entries
+    :return: dict[str, list]
+    """
+    last = len(title_indices) if last is None else last
+    n_lines = int(offsets[-1])
+
+    # take the idx[1] and title_indices[i+1] to exclude leading shelfmark and include trailing shelfmark
+    # TODO fix this indexing for the first entry?
+    starts = [idx[0] for idx in title_indices[first: last + 1]]
+    ends = starts[1:] if last < len(title_indices) else starts[1:] + [len(lines)]  # last entry runs to end of text
+    entries = [lines[start: end] for start, end in zip(starts, ends)]
+
+    page_info = [_entry_pages(start, min(end, n_lines - 1), len(entry), offsets, labels)
+                 for start, end, entry in zip(starts, ends, entries)]
+    shelfmarks = title_shelfmarks[first + 1: last + 1]
+    if last == len(title_indices):
+        shelfmarks.append(find_shelfmark(" ".join(entries[-1])))
+
+    return {"xmls": [x[0] for x in page_info], "xml_start_line": [x[1] for x in page_info],
+            "vol_entry_num": list(range(first, last)), "shelfmark": shelfmarks, # "copy": 1,
+            "entry": entries, "title": title_indices[first: last],
+            "entry_text": ["\n".join(entry) for entry in entries],
+            "word_locations": [[y.points for y in entry] for entry in entries]}
+
+
 def extract_catalogue_entries(lines: list[str],
                               title_indices: list[list[int]],
                               title_shelfmarks: list[str],
                               xml_track_df: pd.DataFrame) -> pd.DataFrame:
     """
     Use catalogue entry indices to extract from the main list of lines
+    The pages each entry spans are found from the page boundaries of xml_track_df, computed once
     :param lines:
     :param title_indices:
     :param title_shelfmarks:
     :param xml_track_df:
     :return: pd.DataFrame
     """
-    xmls = []
-    xml_start_line = []
-    shelfmarks = []
-    entries = []
-
-    for i, idx in enumerate(title_indices[:-1]):
-        # take the idx[1] and title_indices[i+1] to exclude leading shelfmark and include trailing shelfmark
-        # TODO fix this indexing for the first entry?
-        entry = lines[idx[0]: title_indices[i + 1][0]]
-        entries.append(entry)
-        xml_info = xml_track_df.loc[idx[0]: title_indices[i + 1][0]].groupby(by="xml").count()
-        if xml_info.shape[0] == 1:
-            xmls.append([xml_info.index[0]])
-            xml_start_line.append([len(entry)])
-        else:
-            xmls.append(xml_info.index.to_list())
-            xml_start_line.append(xml_info["line"].cumsum().to_list())
-        shelfmarks.append(title_shelfmarks[i + 1])
-
-    # naively goes from last title to end of text to create last entry
-    last_entry_start = title_indices[-1][0]
-    last_entry = lines[last_entry_start:]
-    entries.append(last_entry)
-    xml_info = xml_track_df.loc[last_entry_start:].groupby(by="xml").count()
-    if xml_info.shape[0] == 1:
-        xmls.append([xml_info.index[0]])
-        xml_start_line.append([len(last_entry)])
-    else:
-        xmls.append(xml_info.index.to_list())
-        xml_start_line.append(xml_info["line"].cumsum().to_list())
-    shelfmarks.append(find_shelfmark(" ".join(last_entry)))
-
-    entry_df = pd.DataFrame(
-        data={"xmls": xmls, "xml_start_line": xml_start_line, "shelfmark": shelfmarks, # "copy": 1,
-              "entry": entries, "title": title_indices}
-    )
-    entry_df["entry_text"] = entry_df["entry"].apply(lambda x:"\n".join(x))
-    entry_df.insert(loc=2, column="vol_entry_num", value=np.arange(len(entry_df)))
-    entry_df["word_locations"] = entry_df["entry"].apply(lambda x: [y.points for y in x])
+    with default_instrumentation.stage("extract_catalogue_entries", len(title_indices)):
+        offsets, labels = page_offsets(xml_track_df)
+        entry_df = pd.DataFrame(data=catalogue_entry_rows(lines, title_indices, title_shelfmarks, offsets, labels))
+        entry_df["vol_entry_num"] = entry_df["vol_entry_num"].astype(np.int64)
 
     return entry_df
 
@@ -307,42 +646,28 @@ def extract_another_copy():
     return None
 
 
-def split_by_language(lines: list[str]):
+def split_by_language(lines: list[str], languages: list[str] | None = None):
     """
     Original ID fn - `splits up a document by the detected language`
     ID designed it to work with entries split as in original save_split_txt()
     Detect languages in a list of entry lines
     Split based on language
+    Each line is detected once, a block switches language where a line and the next are both (not) English
     :param lines:
+    :param languages: list[str] | None: the language of each line if already detected, e.g. by
+                      LanguageDetector.detect_entries, else they're detected with the shared default_detector
     :return:
     """
+    if languages is None:
+        languages = default_detector.detect(lines)
+
     split_lines = []
-    first_line_lan = ""
-    second_line_lan = ""
-    try:
-        first_line_lan = detect(lines[0])
-    except:
-        first_line_lan = "can't find language"
-    try:
-        second_line_lan = detect(lines[1])
-    except:
-        second_line_lan = "can't find language"
-    first2_lines = [first_line_lan, second_line_lan]
+    first2_lines = [languages[0], languages[1]]
     language_en = first2_lines.count("en") == 2
     first_language = language_en
     current_block = [lines[0], lines[1]]
     for ind in range(2, len(lines[:-1])):
-        c_line_lan = ""
-        n_line_lan = ""
-        try:
-            c_line_lan = detect(lines[ind])
-        except:
-            c_line_lan = "can't find language"
-        try:
-            n_line_lan = detect(lines[ind + 1])
-        except:
-            n_line_lan = "can't find language"
-        next2_lines = [c_line_lan, n_line_lan]
+        next2_lines = [languages[ind], languages[ind + 1]]
         if (next2_lines.count("en") == 0) and language_en:
             language_en = False
             split_lines.append(current_block)
@@ -359,60 +684,76 @@ def split_by_language(lines: list[str]):
 
 
 # Saves all of the text, split into catalogue entries into text files where non-english sections of text are removed
-def save_split_txt(all_title_indices, all_lines, out_path, title_refs):
-    if not os.path.exists(out_path):
-        os.makedirs(out_path)
-
-    for itr in tqdm(range(len(all_title_indices[:-2]))):
+# Languages for every entry are detected up front in one batch, pass a LanguageDetector with workers to parallelise
+# Pass archive_path to write every entry into one archive rather than a file each, see entry_archive.write_archive
+def save_split_txt(all_title_indices, all_lines, out_path, title_refs, detector: LanguageDetector | None = None,
+                   archive_path: str | os.PathLike | None = None):
+    detector = default_detector if detector is None else detector
+
+    all_catalogue_lines = []
+    for itr in range(len(all_title_indices[:-2])):
+        catalogue_indices = [x for x in range(all_title_indices[itr][1], all_title_indices[itr + 1][0])]
+        all_catalogue_lines.append([all_lines[x] for x in catalogue_indices])
+    n_detected = detector.n_detected
+    with default_instrumentation.stage("detect_languages", sum(len(x) for x in all_catalogue_lines)):
+        all_languages = detector.detect_entries(all_catalogue_lines)
+    default_instrumentation.count("languages_detected", detector.n_detected - n_detected)  # the rest were cached
+
+    records = _split_txt_records(all_title_indices, all_lines, title_refs, all_catalogue_lines, all_languages)
+    with default_instrumentation.stage("save_split_txt", len(all_catalogue_lines)):
+        if archive_path is not None:
+            write_archive(records, archive_path)
+            return None
+
+        if not os.path.exists(out_path):
+            os.makedirs(out_path)
+        for name, _, text in records:
+            save_path_file = os.path.join(out_path, name + ".txt")
+            with open(save_path_file, "w", encoding="utf-8") as f:
+                f.write(text)
+
+
+def _split_txt_records(all_title_indices, all_lines, title_refs, all_catalogue_lines, all_languages):
+    """
+    The file name, shelfmark and text save_split_txt writes for each entry
+    """
+    for itr in default_instrumentation.bar(range(len(all_title_indices[:-2]))):
         title_indices = all_title_indices[itr]
-        catalogue_indices = [x for x in range(title_indices[1], all_title_indices[itr + 1][0])]
         full_title = "".join([all_lines[x] for x in title_indices])
 
-        catalogue_lines = [all_lines[x] for x in catalogue_indices]
-        first_language, split_catalogue_lines = split_by_language(catalogue_lines)
-
-        save_path_file = os.path.join(out_path, title_refs[itr + 1].replace(".", "-") + ".txt")
-        with open(save_path_file, "w", encoding="utf-8") as f:
-            f.write(full_title + "\n")
-            language_en = first_language
-            for block_lines in split_catalogue_lines:
-                if language_en:
-                    for line in block_lines:
-                        f.write(line + "\n")
-                else:
-                    f.write("-----------------------------------\n")
-                    f.write("NON-ENGLISH SECTION LASTING {} LINES\n".format(len(block_lines)))
-                    f.write("-----------------------------------\n")
-                language_en = not language_en
+        catalogue_lines = all_catalogue_lines[itr]
+        first_language, split_catalogue_lines = split_by_language(catalogue_lines, all_languages[itr])
+
+        text = [full_title + "\n"]
+        language_en = first_language
+        for block_lines in split_catalogue_lines:
+            if language_en:
+                for line in block_lines:
+                    text.append(line + "\n")
+            else:
+                text.append("-----------------------------------\n")
+                text.append("NON-ENGLISH SECTION LASTING {} LINES\n".format(len(block_lines)))
+                text.append("-----------------------------------\n")
+            language_en = not language_en
+        yield title_refs[itr + 1].replace(".", "-"), title_refs[itr + 1], "".join(text)
 
 
 # Returns the number of lines in a page which are too long
 def num_outliers_for_page(lines, std, mean, threshold=2):
-    lengths = [len(x.split()) for x in lines if x is not None]
-    lengths = [(x - mean) for x in lengths]
-    lengths = [(x / std) for x in lengths]
-    num_outliers = len([x for x in lengths if x > threshold])
-    return num_outliers
+    counts = word_counts([x for x in lines if x is not None])
+    return int(outliers_per_page(counts, np.array([0, len(counts)]), mean, std, threshold)[0])
 
 
 # Find all of the poorly scanned pages in the input
-def get_poorly_scanned_pages(volume_root, file_names):
-    poorly_scanned_page_nums = []
-
-    # Get all the lines for the volume and find the mean and std for the line lengths across all volumes
-    vol_lines, xml_check_df = extract_lines_for_vol(volume_root)
-    lengths = [len(x.split()) for x in vol_lines if x is not None]
-    mean = np.mean(lengths)
-    std = np.std(lengths)
+# Each page is extracted once, see page_quality.corpus_poorly_scanned_pages to score against several volumes
+def get_poorly_scanned_pages(volume_root, file_names, threshold=2, max_outliers=5):
+    # Get the word counts of every line on every page, and the mean and std for the line lengths across the volume
+    with default_instrumentation.stage("get_poorly_scanned_pages", len(volume_root)):
+        counts, offsets = page_word_counts(extract_lines(root) for root in volume_root.values())
+        stats = CorpusStats().update(counts)
 
-    # For every page (xmlroot) in the volume
-    for root, filename in zip(volume_root.values(), file_names):
-        page = root
-        page_lines = extract_lines(page)
-        num_outliers = num_outliers_for_page(page_lines, std, mean)
-        if num_outliers > 5:
-            poorly_scanned_page_nums.append(filename.decode("utf-8"))
-    return poorly_scanned_page_nums
+        num_outliers = outliers_per_page(counts, offsets, stats.mean, stats.std, threshold)
+    return [filename.decode("utf-8") for filename, n in zip(file_names, num_outliers) if n > max_outliers]
 
 
 # Save poorly scanned page numbers to a text file
@@ -425,11 +766,12 @@ def save_poorly_scanned_pages(poorly_scanned, out_path):
             f.write(scan + "\n")
 
 
-def generate_xml(lines: list[str],  # TODO update to work with df output
+def generate_xml(lines: list[str],  # save_xml and save_entries_xml stream the same output without a Document
                  title_indices: list[list[int]],
                  title_refs: list[str]) -> minidom.Document:
     """
     Generates an XML document based on the found catalogue headings in the document
+    The entries are those of iter_xml_entries, the same save_xml and save_entries_xml write
     :param lines:
     :param title_indices:
     :param title_refs:
@@ -438,18 +780,15 @@ def generate_xml(lines: list[str],  # TODO update to work with df output
     xml = minidom.Document()
     text = xml.createElement('text')
 
-    # TODO replace iteration through title indices with entries in rows of df
-    for i, idx in tqdm(enumerate(title_indices[:-1]), total=len(title_indices) - 1):
-        catalogue_indices = [x for x in range(idx[1], title_indices[i + 1][0])]
-        full_title = "".join([lines[x] for x in idx])
-
+    entries = iter_xml_entries(lines, title_indices, title_refs)
+    for shelfmark, heading, entry_lines in default_instrumentation.bar(entries, total=max(len(title_indices) - 1, 0)):
         catalogue_entry = xml.createElement('catalogue_entry')
-        catalogue_entry.setAttribute("SHELFMARK", title_refs[i + 1])
-        catalogue_entry.setAttribute("HEADING", full_title)
+        catalogue_entry.setAttribute("SHELFMARK", shelfmark)
+        catalogue_entry.setAttribute("HEADING", heading)
 
-        for catalogue_index in catalogue_indices:
+        for entry_line in entry_lines:
             line = xml.createElement('line')
-            line.setAttribute("CONTENT", lines[catalogue_index])
+            line.setAttribute("CONTENT", entry_line)
             catalogue_entry.appendChild(line)
 
         text.appendChild(catalogue_entry)
@@ -458,6 +797,78 @@ def generate_xml(lines: list[str],  # TODO update to work with df output
     return xml
 
 
+def _xml_attr(value: str) -> str:
+    """
+    Escape an attribute value as minidom does, so streamed output matches toprettyxml
+    """
+    if not value:
+        return ""
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def _xml_entry_start(title_index: list[int]) -> int:
+    """
+    The first line written under a heading, from its second line, or after the heading if it's of one line
+    """
+    return title_index[1] if len(title_index) > 1 else title_index[0] + 1
+
+
+def iter_xml_entries(lines: list[str],
+                     title_indices: list[list[int]],
+                     title_refs: list[str]) -> Iterator[tuple[str, str, list[str]]]:
+    """
+    The shelfmark, heading and lines of each catalogue_entry element of headings.xml
+    :param lines:
+    :param title_indices:
+    :param title_refs:
+    :return: Iterator[tuple[str, str, list[str]]]
+    """
+    for i, idx in enumerate(title_indices[:-1]):
+        yield title_refs[i + 1], "".join([lines[x] for x in idx]), lines[_xml_entry_start(idx): title_indices[i + 1][0]]
+
+
+def iter_df_xml_entries(entry_df: pd.DataFrame) -> Iterator[tuple[str, str, list[str]]]:
+    """
+    The shelfmark, heading and lines of each catalogue_entry element from an extract_catalogue_entries table
+    Matches iter_xml_entries on the lines the table was made from, so the last entry is left out as it always has been
+    :param entry_df: pd.DataFrame
+    :return: Iterator[tuple[str, str, list[str]]]
+    """
+    rows = zip(entry_df["shelfmark"].iloc[:-1], entry_df["entry"].iloc[:-1], entry_df["title"].iloc[:-1])
+    for shelfmark, entry, title in rows:
+        start = title[0]  # entries start at their heading, title holds volume line numbers
+        yield shelfmark, "".join([entry[x - start] for x in title]), entry[_xml_entry_start(title) - start:]
+
+
+def write_xml(entries: Iterable[tuple[str, str, list[str]]], path: str | os.PathLike) -> None:
+    """
+    Stream catalogue entries to an xml file as they're produced, without building a document in memory
+    The output is byte for byte what generate_xml(...).toprettyxml(indent="\t") gives
+    :param entries: Iterable[tuple[str, str, list[str]]]: from iter_xml_entries or iter_df_xml_entries
+    :param path: str | os.PathLike
+    :return: None
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" ?>\n')
+        empty = True
+        for shelfmark, heading, entry_lines in entries:
+            if empty:
+                f.write("<text>\n")
+                empty = False
+            f.write(f'\t<catalogue_entry SHELFMARK="{_xml_attr(shelfmark)}" HEADING="{_xml_attr(heading)}"')
+            if entry_lines:
+                f.write(">\n")
+                f.writelines(f'\t\t<line CONTENT="{_xml_attr(line)}"/>\n' for line in entry_lines)
+                f.write("\t</catalogue_entry>\n")
+            else:
+                f.write("/>\n")
+        f.write("<text/>\n" if empty else "</text>\n")
+    os.replace(tmp_path, path)  # atomic, a reader never sees a partial file
+
+    return None
+
+
 # Saves the generated XML for the headings into a chosen location
 def save_xml(lines: list[str],
              title_indices: list[list[int]],
@@ -467,11 +878,23 @@ def save_xml(lines: list[str],
     if not os.path.exists(out_path):
         os.makedirs(out_path)
 
-    xml = generate_xml(lines, title_indices, title_refs)
-    xml_str = xml.toprettyxml(indent="\t")
+    entries = iter_xml_entries(lines, title_indices, title_refs)
     save_path_file = out_path + "/headings.xml"
-    with open(save_path_file, "w", encoding="utf-8") as f:
-        f.write(xml_str)
-        f.close()
+    with default_instrumentation.stage("save_xml", max(len(title_indices) - 1, 0)):
+        write_xml(default_instrumentation.bar(entries, total=max(len(title_indices) - 1, 0)), save_path_file)
+
+    return None
+
+
+# Saves the headings XML from a catalogue entry table, the same file save_xml writes for the lines it came from
+def save_entries_xml(entry_df: pd.DataFrame, out_path: str | os.PathLike) -> None:
+
+    if not os.path.exists(out_path):
+        os.makedirs(out_path)
+
+    save_path_file = os.path.join(out_path, "headings.xml")
+    with default_instrumentation.stage("save_xml", max(len(entry_df) - 1, 0)):
+        write_xml(default_instrumentation.bar(iter_df_xml_entries(entry_df), total=max(len(entry_df) - 1, 0)),
+                  save_path_file)
 
     return None
@@ -0,0 +1,172 @@
+"""
+Extract the catalogue entries of several volumes, in place of the notebook loop over volumes
+    python -m src.pipeline --data-root data/raw --volumes 1 8 10 --out data/processed --workers 3
+Each volume is written to <out>/BMC_<vol>: catalogue_entries.csv as the notebook wrote it, and the parquet table,
+line store, manifest and page cache that update_volume keeps. Volumes whose pages haven't changed since the last run are skipped,
+volumes with changed pages rebuild only the entries those pages touch. A volume that fails is reported and left as it
+was, so running again picks it up. With --instrument the time, items and bytes read of each stage of extraction are
+added to each volume's report, see src.data.instrumentation. The search index in <out>, see src.data.search_index,
+is then brought up to date with the volumes' entries.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import src.data.xml_extraction as xmle
+from src.data.incremental import update_volume, manifest_name
+from src.data.instrumentation import default_instrumentation
+from src.data.search_index import SearchIndex, index_name
+
+report_name = "pipeline_report.json"
+
+
+def _write_atomic(path: str | os.PathLike, write) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def process_volume(vol: int | str, data_root: str | os.PathLike, out_root: str | os.PathLike,
+                   force: bool = False, instrument: bool = False, progress: bool = False) -> dict:
+    """
+    Bring the catalogue entries of one volume up to date
+    Module level so it can be sent to worker processes, errors are caught and reported rather than raised
+    The progress, enabled state, stages and counters of default_instrumentation are restored once the volume is done,
+    so a caller recording its own stages in the same process keeps them
+    :param vol: int | str: volume number
+    :param data_root: str | os.PathLike: directory holding the BMC_<vol>_<cols> folders of xmls
+    :param out_root: str | os.PathLike
+    :param force: bool: rebuild every entry, even if the volume hasn't changed
+    :param instrument: bool: record the stages of extraction in the result's instrumentation
+    :param progress: bool: show progress bars
+    :return: dict: volume, status (done, unchanged or failed), pages, entries, seconds, pages_per_second, error,
+             and instrumentation if recorded
+    """
+    start = time.perf_counter()
+    out_dir = os.path.join(out_root, f"BMC_{vol}")
+    result = {"volume": vol, "status": "failed", "pages": 0, "entries": 0, "seconds": 0.0, "pages_per_second": 0.0,
+              "error": None}
+    saved = default_instrumentation.progress, default_instrumentation.stages, default_instrumentation.counters
+    was_enabled = default_instrumentation.enabled
+    default_instrumentation.progress = progress
+    if instrument:
+        default_instrumentation.reset()
+        if not was_enabled:
+            default_instrumentation.enable()
+    try:
+        xmls = xmle.gen_xml_paths(os.path.join(data_root, f"BMC_{vol}_[24]", "*", "*.pxml"))
+        csv_path = os.path.join(out_dir, "catalogue_entries.csv")
+        if force and os.path.exists(os.path.join(out_dir, manifest_name)):
+            os.remove(os.path.join(out_dir, manifest_name))
+
+        entry_df, summary = update_volume(xmls, out_dir)
+        unchanged = not summary["changed_pages"] and os.path.exists(csv_path)
+        if not unchanged:
+            _write_atomic(csv_path, entry_df.to_csv)
+
+        result.update(status="unchanged" if unchanged else "done", pages=summary["pages"], entries=len(entry_df))
+    except Exception:
+        result["error"] = traceback.format_exc()
+    finally:
+        if instrument:
+            result["instrumentation"] = default_instrumentation.report()
+            if not was_enabled:
+                default_instrumentation.disable()
+        default_instrumentation.progress, default_instrumentation.stages, default_instrumentation.counters = saved
+
+    result["seconds"] = time.perf_counter() - start
+    result["pages_per_second"] = result["pages"] / result["seconds"] if result["seconds"] else 0.0
+    return result
+
+
+def run(data_root: str | os.PathLike,
+        volumes: list[int | str],
+        out_root: str | os.PathLike,
+        workers: int | None = None,
+        force: bool = False,
+        instrument: bool = False,
+        progress: bool = False,
+        index: bool = True) -> list[dict]:
+    """
+    Process volumes concurrently across at most workers processes and write a report of each to out_root
+    :param data_root: str | os.PathLike: directory holding the BMC_<vol>_<cols> folders of xmls
+    :param volumes: list[int | str]: volume numbers
+    :param out_root: str | os.PathLike
+    :param workers: int | None: number of worker processes, None or 1 processes volumes serially
+    :param force: bool: rebuild every volume, even if unchanged
+    :param instrument: bool: record the stages of extraction of each volume, see process_volume
+    :param progress: bool: show progress bars, they interleave if volumes run concurrently
+    :param index: bool: refresh the search index of out_root afterwards
+    :return: list[dict]: the result of each volume, in the order given, see process_volume
+    """
+    os.makedirs(out_root, exist_ok=True)
+    results = {}
+    if workers is None or workers <= 1:
+        for vol in volumes:
+            results[vol] = process_volume(vol, data_root, out_root, force, instrument, progress)
+            _print_result(results[vol])
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(volumes))) as executor:
+            futures = {executor.submit(process_volume, vol, data_root, out_root, force, instrument, progress): vol
+                       for vol in volumes}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                _print_result(results[futures[future]])
+
+    results = [results[vol] for vol in volumes]
+    _update_report(out_root, results)
+    if index:
+        with SearchIndex(os.path.join(out_root, index_name)) as search_index:
+            search_index.refresh(out_root)
+    return results
+
+
+def _update_report(out_root: str | os.PathLike, results: list[dict]) -> None:
+    """
+    Record the latest result of each volume in the report, keeping those of volumes not in this run
+    """
+    report_path = os.path.join(out_root, report_name)
+    try:
+        with open(report_path, encoding="utf-8") as f:
+            report = {str(result["volume"]): result for result in json.load(f)}
+    except (FileNotFoundError, json.JSONDecodeError):
+        report = {}
+    report.update({str(result["volume"]): result for result in results})
+    _write_atomic(report_path, lambda f: json.dump(list(report.values()), f, indent=1))
+
+
+def _print_result(result: dict) -> None:
+    print(f"Volume {result['volume']}: {result['status']}, {result['pages']} pages, {result['entries']} entries "
+          f"in {result['seconds']:.2f}s ({result['pages_per_second']:.1f} pages/s)")
+    if result["error"] is not None:
+        print(result["error"], file=sys.stderr)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-root", default=os.path.join("data", "raw"),
+                        help="directory holding the BMC_<vol>_<cols> folders of xmls")
+    parser.add_argument("--volumes", nargs="+", required=True, help="volume numbers, e.g. 1 8 10")
+    parser.add_argument("--out", default=os.path.join("data", "processed"), help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="volumes processed at once")
+    parser.add_argument("--force", action="store_true", help="rebuild volumes even if unchanged")
+    parser.add_argument("--instrument", action="store_true", help="record the time of each stage in the report")
+    parser.add_argument("--progress", action="store_true", help="show progress bars")
+    parser.add_argument("--no-index", action="store_true", help="don't refresh the search index")
+    args = parser.parse_args(argv)
+
+    results = run(args.data_root, args.volumes, args.out, args.workers, args.force, args.instrument, args.progress,
+                  not args.no_index)
+    return 1 if any(result["status"] == "failed" for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
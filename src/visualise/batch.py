@@ -0,0 +1,92 @@
+import os
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from src.data.instrumentation import default_instrumentation
+from src.visualise.render import RenderCache
+from src.visualise.image_registry import ImageRegistry
+from src.visualise.entry import get_concat_h, image_path, page_boxes
+
+_cache = None  # each worker process keeps its own few thumbnails
+
+
+def _render_sheet(task: tuple[str, list[tuple[str, list]]], scale: int, quality: int) -> str:
+    """
+    Render the pages of one output image, side by side if there's more than one, and write it
+    Module level so it can be sent to worker processes
+    :param task: the output path, and the scan path and word boxes of each page
+    :param scale: int
+    :param quality: int: JPEG quality
+    :return: str: the output path
+    """
+    global _cache
+    if _cache is None or _cache.scale != scale:
+        _cache = RenderCache(scale=scale, max_items=4)
+
+    out_path, pages = task
+    images = [_cache.render(path, boxes) for path, boxes in pages]
+    out = images[0] if len(images) == 1 else get_concat_h(images)
+
+    base, ext = os.path.splitext(out_path)
+    tmp_path = f"{base}.{os.getpid()}.tmp{ext}"
+    if ext.lower() in (".jpg", ".jpeg"):
+        out.convert("RGB").save(tmp_path, quality=quality)
+    else:
+        out.save(tmp_path)
+    os.replace(tmp_path, out_path)  # atomic, an interrupted run never leaves a partial image
+    return out_path
+
+
+def render_volume(page_entries_lookup,
+                  out_dir: str | os.PathLike,
+                  data_root: str | os.PathLike | None = None,
+                  workers: int | None = None,
+                  sheet_pages: int = 1,
+                  scale: int = 6,
+                  ext: str = ".jpg",
+                  quality: int = 90,
+                  overwrite: bool = False) -> list[str]:
+    """
+    Write every page of a volume with its entries highlighted, as display_page shows them, to out_dir
+    Each page is drawn on a thumbnail and composited once. Pages are rendered across a process pool if workers > 1.
+    With sheet_pages > 1 consecutive pages are written side by side as contact sheets, see get_concat_h.
+    Images already in out_dir are skipped unless overwrite is set, so an interrupted run can be picked up again.
+    :param page_entries_lookup: pd.DataFrame: from gen_page_entries_lookup
+    :param out_dir: str | os.PathLike
+    :param data_root: str | os.PathLike | None: directory holding the BMC_<vol>_<cols> folders of scans,
+        None for entry.data_root as the notebooks use
+    :param workers: int | None: number of worker processes, None or 1 renders serially
+    :param sheet_pages: int: pages per output image
+    :param scale: int: output is 1/scale of the scans
+    :param ext: str: output format, by extension
+    :param quality: int: JPEG quality
+    :param overwrite: bool
+    :return: list[str]: every output path, whether written now or before
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if data_root is None:
+        scan_path = image_path
+    else:
+        registry = ImageRegistry(data_root)
+        registry.refresh()
+        scan_path = registry.image_path
+    pages = list(zip(page_entries_lookup["xml"], page_entries_lookup["word_locs"]))
+
+    out_paths, tasks = [], []
+    for i in range(0, len(pages), sheet_pages):
+        sheet = pages[i: i + sheet_pages]
+        name = sheet[0][0] if len(sheet) == 1 else f"{sheet[0][0]}-{sheet[-1][0]}"
+        out_path = os.path.join(out_dir, name + ext)
+        out_paths.append(out_path)
+        if overwrite or not os.path.exists(out_path):
+            # boxes are sent as plain lists, not views of the volume's coordinate arrays
+            tasks.append((out_path, [(scan_path(xml), page_boxes(entries)) for xml, entries in sheet]))
+
+    render = partial(_render_sheet, scale=scale, quality=quality)
+    with default_instrumentation.stage("render_volume", len(tasks)):
+        if workers is None or workers <= 1:
+            [render(task) for task in default_instrumentation.bar(tasks)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                list(default_instrumentation.bar(executor.map(render, tasks), total=len(tasks)))
+
+    return out_paths
@@ -1,9 +1,22 @@
-import glob
+import os
 from IPython.display import display
 import pandas as pd
-from PIL import Image, ImageDraw
+from PIL import Image
 from matplotlib import colormaps
 from cycler import cycler
+from src.visualise.render import default_cache
+from src.visualise.image_registry import ImageRegistry
+
+
+def word_boxes(line_locs):
+    """
+    The word rectangles of a line to draw
+    Array-backed lines from extraction give their boxes straight from the volume's coordinate array,
+    lines reloaded from csv are already lists of [x0, y0, x1, y1]
+    """
+    if hasattr(line_locs, "boxes"):
+        return line_locs.boxes().tolist()
+    return line_locs
 
 
 def split_word_locs(row):
@@ -14,13 +27,16 @@ def split_word_locs(row):
 
 
 def gen_page_entries_lookup(df):
-    xml_list = df["xmls"].sum()
-    word_locs_split = df.apply(split_word_locs, axis=1).sum()
-
-    page_entries_df = pd.DataFrame(data={"xml": xml_list, "word_locs": word_locs_split})
-    page_entries_df["word_locs"] = page_entries_df["word_locs"].apply(lambda x: [x])
-
-    page_entries_lookup = page_entries_df.groupby(by="xml", as_index=False).sum()
+    # one pass over the entries, appending each page's share of an entry's word locations to that page's list,
+    # rather than concatenating lists pairwise with sum, which is quadratic in the number of entries
+    page_word_locs = {}
+    for xmls, start_lines, word_locs in zip(df["xmls"], df["xml_start_line"], df["word_locations"]):
+        row = {"xml_start_line": start_lines, "word_locations": word_locs}
+        for xml, locs in zip(xmls, split_word_locs(row)):
+            page_word_locs.setdefault(xml, []).append(locs)
+
+    xml_list = sorted(page_word_locs)  # the order groupby gave
+    page_entries_lookup = pd.DataFrame(data={"xml": xml_list, "word_locs": [page_word_locs[x] for x in xml_list]})
     pages_non_zeroed = page_entries_lookup["xml"].apply(lambda x: int(x.split("_")[-2]))
     page_entries_lookup["page"] = (pages_non_zeroed - (pages_non_zeroed.min() - 1)).values
     page_entries_lookup["n_entries"] = page_entries_lookup["word_locs"].apply(len)
@@ -37,32 +53,40 @@ def get_concat_h(ims):
     return dst
 
 
-def display_entry(df_row):
+data_root = os.environ.get("BMC_DATA_ROOT", "../data/raw")  # relative to the notebooks, set to run from elsewhere
+_registry = None
+
+
+def get_registry():
+    # built on first use from data_root, then kept up to date incrementally, see image_registry.ImageRegistry
+    global _registry
+    if _registry is None or _registry.data_root != data_root:
+        _registry = ImageRegistry(data_root)
+        _registry.refresh()
+    return _registry
+
+
+def image_path(xml):
+    # the scan for a page label, e.g. J_2704_aa_30_8_0098_4
+    registry = get_registry()
+    if xml not in registry:
+        registry.refresh()  # a scan added since the registry was built
+    return registry.image_path(xml)
+
+
+def display_entry(df_row, cache=None):
+    # pages are drawn on cached thumbnails at 1/6 scale, see render.RenderCache
+    cache = default_cache if cache is None else cache
     xmls = df_row["xmls"]
     start_lines = df_row["xml_start_line"]
-    vols = [xml.split("_")[-3] for xml in xmls]
-    cols = [xml[-1] for xml in xmls]
-    jpgs = [xml[:-2] for xml in xmls]
-    image_paths = [glob.glob(f"../data/raw/BMC_{vol}_{col}/*/{jpg}.jpg")[0] for vol, col, jpg in
-                   zip(vols, cols, jpgs)]
+    image_paths = [image_path(xml) for xml in xmls]
 
     # get an image
     word_locs = df_row["word_locations"]
     out_images = []
     for path, start, cutoff in zip(image_paths, [0] + start_lines, start_lines):
-        with Image.open(path).convert("RGBA") as base:
-
-            # make a blank image for the colour patches, initialized to transparent
-            patches = Image.new("RGBA", base.size, (255, 255, 255, 0))
-
-            draw = ImageDraw.Draw(patches)
-            for line in word_locs[start:cutoff]:
-                [draw.rectangle(word, fill=(237, 232, 74, 65)) for word in line]
-
-            out = Image.alpha_composite(base, patches)
-
-            width, height = base.width // 6, base.height // 6
-            out_images.append(out.resize((width, height)))
+        boxes = [(word_boxes(line), (237, 232, 74, 65)) for line in word_locs[start:cutoff]]
+        out_images.append(cache.render(path, boxes))
 
     concat_out = get_concat_h(out_images)
     display(concat_out)
@@ -75,29 +99,22 @@ colours = [[int(255 * x) for x in list(c)] + [65] for c in colours]
 pastel_cycler = cycler(color=colours)
 
 
-def display_page(page, page_entry_lookup):
-    xml = page_entry_lookup.loc[page, "xml"]
-    entries = page_entry_lookup.loc[page, "word_locs"]
+def page_boxes(entries):
+    # the word boxes of every line on a page, each entry's lines filled with the next colour of pastel_cycler
     cc = pastel_cycler()
     colours = [c['color'] for c, _ in zip(cc, entries)]
-    vol = xml.split("_")[-3]
-    col = xml[-1]
-    jpg = xml[:-2]
-    path = glob.glob(f"../data/raw/BMC_{vol}_{col}/*/{jpg}.jpg")[0]
-
-    with Image.open(path).convert("RGBA") as base:
+    return [(word_boxes(line), tuple(colour)) for word_locs, colour in zip(entries, colours) for line in word_locs]
 
-        # make a blank image for the colour patches, initialized to transparent
-        patches = Image.new("RGBA", base.size, (255, 255, 255, 0))
-        draw = ImageDraw.Draw(patches)
 
-        for word_locs, colour in zip(entries, colours):
-            for line in word_locs:
-                [draw.rectangle(word, fill=tuple(colour)) for word in line]
+def display_page(page, page_entry_lookup, cache=None):
+    # the pages either side are rendered in the background so paging through a volume is quick
+    cache = default_cache if cache is None else cache
+    xml = page_entry_lookup.loc[page, "xml"]
+    entries = page_entry_lookup.loc[page, "word_locs"]
 
-            out = Image.alpha_composite(base, patches)
+    resized = cache.render(image_path(xml), page_boxes(entries))
+    display(resized)
 
-        width, height = base.width // 6, base.height // 6
-        resized = out.resize((width, height))
-        display(resized)
-        return resized
+    neighbours = [p for p in (page - 1, page + 1) if p in page_entry_lookup.index]
+    cache.prefetch([image_path(page_entry_lookup.loc[p, "xml"]) for p in neighbours])
+    return resized
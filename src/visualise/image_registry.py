@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import hashlib
+from PIL import Image
+
+# Bump when the registry layout changes so an old file is rebuilt rather than misread
+REGISTRY_VERSION = 2
+registry_name = "image_registry.json"
+# generated files are kept out of the raw scans, set BMC_CACHE_DIR to keep registries elsewhere
+cache_dir = os.environ.get("BMC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "bmc"))
+
+_vol_dir_re = re.compile(r"BMC_\d{1,2}_[24]$")
+
+
+def default_registry_path(data_root: str | os.PathLike) -> str:
+    """
+    Where the registry of a data root is saved unless given a path, one file per data root in cache_dir
+    :param data_root: str | os.PathLike
+    :return: str
+    """
+    root_key = hashlib.sha1(os.path.abspath(data_root).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"image_registry_{root_key}.json")
+
+
+class ImageRegistry:
+    """
+    Page label to scan lookup for every volume under a data root, e.g. J_2704_aa_30_8_0098_4 to
+    data_root/BMC_8_4/<collection>/J_2704_aa_30_8_0098.jpg, with the scan's width and height
+    The registry is saved to path, by default in cache_dir rather than among the scans, with paths relative to
+    data_root and separated by "/" so it can be moved between systems. refresh lists only image folders whose modification time has changed since the
+    last refresh, and checks the size and modification time of each registered scan, so keeping it up to date with
+    new, removed or replaced scans is cheap.
+    Pages with an xml but no scan are recorded in missing.
+    """
+
+    def __init__(self, data_root: str | os.PathLike, path: str | os.PathLike | None = None):
+        self.data_root = data_root
+        self.path = default_registry_path(data_root) if path is None else path
+        self.images = {}  # label: [path relative to data_root, width, height, size, mtime_ns]
+        self.folders = {}  # image folder relative to data_root: [mtime_ns, labels of its scans, labels of its xmls]
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                registry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if registry.get("version") == REGISTRY_VERSION:
+            self.images, self.folders = registry["images"], registry["folders"]
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": REGISTRY_VERSION, "images": self.images, "folders": self.folders}, f)
+        os.replace(tmp_path, self.path)  # atomic, a reader never sees a partial registry
+
+    @property
+    def missing(self) -> list[str]:
+        """
+        Labels of pages with an xml but no scan
+        """
+        return sorted(label for _, scans, xmls in self.folders.values() for label in set(xmls) - set(scans))
+
+    def _image_folders(self) -> dict[str, int]:
+        """
+        Every image folder, data_root/BMC_<vol>_<cols>/<collection>, and its modification time
+        """
+        folders = {}
+        with os.scandir(self.data_root) as vol_dirs:
+            for vol_dir in vol_dirs:
+                if not (vol_dir.is_dir() and _vol_dir_re.match(vol_dir.name)):
+                    continue
+                with os.scandir(vol_dir.path) as collections:
+                    for collection in collections:
+                        if collection.is_dir():
+                            folders[f"{vol_dir.name}/{collection.name}"] = collection.stat().st_mtime_ns
+        return folders
+
+    def _register(self, label: str, relpath: str, stat: os.stat_result) -> None:
+        with Image.open(self._path(relpath)) as im:  # only the header is read
+            self.images[label] = [relpath, *im.size, stat.st_size, stat.st_mtime_ns]
+
+    def _path(self, relpath: str) -> str:
+        return os.path.join(self.data_root, *relpath.split("/"))
+
+    def refresh(self) -> dict:
+        """
+        Bring the registry up to date with the scans under data_root, and save it if anything changed
+        :return: dict: labels of scans added, replaced and removed, and of pages missing a scan
+        """
+        added, replaced, removed = [], [], []
+        folders = self._image_folders()
+
+        for folder in set(self.folders) - set(folders):
+            removed += self.folders.pop(folder)[1]
+        for folder, mtime_ns in folders.items():
+            if folder in self.folders and self.folders[folder][0] == mtime_ns:
+                # a scan overwritten in place doesn't change its folder's modification time
+                for label in self.folders[folder][1]:
+                    relpath, *_, size, scan_mtime_ns = self.images[label]
+                    stat = os.stat(self._path(relpath))
+                    if (stat.st_size, stat.st_mtime_ns) != (size, scan_mtime_ns):
+                        self._register(label, relpath, stat)
+                        replaced.append(label)
+                continue
+            old_scans = set(self.folders[folder][1]) if folder in self.folders else set()
+            n_cols = folder.split("/")[0][-1]
+            scans, xmls = [], []
+            with os.scandir(self._path(folder)) as files:
+                for file in files:
+                    stem, ext = os.path.splitext(file.name)
+                    label = f"{stem}_{n_cols}"
+                    if ext == ".jpg":
+                        scans.append(label)
+                        stat = file.stat()
+                        if label not in old_scans or label not in self.images:
+                            self._register(label, f"{folder}/{file.name}", stat)
+                            added.append(label)
+                        elif self.images[label][3:] != [stat.st_size, stat.st_mtime_ns]:
+                            self._register(label, f"{folder}/{file.name}", stat)
+                            replaced.append(label)
+                    elif ext == ".pxml":
+                        xmls.append(label)
+            removed += old_scans - set(scans)
+            self.folders[folder] = [mtime_ns, sorted(scans), sorted(xmls)]
+
+        for label in removed:
+            self.images.pop(label, None)
+        if added or replaced or removed or not os.path.exists(self.path):
+            self.save()
+
+        return {"added": sorted(added), "replaced": sorted(replaced), "removed": sorted(removed),
+                "missing": self.missing}
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self.images
+
+    def _entry(self, label: str) -> list:
+        if label not in self.images:
+            raise FileNotFoundError(f"No scan registered for page {label} under {self.data_root}, "
+                                    f"refresh the registry if it has been added")
+        return self.images[label]
+
+    def image_path(self, label: str) -> str:
+        """
+        Location of the scan of a page
+        :param label: str: page label, e.g. J_2704_aa_30_8_0098_4
+        :return: str
+        """
+        return self._path(self._entry(label)[0])
+
+    def image_size(self, label: str) -> tuple[int, int]:
+        """
+        Width and height of the scan of a page
+        :param label: str: page label, e.g. J_2704_aa_30_8_0098_4
+        :return: tuple[int, int]
+        """
+        _, width, height, *_ = self._entry(label)
+        return width, height
@@ -0,0 +1,176 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageDraw, PngImagePlugin
+
+# Bump when thumbnails are made differently so stale ones on disk are never read back
+THUMBNAIL_VERSION = 1
+
+
+class RenderCache:
+    """
+    Downscaled scans to draw word boxes onto, so a page is never composited at full resolution
+    JPEGs are decoded at reduced scale with Image.draft and resized to 1/scale of the scan, as display_entry did.
+    The most recent thumbnails are kept in memory, and if directory is set, on disk up to max_bytes, dropping the
+    least recently used. Keys include the scan's size and modification time, so a replaced scan is decoded again.
+    """
+    suffix = ".png"
+
+    def __init__(self, directory: str | os.PathLike | None = None, scale: int = 6, max_items: int = 64,
+                 max_bytes: int = 256 * 2 ** 20):
+        self.directory = directory
+        self.scale = scale
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key: (thumbnail, full size)
+        self._lock = threading.Lock()
+        self._prefetcher = None
+        self._size = None  # total bytes on disk, counted on the first write
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, path: str | os.PathLike) -> str:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        return hashlib.sha1(f"{THUMBNAIL_VERSION}:{self.scale}:{path}:{stat.st_size}:{stat.st_mtime_ns}"
+                            .encode("utf-8")).hexdigest()
+
+    def thumbnail(self, path: str | os.PathLike) -> tuple[Image.Image, tuple[int, int]]:
+        """
+        The scan at 1/scale as RGBA, and the size of the full scan
+        :param path: str | os.PathLike: location of a scan
+        :return: tuple[Image.Image, tuple[int, int]]
+        """
+        key = self.key(path)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        item = self._load(key)
+        if item is None:
+            item = self._decode(path)
+            self._save(key, item)
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        with self._lock:
+            self._memory[key] = item
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+        return item
+
+    def _decode(self, path: str | os.PathLike) -> tuple[Image.Image, tuple[int, int]]:
+        with Image.open(path) as im:
+            full_size = im.size
+            size = (full_size[0] // self.scale, full_size[1] // self.scale)
+            im.draft("RGB", size)  # JPEG decodes at the smallest power of 2 reduction at least this big
+            thumbnail = im.convert("RGBA").resize(size)
+        return thumbnail, full_size
+
+    def _record_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _load(self, key: str) -> tuple[Image.Image, tuple[int, int]] | None:
+        if self.directory is None:
+            return None
+        record_path = self._record_path(key)
+        try:
+            with Image.open(record_path) as im:
+                im.load()
+                full_size = tuple(int(x) for x in im.text["full_size"].split(","))
+                thumbnail = im.convert("RGBA")
+        except (FileNotFoundError, KeyError, OSError):
+            return None
+        os.utime(record_path)  # mark as recently used for eviction
+        return thumbnail, full_size
+
+    def _save(self, key: str, item: tuple[Image.Image, tuple[int, int]]) -> None:
+        if self.directory is None:
+            return None
+        thumbnail, full_size = item
+        info = PngImagePlugin.PngInfo()
+        info.add_text("full_size", f"{full_size[0]},{full_size[1]}")
+        record_path = self._record_path(key)
+        tmp_path = f"{record_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        thumbnail.convert("RGB").save(tmp_path, format="PNG", pnginfo=info)
+        try:
+            replaced = os.path.getsize(record_path)  # a thumbnail being overwritten no longer counts
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, record_path)  # atomic, a reader never sees a partial thumbnail
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._records())
+            else:
+                self._size += os.path.getsize(record_path) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _records(self) -> list[tuple[str, int, int]]:
+        """
+        (path, size, last used) of every thumbnail on disk
+        """
+        with os.scandir(self.directory) as it:
+            return [(entry.path, entry.stat().st_size, entry.stat().st_mtime_ns) for entry in it
+                    if entry.name.endswith(self.suffix)]
+
+    def _evict(self) -> None:
+        """
+        Remove least recently used thumbnails from disk until the directory is back under max_bytes
+        Only called once the running size is over max_bytes, so the directory is listed only when there's something
+        to evict, and the size is recounted from it, taking in thumbnails written by other processes
+        """
+        records = sorted(self._records(), key=lambda x: x[2])
+        self._size = sum(size for _, size, _ in records)
+        for path, record_size, _ in records:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= record_size
+
+    def prefetch(self, paths: list[str | os.PathLike]) -> None:
+        """
+        Make thumbnails in a background thread, e.g. for the pages either side of the one being shown
+        :param paths: list[str | os.PathLike]
+        :return: None
+        """
+        if self._prefetcher is None:
+            self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        for path in paths:
+            self._prefetcher.submit(self.thumbnail, path)
+
+    def render(self, path: str | os.PathLike, boxes: list[tuple[list, tuple]]) -> Image.Image:
+        """
+        The scan at 1/scale with translucent word boxes drawn over it
+        Boxes are in full scan coordinates and are scaled down to the thumbnail
+        :param path: str | os.PathLike: location of a scan
+        :param boxes: list[tuple[list, tuple]]: the [x0, y0, x1, y1] boxes of each set of words and their RGBA fill
+        :return: Image.Image
+        """
+        thumbnail, full_size = self.thumbnail(path)
+        sx, sy = thumbnail.width / full_size[0], thumbnail.height / full_size[1]
+
+        # make a blank image for the colour patches, initialized to transparent
+        patches = Image.new("RGBA", thumbnail.size, (255, 255, 255, 0))
+        draw = ImageDraw.Draw(patches)
+        for words, fill in boxes:
+            for word in words:
+                x0, y0, x1, y1 = word if len(word) == 4 else (*word[0], *word[1])  # or [(x0, y0), (x1, y1)]
+                draw.rectangle((x0 * sx, y0 * sy, x1 * sx, y1 * sy), fill=fill)
+
+        return Image.alpha_composite(thumbnail, patches)
+
+
+default_cache = RenderCache()  # memory only, set a RenderCache with a directory to keep thumbnails between sessions
@@ -0,0 +1,94 @@
+import os
+import glob
+import shutil
+import pytest
+from tqdm import tqdm
+from functools import partialmethod
+from src import pipeline
+from src.corpus import Corpus, Volume, _frame_bytes
+from src.data.entry_store import load_entries
+from src.data.incremental import entries_name
+from src.visualise.entry import gen_page_entries_lookup
+from src.visualise.render import RenderCache
+from src.visualise.image_registry import registry_name
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+@pytest.fixture()
+def corpus_roots(tmp_path):
+    # work on a copy, so nothing written while the tests run can touch the committed scans
+    for vol_dir in glob.glob(os.path.join("data", "raw", "BMC_*")):
+        shutil.copytree(vol_dir, tmp_path / "raw" / os.path.basename(vol_dir))
+    pipeline.run(str(tmp_path / "raw"), [1, 8, 10], str(tmp_path / "out"), index=False)
+    return str(tmp_path / "raw"), str(tmp_path / "out")
+
+
+def test_corpus(corpus_roots):
+    corpus = Corpus(*corpus_roots)
+    assert corpus.volumes == [1, 8, 10] and 8 in corpus and 3 not in corpus
+    assert all(not volume.loaded for volume in corpus) and corpus.memory == 0
+
+    volume = corpus[8]
+    entry_df = load_entries(os.path.join(volume.out_dir, entries_name))
+    assert volume.entries.to_csv() == entry_df.to_csv()
+    assert volume.loaded == ["entries"]
+
+    # every page is numbered in order, the first page of volume 8 has no entries
+    pages = volume.pages
+    assert pages.index.tolist() == list(range(1, len(volume) + 1))
+    assert pages["xml"].tolist() == volume.labels
+    assert pages.loc[1, "xml"] == "J_2704_aa_30_8_0098_4" and pages.loc[1, "n_entries"] == 0
+    lookup = gen_page_entries_lookup(entry_df).set_index("xml")
+    with_entries = pages[pages["n_entries"] > 0].set_index("xml")
+    assert with_entries.index.tolist() == lookup.index.tolist()
+    assert with_entries["word_locs"].tolist() == lookup["word_locs"].tolist()
+
+    assert volume.image_path(2) == glob.glob(os.path.join(corpus_roots[0], "BMC_8_2", "*",
+                                                          "J_2704_aa_30_8_0099.jpg"))[0]
+    assert volume.render_page(2, RenderCache()).size[0] > 0
+    assert os.path.exists(os.path.join(corpus_roots[1], registry_name))  # saved with the output, not the scans
+    assert not os.path.exists(os.path.join(corpus_roots[0], registry_name))
+    assert "\n".join(volume.lines[:3]) == volume.lines.text(0, 3)
+    assert corpus[1].loaded == [] and corpus.memory > 0
+
+
+def test_corpus_memory_budget(corpus_roots):
+    corpus = Corpus(*corpus_roots)
+    entries_1 = corpus[1].entries.to_csv()
+    corpus.max_bytes = corpus.memory * 2
+
+    corpus[8].entries
+    corpus[10].entries  # over budget, volume 1 is the least recently used
+    assert [volume.loaded for volume in corpus] == [[], ["entries"], ["entries"]]
+    assert corpus.memory <= corpus.max_bytes
+
+    # pages hold the word locations of the entries, which are counted once
+    memory = corpus.memory
+    pages = corpus[10].pages
+    assert corpus.memory - memory == corpus[10].nbytes - _frame_bytes(corpus[10].entries) < _frame_bytes(pages)
+    assert corpus.memory == corpus[8].nbytes + corpus[10].nbytes
+    coords = corpus[10].entries["entry"].iloc[0][0].coords  # counted by nbytes, not line by line
+    assert (_frame_bytes(corpus[10].entries) - corpus[10].entries.memory_usage(deep=True).sum()
+            == coords.points.nbytes + coords.word_offsets.nbytes + coords.line_offsets.nbytes)
+
+    corpus.max_bytes = 0  # the volume just used is kept whatever the budget, the others are dropped whole
+    assert corpus[1].entries.to_csv() == entries_1
+    assert [volume.loaded for volume in corpus] == [["entries"], [], []]
+    assert corpus.memory == corpus[1].nbytes
+
+    corpus.clear()
+    assert corpus.memory == 0 and all(not volume.loaded for volume in corpus)
+
+
+def test_volume_from_csv(corpus_roots):
+    data_root, out_root = corpus_roots
+    volume = Volume(10, data_root, out_root)
+    entry_df = volume.entries
+    os.remove(os.path.join(volume.out_dir, entries_name))
+    csv_df = Volume(10, data_root, out_root).entries
+    assert csv_df["entry_text"].tolist() == entry_df["entry_text"].tolist()
+    assert csv_df["word_locations"].tolist() == entry_df["word_locations"].tolist()
+
+    with pytest.raises(FileNotFoundError):
+        Volume(3, data_root, out_root).entries
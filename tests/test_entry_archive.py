@@ -0,0 +1,45 @@
+import os
+import glob
+import pytest
+from tqdm import tqdm
+from functools import partialmethod
+import src.data.xml_extraction as xmle
+from src.data.entry_archive import EntryArchive, entry_records, save_entries_archive, write_archive
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+@pytest.fixture(scope="module")
+def catalogue_entries():
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_10_*", "*", "*.pxml"))
+    lines, xml_track_df = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+    title_shelfmarks, title_indices, o_l = xmle.find_headings(lines)
+    return xmle.extract_catalogue_entries(o_l, title_indices, title_shelfmarks, xml_track_df)
+
+
+@pytest.mark.parametrize("shard_size, workers", [(1, None), (8, None), (8, 3)])
+def test_entry_archive(tmp_path, catalogue_entries, shard_size, workers):
+    path = tmp_path / "entries.bmca"
+    assert save_entries_archive(catalogue_entries, path, shard_size=shard_size, workers=workers) == len(catalogue_entries)
+    assert os.listdir(tmp_path) == ["entries.bmca"]
+
+    archive = EntryArchive(path)
+    records = list(entry_records(catalogue_entries))
+    assert len(archive) == len(records)
+    assert archive.keys == [key for key, _, _ in records]
+    assert list(archive.items()) == [(key, text) for key, _, text in records]
+
+    key, shelfmark, text = records[len(records) // 2]
+    assert archive[key] == "\n".join(catalogue_entries["entry"].iloc[len(records) // 2])
+    assert text in archive.find(shelfmark)
+    assert archive.find("not a shelfmark") == []
+
+
+def test_entry_archive_failed_write(tmp_path):
+    def records():
+        yield "a", "a", "text"
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        write_archive(records(), tmp_path / "entries.bmca")
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,46 @@
+import os
+import glob
+import pytest
+from tqdm import tqdm
+from functools import partialmethod
+import src.data.xml_extraction as xmle
+from src.data.entry_store import save_entries, load_entries
+from src.data.word_coords import LinePoints
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+@pytest.fixture()
+def catalogue_entries():
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_10_*", "*", "*.pxml"))
+    lines, xml_track_df = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+    title_shelfmarks, title_indices, o_l = xmle.find_headings(lines)
+    return xmle.extract_catalogue_entries(o_l, title_indices, title_shelfmarks, xml_track_df)
+
+
+def test_entries_round_trip(tmp_path, catalogue_entries):
+    save_entries(catalogue_entries, tmp_path / "catalogue_entries.parquet")
+    loaded = load_entries(tmp_path / "catalogue_entries.parquet")
+
+    assert loaded.columns.tolist() == catalogue_entries.columns.tolist()
+    assert loaded.dtypes.tolist() == catalogue_entries.dtypes.tolist()
+    assert loaded.to_csv() == catalogue_entries.to_csv()
+    for column in catalogue_entries.columns:
+        assert loaded[column].tolist() == catalogue_entries[column].tolist()
+
+    # lines come back viewing their word coordinates as they do from extraction
+    assert isinstance(loaded.loc[0, "entry"][0], xmle.TextLine)
+    assert loaded.loc[0, "entry"][0].points == loaded.loc[0, "word_locations"][0]
+    assert isinstance(loaded.loc[0, "word_locations"][0], LinePoints)
+
+
+def test_entries_column_projection(tmp_path, catalogue_entries):
+    save_entries(catalogue_entries, tmp_path / "catalogue_entries.parquet")
+    loaded = load_entries(tmp_path / "catalogue_entries.parquet", columns=["shelfmark", "entry_text"])
+
+    assert loaded.columns.tolist() == ["shelfmark", "entry_text"]
+    assert loaded["shelfmark"].tolist() == catalogue_entries["shelfmark"].tolist()
+    assert loaded["entry_text"].tolist() == catalogue_entries["entry_text"].tolist()
+
+    loaded = load_entries(tmp_path / "catalogue_entries.parquet", columns=["word_locations"])
+    assert loaded["word_locations"].tolist() == catalogue_entries["word_locations"].tolist()
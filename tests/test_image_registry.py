@@ -0,0 +1,72 @@
+import os
+import pytest
+from PIL import Image
+import src.visualise.image_registry as image_registry
+from src.visualise.image_registry import ImageRegistry
+
+
+def make_page(folder, name, size=(40, 60), scan=True):
+    os.makedirs(folder, exist_ok=True)
+    if scan:
+        Image.new("RGB", size).save(os.path.join(folder, name + ".jpg"), format="JPEG")
+    with open(os.path.join(folder, name + ".pxml"), "w") as f:
+        f.write("<PcGts/>")
+
+
+def bump_mtime(folder):
+    stat = os.stat(folder)
+    os.utime(folder, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_image_registry(tmp_path):
+    folder = tmp_path / "BMC_3_2" / "123"
+    make_page(folder, "J_2704_aa_30_3_0001")
+    make_page(folder, "J_2704_aa_30_3_0002", scan=False)
+    make_page(tmp_path / "BMC_3_4" / "456", "J_2704_aa_30_3_0003", size=(80, 100))
+
+    registry = ImageRegistry(tmp_path, tmp_path / "registry.json")
+    summary = registry.refresh()
+    assert summary["added"] == ["J_2704_aa_30_3_0001_2", "J_2704_aa_30_3_0003_4"]
+    assert summary["missing"] == ["J_2704_aa_30_3_0002_2"]
+    assert registry.image_path("J_2704_aa_30_3_0003_4") == str(tmp_path / "BMC_3_4" / "456" / "J_2704_aa_30_3_0003.jpg")
+    assert registry.image_size("J_2704_aa_30_3_0003_4") == (80, 100)
+    with pytest.raises(FileNotFoundError):
+        registry.image_path("J_2704_aa_30_3_0002_2")
+
+    make_page(folder, "J_2704_aa_30_3_0002")
+    os.remove(tmp_path / "BMC_3_4" / "456" / "J_2704_aa_30_3_0003.jpg")
+    bump_mtime(folder)
+    bump_mtime(tmp_path / "BMC_3_4" / "456")
+    summary = ImageRegistry(tmp_path, tmp_path / "registry.json").refresh()  # picks up the saved registry
+    assert summary == {"added": ["J_2704_aa_30_3_0002_2"], "replaced": [], "removed": ["J_2704_aa_30_3_0003_4"],
+                       "missing": ["J_2704_aa_30_3_0003_4"]}
+
+    registry = ImageRegistry(tmp_path, tmp_path / "registry.json")
+    assert len(registry) == 2
+    assert registry.refresh()["added"] == []
+
+
+def test_image_registry_replaced_scan(tmp_path):
+    folder = tmp_path / "BMC_3_2" / "123"
+    make_page(folder, "J_2704_aa_30_3_0001")
+    registry = ImageRegistry(tmp_path, tmp_path / "registry.json")
+    registry.refresh()
+    assert registry.folders.keys() == {"BMC_3_2/123"}
+    assert registry.images["J_2704_aa_30_3_0001_2"][0] == "BMC_3_2/123/J_2704_aa_30_3_0001.jpg"
+
+    folder_stat = os.stat(folder)
+    Image.new("RGB", (120, 90)).save(folder / "J_2704_aa_30_3_0001.jpg", format="JPEG")
+    os.utime(folder, ns=(folder_stat.st_atime_ns, folder_stat.st_mtime_ns))  # as if overwritten in place
+    summary = ImageRegistry(tmp_path, tmp_path / "registry.json").refresh()
+    assert summary["replaced"] == ["J_2704_aa_30_3_0001_2"] and summary["added"] == []
+    assert ImageRegistry(tmp_path, tmp_path / "registry.json").image_size("J_2704_aa_30_3_0001_2") == (120, 90)
+
+
+def test_image_registry_default_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_registry, "cache_dir", str(tmp_path / "cache"))
+    make_page(tmp_path / "raw" / "BMC_3_2" / "123", "J_2704_aa_30_3_0001")
+    registry = ImageRegistry(tmp_path / "raw")
+    registry.refresh()
+    assert os.path.dirname(registry.path) == str(tmp_path / "cache") and os.path.exists(registry.path)
+    assert not os.path.exists(tmp_path / "raw" / image_registry.registry_name)
+    assert ImageRegistry(tmp_path / "other").path != registry.path
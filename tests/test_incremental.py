@@ -0,0 +1,86 @@
+import os
+import glob
+import shutil
+import pytest
+from tqdm import tqdm
+from functools import partialmethod
+import src.data.xml_extraction as xmle
+from src.data.incremental import update_volume
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+def full_rebuild(xmls):
+    lines, xml_track_df = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+    title_shelfmarks, title_indices, ordered_lines = xmle.find_headings(lines)
+    return xmle.extract_catalogue_entries(ordered_lines, title_indices, title_shelfmarks, xml_track_df)
+
+
+def copy_volume(tmp_path):
+    for vol_dir in glob.glob(os.path.join("data", "raw", "BMC_10_*")):
+        shutil.copytree(vol_dir, tmp_path / "raw" / os.path.basename(vol_dir))
+    return glob.glob(str(tmp_path / "raw" / "*" / "*" / "*.pxml"))
+
+
+def edit_page(xml, old, new):
+    with open(xml, encoding="utf-8") as f:
+        content = f.read()
+    with open(xml, "w", encoding="utf-8") as f:
+        f.write(content.replace(old, new, 3))
+    stat = os.stat(xml)
+    os.utime(xml, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_update_volume(tmp_path):
+    xmls = copy_volume(tmp_path)
+    out_dir = tmp_path / "out"
+
+    entry_df, summary = update_volume(xmls, out_dir)
+    assert summary["full_rebuild"]
+    assert entry_df.to_csv() == full_rebuild(xmls).to_csv()
+
+    entry_df, summary = update_volume(xmls, out_dir)
+    assert not summary["full_rebuild"]
+    assert summary["changed_pages"] == []
+    assert entry_df.to_csv() == full_rebuild(xmls).to_csv()
+
+    xml = xmle._sort_xmls(xmls)[5]
+    edit_page(xml, "<Unicode>", "<Unicode>IA. 1234. ")
+    entry_df, summary = update_volume(xmls, out_dir)
+    assert summary["changed_pages"] == [xmle._xml_label(xml)]
+    assert summary["rebuilt_entries"] < len(entry_df)
+    assert entry_df.to_csv() == full_rebuild(xmls).to_csv()
+
+
+def test_update_volume_removed_page(tmp_path):
+    xmls = copy_volume(tmp_path)
+    out_dir = tmp_path / "out"
+    update_volume(xmls, out_dir)
+
+    xml = xmle._sort_xmls(xmls)[8]
+    os.remove(xml)
+    xmls.remove(xml)
+    entry_df, summary = update_volume(xmls, out_dir)
+    assert summary["pages"] == len(xmls)
+    assert entry_df.to_csv() == full_rebuild(xmls).to_csv()
+
+
+def test_update_volume_interrupted(tmp_path, monkeypatch):
+    import src.data.incremental as incremental
+    xmls = copy_volume(tmp_path)
+    out_dir = tmp_path / "out"
+    update_volume(xmls, out_dir)
+
+    # the run dies after writing the new entry table and line store, leaving the previous manifest
+    edit_page(xmle._sort_xmls(xmls)[5], "<Unicode>", "<Unicode>IA. 1234. ")
+
+    def interrupted(manifest, out_dir):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as m:
+        m.setattr(incremental, "_save_manifest", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            update_volume(xmls, out_dir)
+
+    entry_df, summary = update_volume(xmls, out_dir)
+    assert summary["full_rebuild"]
+    assert entry_df.to_csv() == full_rebuild(xmls).to_csv()
@@ -0,0 +1,86 @@
+import os
+import json
+import glob
+import pytest
+from tqdm import tqdm
+from functools import partialmethod
+import src.data.xml_extraction as xmle
+from src.data.instrumentation import Instrumentation, default_instrumentation
+from src import pipeline
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+@pytest.fixture()
+def instrumentation():
+    default_instrumentation.reset()
+    yield default_instrumentation.enable()
+    default_instrumentation.disable()
+    default_instrumentation.reset()
+
+
+def test_disabled():
+    instrumentation = Instrumentation()
+    with instrumentation.stage("stage", 10) as stage:
+        assert stage is None
+    instrumentation.count("counter")
+    assert instrumentation.report()["stages"] == {}
+    assert instrumentation.report()["counters"] == {}
+
+
+def test_stages(instrumentation):
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_10_*", "*", "*.pxml"))
+    lines, xml_track_df = xmle.extract_lines_for_vol(xmle.gen_xml_trees(xmls))
+    title_shelfmarks, title_indices, ordered_lines = xmle.find_headings(lines)
+    xmle.extract_catalogue_entries(ordered_lines, title_indices, title_shelfmarks, xml_track_df)
+
+    report = instrumentation.report()
+    stages = report["stages"]
+    assert list(stages) == ["gen_xml_trees", "extract_lines", "find_shelfmarks", "find_headings",
+                            "extract_catalogue_entries"]
+    assert stages["gen_xml_trees"]["items"] == 15
+    assert stages["gen_xml_trees"]["bytes_read"] == sum(os.path.getsize(xml) for xml in xmls)
+    assert stages["extract_lines"]["items"] == stages["find_headings"]["items"] == len(lines)
+    assert stages["extract_catalogue_entries"]["items"] == len(title_indices)
+    assert all(stage["calls"] == 1 and stage["seconds"] > 0 and stage["peak_memory"] is None
+               for stage in stages.values())
+
+    counters = report["counters"]
+    n_hits = sum(v for k, v in counters.items() if k.startswith("shelfmark_hits"))
+    assert n_hits == sum(sm is not None for sm in xmle.find_shelfmarks(lines)) > 0
+    assert n_hits + counters["shelfmark_misses"] == len(lines)
+    assert counters["headings"] == len(title_indices)
+
+
+def test_streamed_stages(instrumentation):
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_10_*", "*", "*.pxml"))
+    xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+    stages = instrumentation.report()["stages"]
+    assert stages["iter_vol_lines"]["calls"] == stages["iter_vol_lines"]["items"] == 15
+    assert stages["iter_vol_lines"]["bytes_read"] == sum(os.path.getsize(xml) for xml in xmls)
+
+
+def test_peak_memory(tmp_path):
+    instrumentation = Instrumentation().enable(memory=True)
+    try:
+        with instrumentation.stage("outer"):
+            with instrumentation.stage("inner"):
+                block = bytearray(8 * 2 ** 20)
+                del block
+    finally:
+        instrumentation.disable()
+    stages = instrumentation.report()["stages"]
+    assert stages["inner"]["peak_memory"] >= 8 * 2 ** 20
+    assert stages["outer"]["peak_memory"] >= stages["inner"]["peak_memory"]
+
+    instrumentation.save(tmp_path / "report.json")
+    with open(tmp_path / "report.json", encoding="utf-8") as f:
+        assert json.load(f) == instrumentation.report()
+
+
+def test_pipeline_instrumentation(tmp_path):
+    results = pipeline.run(os.path.join("data", "raw"), [10], str(tmp_path), instrument=True)
+    stages = results[0]["instrumentation"]["stages"]
+    assert stages["read_pages"]["items"] == 15
+    assert "find_shelfmarks" in stages
+    assert not default_instrumentation.enabled
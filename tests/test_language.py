@@ -0,0 +1,93 @@
+import os
+import re
+import glob
+from tqdm import tqdm
+from functools import partialmethod
+import src.data.xml_extraction as xmle
+from langdetect import DetectorFactory
+from src.data.language import LanguageDetector, UNKNOWN, detect_line
+from src.data.instrumentation import default_instrumentation
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+def test_split_by_language():
+    lines = ["a", "b", "c", "d", "e", "f", "g"]
+    languages = ["en", "en", "fr", "de", "en", "en", "en"]
+    first_language, split_lines = xmle.split_by_language(lines, languages)
+
+    assert first_language
+    assert split_lines == [["a", "b"], ["c", "d"], ["e", "f", "g"]]
+
+
+def test_language_detector():
+    detector = LanguageDetector(seed=0)
+    lines = ["The history of the kings of England", "Histoire des rois de France", "12", "The history of the kings of England"]
+    languages = detector.detect(lines)
+
+    assert languages[0] == languages[3] == "en"
+    assert languages[2] == UNKNOWN
+    assert detector.n_detected == 3
+    assert LanguageDetector(seed=0).detect(lines) == languages
+
+    assert detector.detect_entries([lines[:2], [], lines[2:]]) == [languages[:2], [], languages[2:]]
+    assert detector.n_detected == 3
+
+    assert detect_line(None) == UNKNOWN  # anything langdetect fails on is unknown, not just lines without letters
+    assert DetectorFactory.seed is None  # the seed of langdetect's shared factory is left alone
+
+
+def test_language_detector_max_lines():
+    detector = LanguageDetector(seed=0, max_lines=2)
+    lines = ["The history of the kings of England", "Histoire des rois de France", "Geschichte der Könige"]
+    languages = detector.detect(lines)
+    assert languages == LanguageDetector(seed=0).detect(lines)
+    assert list(detector.cache) == lines[1:]
+
+    detector.detect(lines[1:2])  # used again, so kept over the line after it
+    detector.detect(lines[:1])
+    assert list(detector.cache) == [lines[1], lines[0]] and detector.n_detected == 4
+
+
+def test_save_split_txt(tmp_path):
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_1_*", "*", "*.pxml"))
+    lines, _ = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+    title_shelfmarks, title_indices, ordered_lines = xmle.find_headings(lines)
+    default_instrumentation.reset()
+    default_instrumentation.enable()
+    try:
+        xmle.save_split_txt(title_indices, ordered_lines, tmp_path, title_shelfmarks, LanguageDetector(seed=0))
+        languages_detected = default_instrumentation.counters["languages_detected"]
+    finally:
+        default_instrumentation.disable()
+        default_instrumentation.reset()
+
+    # the number of lines of each file and the length of each non-English section it leaves out
+    expected = {
+        "G- 12216": (127, [17]), "G- 12226": (74, [11, 2]), "IA- 11": (23, [2]), "IA- 12": (24, [8]),
+        "IA- 24": (21, [12]), "IA- 25": (24, [2, 2]), "IA- 27": (25, [24]), "IA- 28": (27, [4, 12]),
+        "IA- 53": (17, [28, 2]), "IA- 62": (26, [20, 4]), "IA- 7": (58, [12, 5, 7, 2]), "IB- 14": (62, [9, 2, 7]),
+        "IB- 17": (37, [9]), "IB- 21": (22, [6]), "IB- 23": (97, [10, 2, 3, 7]), "IB- 32": (14, [7]),
+        "IB- 6": (77, [2, 14, 4, 5]), "IB- 66": (22, [2, 5]), "IB- 8": (33, [23]), "IB-44": (107, [5]),
+        "IC- 29": (45, [22, 4, 2]), "IC- 30": (12, [15, 7]), "IC- 33": (57, [8, 15]), "IC- 34": (18, [2]),
+        "IC- 35": (22, [15]), "IC- 47": (39, [2, 2]), "IC- 5": (37, [10, 2]), "IC- 58": (17, [2]),
+        "IC- 65": (40, [13, 14]), "IC- 68": (16, [6]), "IC- 77": (73, [16, 3]), "IC- 79": (31, [10, 3])}
+    texts = {}
+    for path in glob.glob(os.path.join(tmp_path, "*.txt")):
+        with open(path, encoding="utf-8") as f:
+            texts[os.path.basename(path)[:-4]] = f.read()
+    assert {name: (len(text.splitlines()), [int(x) for x in re.findall(r"LASTING (\d+) LINES", text)])
+            for name, text in texts.items()} == expected
+    assert texts["IC- 30"] == ("TURRIS SAPIENTIAE.The Netherlands?, 1480 ?)\n"
+                               "-----------------------------------\n"
+                               "NON-ENGLISH SECTION LASTING 15 LINES\n"
+                               "-----------------------------------\n"
+                               "K-X. [One hundred and eight moral precepts, shown\n"
+                               "as stones in a wall of twelve courses, named respectively\n"
+                               "-----------------------------------\n"
+                               "NON-ENGLISH SECTION LASTING 7 LINES\n"
+                               "-----------------------------------\n"
+                               "395 x 246 mm. Coloured in red and yellow.\n"
+                               "Bought in July, 1849.\n"
+                               "IC. 30.\n")
+    assert 0 < languages_detected <= len(ordered_lines)
@@ -0,0 +1,64 @@
+import os
+import glob
+import pickle
+import pytest
+from tqdm import tqdm
+from functools import partialmethod
+import src.data.xml_extraction as xmle
+from src.data.incremental import update_volume, entries_name
+from src.data.entry_store import load_entries
+from src.data.word_coords import WordCoords
+from src.data.line_store import LineStore, save_lines, lines_name
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+def test_line_store_round_trip(tmp_path):
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_1_*", "*", "*.pxml"))
+    lines, xml_track_df = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+    offsets, labels = xmle.page_offsets(xml_track_df)
+    path = tmp_path / lines_name
+    save_lines(path, lines, offsets, labels)
+
+    with LineStore(path) as store:
+        assert len(store) == len(lines)
+        assert list(store) == lines
+        assert [x.points for x in store] == [x.points for x in lines]
+        assert store.coords == WordCoords.from_lines(lines)
+        assert store[5] == lines[5] and store[-1] == lines[-1] and store[10:20] == lines[10:20]
+        assert store.text(10, 20) == "\n".join(lines[10:20]) and store.text(3, 3) == ""
+        assert store.labels == labels
+        assert store.page_lines(labels[2]) == lines[offsets[2]: offsets[3]]
+        assert pickle.loads(pickle.dumps(store))[:] == lines
+        with pytest.raises(IndexError):
+            store[len(lines)]
+
+    save_lines(path, [xmle.TextLine("Bûch", WordCoords.from_nested([[[(1, 2), (3, 4)]]]), 0)])
+    with LineStore(path) as store:
+        assert store[:] == ["Bûch"] and store[0].points == [[(1, 2), (3, 4)]]
+    save_lines(path, [])
+    with LineStore(path) as store:
+        assert len(store) == 0 and store[:] == []
+
+    path.write_bytes(b"not a line store")
+    with pytest.raises(ValueError):
+        LineStore(path)
+
+
+def test_update_volume_line_store(tmp_path):
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_8_*", "*", "*.pxml"))
+    update_volume(xmls, tmp_path)
+    entry_df = load_entries(tmp_path / entries_name)
+
+    with LineStore(tmp_path / lines_name) as store:
+        starts = [title[0] for title in entry_df["title"]]
+        ends = starts[1:] + [len(store)]
+        assert [store.text(start, end) for start, end in zip(starts, ends)] == entry_df["entry_text"].tolist()
+        assert [store[start: end] for start, end in zip(starts, ends)] == entry_df["entry"].tolist()
+        assert ([[x.points for x in store[start: end]] for start, end in zip(starts, ends)]
+                == entry_df["word_locations"].tolist())
+
+    os.remove(tmp_path / lines_name)
+    _, summary = update_volume(xmls, tmp_path)  # a volume processed without a store is rebuilt to write one
+    assert summary["full_rebuild"]
+    assert os.path.exists(tmp_path / lines_name)
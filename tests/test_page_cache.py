@@ -0,0 +1,92 @@
+import os
+import glob
+import shutil
+from tqdm import tqdm
+from functools import partialmethod
+import src.data.xml_extraction as xmle
+from src.data.page_cache import PageCache
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+def test_page_cache_round_trip(tmp_path):
+    cache = PageCache(tmp_path / "cache")
+    xml = os.path.join("tests", "title_xml_example_1.xml")
+    lines = list(xmle.iter_page_lines(xml))
+
+    assert cache.get(xml) is None
+    cache.put(xml, lines)
+    cached_lines = cache.get(xml)
+
+    assert cached_lines == lines
+    assert [x.points for x in cached_lines] == [x.points for x in lines]
+    assert type(cached_lines[0]) == xmle.TextLine
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.invalidate(xml)
+    assert cache.get(xml) is None
+
+
+def test_page_cache_invalidated_by_change(tmp_path):
+    cache = PageCache(tmp_path / "cache")
+    xml = str(tmp_path / "page.xml")
+    shutil.copy(os.path.join("tests", "small_xml_example_1.xml"), xml)
+    cache.put(xml, list(xmle.iter_page_lines(xml)))
+
+    with open(xml, encoding="utf-8") as f:
+        content = f.read()
+    with open(xml, "w", encoding="utf-8") as f:
+        f.write(content.replace("Test line 1", "Corrected line 1"))
+
+    assert cache.get(xml) is None
+    cache.put(xml, list(xmle.iter_page_lines(xml)))
+    assert len(cache._records()) == 1  # the record of the page before its edit is removed
+    assert cache.get(xml) is not None
+
+
+def test_page_cache_size(tmp_path):
+    cache = PageCache(tmp_path / "cache")
+    xmls = glob.glob(os.path.join("tests", "*.xml"))
+    for _ in range(3):  # overwriting a record doesn't count its bytes again
+        for xml in xmls:
+            cache.put(xml, list(xmle.iter_page_lines(xml)))
+    assert cache._size == sum(size for _, size, _ in cache._records())
+    assert len(cache._records()) == len(xmls)
+
+    # each page's records are in a folder of their own, which invalidate removes
+    assert len(os.listdir(tmp_path / "cache")) == len(xmls)
+    assert cache._records(cache._page_dir(cache.key(xmls[0])))[0][0] == cache._record_path(cache.key(xmls[0]))
+    cache.invalidate(xmls[0])
+    assert len(os.listdir(tmp_path / "cache")) == len(xmls) - 1
+
+
+def test_page_cache_eviction(tmp_path):
+    cache = PageCache(tmp_path / "cache", max_bytes=3000)
+    xmls = glob.glob(os.path.join("tests", "*.xml"))
+    for xml in xmls:
+        cache.put(xml, list(xmle.iter_page_lines(xml)))
+
+    assert sum(size for _, size, _ in cache._records()) <= 3000
+    assert cache.get(xmls[-1]) is not None  # most recent write survives
+
+    cache.clear()
+    assert not cache._records()
+
+
+def test_iter_vol_lines_cached(tmp_path):
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_10_*", "*", "*.pxml"))
+    cache = PageCache(tmp_path / "cache")
+    lines, xml_track_df = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+
+    xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls, cache=cache))
+    assert (cache.hits, cache.misses) == (0, len(xmls))
+    cached_lines, cached_xml_track_df = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls, cache=cache))
+    assert (cache.hits, cache.misses) == (len(xmls), len(xmls))
+
+    assert cached_lines == lines
+    assert [x.points for x in cached_lines] == [x.points for x in lines]
+    assert cached_xml_track_df.equals(xml_track_df)
+
+    pool_lines, _ = xmle.extract_lines_for_vol(xmle.gen_xml_lines(xmls, cache=cache))
+    assert pool_lines == lines
+    assert cache.hits == 2 * len(xmls)
@@ -0,0 +1,61 @@
+import os
+import glob
+import numpy as np
+from tqdm import tqdm
+from functools import partialmethod
+import src.data.xml_extraction as xmle
+from src.data.page_quality import CorpusStats, word_counts, page_word_counts, outliers_per_page, \
+    corpus_poorly_scanned_pages
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+def test_page_word_counts():
+    counts, offsets = page_word_counts([["a b c", "d"], [], ["e f"]])
+    assert counts.tolist() == [3, 1, 2]
+    assert offsets.tolist() == [0, 2, 2, 3]
+
+
+def test_corpus_stats():
+    counts = np.array([3, 1, 4, 1, 5, 9, 2, 6, 5, 3])
+    stats = CorpusStats().update(counts[:3]).update(counts[3:3]).merge(CorpusStats().update(counts[3:]))
+    assert stats.n == len(counts)
+    assert np.isclose(stats.mean, np.mean(counts))
+    assert np.isclose(stats.std, np.std(counts))
+
+
+def test_outliers_per_page():
+    pages = [["a b c d e f g h", "a"], [], ["a b", "a b c d e f g h", "a b c d e f g h"]]
+    counts, offsets = page_word_counts(pages)
+    mean, std = np.mean(counts), np.std(counts)
+    outliers = outliers_per_page(counts, offsets, mean, std, threshold=0.5)
+
+    # the per line z-scores num_outliers_for_page used to count
+    assert outliers.tolist() == [len([x for x in lines if (len(x.split()) - mean) / std > 0.5]) for lines in pages]
+    assert outliers.tolist() == [1, 0, 2]
+    assert [xmle.num_outliers_for_page(lines, std, mean, threshold=0.5) for lines in pages] == [1, 0, 2]
+
+
+def test_get_poorly_scanned_pages():
+    roots = xmle.gen_xml_trees(glob.glob(os.path.join("data", "raw", "BMC_8_*", "*", "*.pxml")))
+    file_names = [label.encode("utf-8") for label in roots]
+
+    assert xmle.get_poorly_scanned_pages(roots, file_names) == []
+    assert xmle.get_poorly_scanned_pages(roots, file_names, max_outliers=4) == ["J_2704_aa_30_8_0111_2"]
+    assert xmle.get_poorly_scanned_pages(roots, file_names, max_outliers=2) == [
+        "J_2704_aa_30_8_0101_2", "J_2704_aa_30_8_0103_2", "J_2704_aa_30_8_0104_2", "J_2704_aa_30_8_0109_2",
+        "J_2704_aa_30_8_0111_2"]
+    assert xmle.get_poorly_scanned_pages(roots, file_names, threshold=1.5, max_outliers=3) == [
+        "J_2704_aa_30_8_0099_2", "J_2704_aa_30_8_0100_2", "J_2704_aa_30_8_0101_2", "J_2704_aa_30_8_0102_2",
+        "J_2704_aa_30_8_0103_2", "J_2704_aa_30_8_0104_2", "J_2704_aa_30_8_0109_2", "J_2704_aa_30_8_0111_2",
+        "J_2704_aa_30_8_0112_2"]
+
+
+def test_corpus_poorly_scanned_pages():
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_10_*", "*", "*.pxml"))
+    vol_lines = list(xmle.iter_vol_lines(xmls))
+    counts = word_counts([line for _, lines in vol_lines for line in lines])
+    threshold = (counts.max() - np.mean(counts)) / np.std(counts) - 0.01  # only the longest lines are outliers
+
+    poorly_scanned = corpus_poorly_scanned_pages([vol_lines], threshold=threshold, max_outliers=0)
+    assert poorly_scanned == [label for label, lines in vol_lines if counts.max() in word_counts(lines)]
@@ -0,0 +1,58 @@
+import os
+import json
+import glob
+import shutil
+from tqdm import tqdm
+from functools import partialmethod
+import src.data.xml_extraction as xmle
+from src import pipeline
+from src.data.instrumentation import default_instrumentation
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+def test_pipeline(tmp_path):
+    for vol_dir in glob.glob(os.path.join("data", "raw", "BMC_10_*")):
+        shutil.copytree(vol_dir, tmp_path / "raw" / os.path.basename(vol_dir))
+    data_root, out_root = str(tmp_path / "raw"), str(tmp_path / "out")
+
+    results = pipeline.run(data_root, [10, 3], out_root)
+    assert [result["status"] for result in results] == ["done", "failed"]
+    assert "Failed to connect" in results[1]["error"]
+    assert results[0]["pages"] == 15
+
+    xmls = glob.glob(os.path.join(data_root, "BMC_10_*", "*", "*.pxml"))
+    lines, xml_track_df = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+    title_shelfmarks, title_indices, o_l = xmle.find_headings(lines)
+    catalogue_entries = xmle.extract_catalogue_entries(o_l, title_indices, title_shelfmarks, xml_track_df)
+    with open(os.path.join(out_root, "BMC_10", "catalogue_entries.csv"), encoding="utf-8") as f:
+        assert f.read() == catalogue_entries.to_csv()
+
+    assert pipeline.main(["--data-root", data_root, "--volumes", "10", "--out", out_root]) == 0
+    with open(os.path.join(out_root, pipeline.report_name), encoding="utf-8") as f:
+        report = json.load(f)
+    assert [(str(result["volume"]), result["status"]) for result in report] == [("10", "unchanged"), ("3", "failed")]
+
+    assert pipeline.main(["--data-root", data_root, "--volumes", "10", "3", "--out", out_root, "--workers", "2"]) == 1
+
+
+def test_process_volume_instrumentation(tmp_path):
+    for vol_dir in glob.glob(os.path.join("data", "raw", "BMC_10_*")):
+        shutil.copytree(vol_dir, tmp_path / "raw" / os.path.basename(vol_dir))
+    data_root, out_root = str(tmp_path / "raw"), str(tmp_path / "out")
+
+    result = pipeline.process_volume(10, data_root, out_root, instrument=True)
+    assert result["status"] == "done" and result["instrumentation"]["stages"]
+    assert not default_instrumentation.enabled and default_instrumentation.stages == {}
+
+    default_instrumentation.enable()
+    default_instrumentation.progress = True
+    try:
+        with default_instrumentation.stage("caller"):
+            result = pipeline.process_volume(10, data_root, out_root, force=True, instrument=True)
+        assert "caller" not in result["instrumentation"]["stages"]
+        assert default_instrumentation.enabled and default_instrumentation.progress
+        assert list(default_instrumentation.stages) == ["caller"]
+    finally:
+        default_instrumentation.disable()
+        default_instrumentation.reset()
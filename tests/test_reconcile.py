@@ -0,0 +1,73 @@
+import os
+import pandas as pd
+import pytest
+from tqdm import tqdm
+from functools import partialmethod
+from src import pipeline
+from src.data.reconcile import (shelfmark_key, read_bll01_index, volume_shelfmarks, reconcile, main,
+                                bll01_columns, reconciliation_dir)
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+@pytest.fixture()
+def out_root(tmp_path):
+    pipeline.run(os.path.join("data", "raw"), [1, 8, 10], str(tmp_path))
+    return str(tmp_path)
+
+
+def test_shelfmark_key():
+    assert shelfmark_key("IA. 52359") == shelfmark_key("IA.52359*") == shelfmark_key("ia 52359") == ("IA.52359", None)
+    assert shelfmark_key("G. 7726. (1. )") == ("G.7726", "1")
+    assert shelfmark_key("MAPS Maps C. 1. d. 3") == ("C.1.D.3", None)
+    assert shelfmark_key("IA. 55330. Fragment: Sheet q2-q6, much mutilated") == ("IA.55330", None)
+    assert shelfmark_key("Not a shelfmark") == (None, None)
+
+
+def test_read_bll01_index(tmp_path):
+    path = os.path.join(tmp_path, "bll01_index.csv")
+    pd.DataFrame({"British Library shelfmark (852 $j)": ["IB. 20307. ; IB. 20297", "C. 9. d. 12"],
+                  "Record IDs (001)": ["001", "002"]}).to_csv(path, index=False, encoding="latin-1")
+    index_df = read_bll01_index(path)
+    assert index_df["record_id"].tolist() == ["001", "001", "002"]
+    assert index_df["shelfmark"].tolist() == ["IB. 20307.", "IB. 20297", "C. 9. d. 12"]
+
+
+def test_reconcile(out_root):
+    entries_df = volume_shelfmarks(out_root)
+    assert sorted(entries_df["volume"].unique()) == [1, 8, 10]
+    shelfmarks = entries_df["shelfmark"].dropna().drop_duplicates().tolist()
+
+    # every shelfmark but the first indexed in another form, the second under two records told apart by copy number
+    records = ([(f"r{i}", sm.replace(" ", "") + "*") for i, sm in enumerate(shelfmarks[2:])]
+               + [("copy1", f"{shelfmarks[1]} (1. )"), ("copy2", f"{shelfmarks[1]} (2. ) ; IA. 99999999")])
+    index_df = pd.DataFrame(records, columns=["record_id", "bll01_shelfmark"])
+    index_df = index_df.assign(shelfmark=index_df["bll01_shelfmark"].str.split(" ; ")).explode("shelfmark")
+
+    result = reconcile(entries_df, index_df)
+    unique = entries_df.groupby("shelfmark")["shelfmark"].transform("size") == 1
+    matched = entries_df[entries_df["shelfmark"].isin(shelfmarks[2:]) & unique]
+    assert set(zip(matched["volume"], matched["vol_entry_num"])) <= \
+        set(zip(result["matched"]["volume"], result["matched"]["vol_entry_num"]))
+    assert shelfmarks[0] in result["unmatched"]["shelfmark"].tolist()
+    assert (result["ambiguous"]["shelfmark"] == shelfmarks[1]).all()
+    assert result["ambiguous"]["record_ids"].apply(sorted).tolist() == [["copy1", "copy2"]] * len(result["ambiguous"])
+    assert result["unmatched_records"]["record_id"].tolist() == ["copy1", "copy2"]
+
+    # with its copy number the entry matches one of them
+    entries_df.loc[entries_df["shelfmark"] == shelfmarks[1], "shelfmark"] = f"{shelfmarks[1]} (2. )"
+    result = reconcile(entries_df, index_df)
+    assert result["ambiguous"].empty
+    assert "copy2" in result["matched"]["record_id"].tolist()
+
+
+def test_main(out_root):
+    shelfmarks = volume_shelfmarks(out_root)["shelfmark"].dropna()
+    path = os.path.join(out_root, "bll01_index.csv")
+    pd.DataFrame({"British Library shelfmark (852 $j)": shelfmarks.drop_duplicates().tolist(),
+                  "Record IDs (001)": [str(i) for i in range(shelfmarks.nunique())]},
+                 columns=list(bll01_columns)).to_csv(path, index=False, encoding="latin-1")
+    assert main([out_root, "--bll01", path]) == 0
+    matched = pd.read_csv(os.path.join(out_root, reconciliation_dir, "matched.csv"))
+    assert len(matched) + len(pd.read_csv(os.path.join(out_root, reconciliation_dir, "ambiguous.csv"))) == \
+        len(shelfmarks)
@@ -0,0 +1,49 @@
+import os
+import glob
+import pandas as pd
+from tqdm import tqdm
+from functools import partialmethod
+import src.data.xml_extraction as xmle
+from src.data.reimport_utils import converters, parse_word_locations, read_entries_csv
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+def test_parse_word_locations():
+    cells = pd.Series([
+        "[[[(311, 1292), (944, 1352)], [(974, 1294), (1281, 1354)]], [], [[(5, 6), (7, 8)]]]",
+        "[[[(1, 2), (3)]]]",  # odd number of coordinates
+        "[[[(1, 2), (3, 4)]]",  # unbalanced
+        None,
+        "[[[(1, 2), (3, 4)]]][]",  # two lists in one cell
+        "[[[(9, 10), (11, 12)]]]",
+    ])
+    word_locations, bad_rows = parse_word_locations(cells)
+
+    assert bad_rows == [1, 2, 3, 4]
+    assert word_locations[0] == [
+        [[(311, 1292), (944, 1352)], [(974, 1294), (1281, 1354)]], [], [[(5, 6), (7, 8)]]
+    ]
+    assert word_locations[1:5] == [None, None, None, None]
+    assert word_locations[5] == [[[(9, 10), (11, 12)]]]
+    assert word_locations[0][0].coords is word_locations[5][0].coords
+
+
+def test_read_entries_csv(tmp_path):
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_8_*", "*", "*.pxml"))
+    lines, xml_track_df = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+    title_shelfmarks, title_indices, o_l = xmle.find_headings(lines)
+    catalogue_entries = xmle.extract_catalogue_entries(o_l, title_indices, title_shelfmarks, xml_track_df)
+    catalogue_entries.to_csv(tmp_path / "catalogue_entries.csv")
+
+    entries, bad_rows = read_entries_csv(tmp_path / "catalogue_entries.csv")
+    converted_entries = pd.read_csv(tmp_path / "catalogue_entries.csv", converters=converters, index_col=0)
+
+    assert not bad_rows
+    assert entries["word_locations"].tolist() == catalogue_entries["word_locations"].tolist()
+    assert entries["xmls"].tolist() == converted_entries["xmls"].tolist()
+    assert entries["xml_start_line"].tolist() == converted_entries["xml_start_line"].tolist()
+
+    # reconstruct_word_coords flattens each word and drops lines without words
+    flattened = [[[c for xy in word for c in xy] for word in line] for line in entries.loc[0, "word_locations"]]
+    assert [x for x in flattened if x] == converted_entries.loc[0, "word_locations"]
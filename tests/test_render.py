@@ -0,0 +1,61 @@
+import os
+from PIL import Image
+from src.visualise.render import RenderCache
+
+
+def make_scan(path, size=(1200, 1800)):
+    Image.new("RGB", size, (250, 250, 250)).save(path, format="JPEG")
+    return str(path)
+
+
+def test_render_cache(tmp_path):
+    scan = make_scan(tmp_path / "page.jpg")
+    cache = RenderCache(tmp_path / "thumbnails", max_items=1)
+
+    thumbnail, full_size = cache.thumbnail(scan)
+    assert thumbnail.size == (200, 300)
+    assert thumbnail.mode == "RGBA"
+    assert full_size == (1200, 1800)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    cache.thumbnail(scan)  # from memory
+    other = make_scan(tmp_path / "other.jpg", (600, 600))
+    cache.thumbnail(other)  # pushes the first out of memory
+    reloaded, reloaded_size = cache.thumbnail(scan)  # from disk
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert reloaded_size == full_size
+    assert reloaded.size == thumbnail.size
+
+    assert RenderCache(tmp_path / "thumbnails").thumbnail(scan)[1] == full_size
+    assert len(os.listdir(tmp_path / "thumbnails")) == 2
+
+
+def test_render(tmp_path):
+    scan = make_scan(tmp_path / "page.jpg")
+    out = RenderCache().render(scan, [([[600, 900, 1200, 1800]], (255, 0, 0, 255))])
+
+    assert out.size == (200, 300)
+    assert out.getpixel((150, 250))[:3] == (255, 0, 0)
+    assert out.getpixel((50, 50))[0] > 240 and out.getpixel((50, 50))[1] > 240
+
+
+def test_render_cache_eviction(tmp_path, monkeypatch):
+    scans = [make_scan(tmp_path / f"page_{i}.jpg", (600, 900)) for i in range(6)]
+    cache = RenderCache(tmp_path / "thumbnails", max_items=1)
+    cache.thumbnail(scans[0])
+    record_bytes = cache._size
+    cache.max_bytes = 3 * record_bytes
+
+    listings = []
+    records = cache._records
+    monkeypatch.setattr(cache, "_records", lambda: listings.append(1) or records())
+    for scan in scans[1:3]:
+        cache.thumbnail(scan)
+    assert not listings  # the running size is kept in memory, the directory is listed only to evict
+    for scan in scans[3:]:
+        cache.thumbnail(scan)
+    assert listings
+
+    on_disk = sum(size for _, size, _ in records())
+    assert cache._size == on_disk <= cache.max_bytes
+    assert len(os.listdir(tmp_path / "thumbnails")) < len(scans)
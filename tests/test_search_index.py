@@ -0,0 +1,79 @@
+import os
+import pytest
+from tqdm import tqdm
+from functools import partialmethod
+from src import pipeline
+from src.data.entry_store import load_entries
+from src.data.incremental import entries_name
+from src.data.search_index import SearchIndex, index_name, normalise_shelfmark, shelfmark_parts, tokenise, main
+
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+@pytest.fixture()
+def out_root(tmp_path):
+    pipeline.run(os.path.join("data", "raw"), [1, 8, 10], str(tmp_path))
+    return str(tmp_path)
+
+
+def _entries(out_root: str) -> list[tuple[int, object]]:
+    return [(vol, load_entries(os.path.join(out_root, f"BMC_{vol}", entries_name))) for vol in [1, 8, 10]]
+
+
+def test_normalise_shelfmark():
+    assert normalise_shelfmark("IA. 52359") == normalise_shelfmark("ia, 52359.") == "IA.52359"
+    assert normalise_shelfmark("IB.44") == normalise_shelfmark("IB 44") == "IB.44"
+    assert normalise_shelfmark("C. 9. d. 12") == "C.9.D.12"
+    assert normalise_shelfmark("G. 10536*") == "G.10536"
+    assert shelfmark_parts("C. 9. d. 12") == ["C", "9", "d", "12"] and shelfmark_parts("(1. )") == ["1"]
+    assert tokenise("Bûch, ARS moriendi.") == ["buch", "ars", "moriendi"]
+
+
+def test_shelfmark(out_root):
+    with SearchIndex(os.path.join(out_root, index_name)) as index:
+        assert index.volumes == [1, 8, 10]
+        assert len(index) == sum(len(entry_df) for _, entry_df in _entries(out_root))
+
+        for vol, entry_df in _entries(out_root):
+            row = entry_df.iloc[3]
+            results = index.shelfmark(row["shelfmark"].replace(" ", "").lower())
+            assert {"volume": vol, "vol_entry_num": row["vol_entry_num"], "shelfmark": row["shelfmark"],
+                    "pages": row["xmls"]} in results
+
+        expected = [(vol, n) for vol, entry_df in _entries(out_root)
+                    for n, sm in zip(entry_df["vol_entry_num"], entry_df["shelfmark"])
+                    if isinstance(sm, str) and normalise_shelfmark(sm).startswith("IA.1")]
+        results = index.shelfmark_prefix("IA. 1")
+        assert [(x["volume"], x["vol_entry_num"]) for x in results] == expected
+        assert len(index.shelfmark_prefix("IA. 1", limit=2)) == min(2, len(expected))
+
+
+def test_search(out_root):
+    with SearchIndex(os.path.join(out_root, index_name)) as index:
+        for query in ["moriendi", "ars moriendi", "printed leaves", "moriend*"]:
+            words = query.split()
+            expected = []
+            for vol, entry_df in _entries(out_root):
+                for n, text in zip(entry_df["vol_entry_num"], entry_df["entry_text"]):
+                    tokens = set(tokenise(text))
+                    if all(any(t.startswith(w[:-1]) for t in tokens) if w.endswith("*") else w in tokens
+                           for w in words):
+                        expected.append((vol, n))
+            assert expected
+            assert [(x["volume"], x["vol_entry_num"]) for x in index.search(query)] == expected
+        assert index.search("") == []
+
+
+def test_refresh(out_root):
+    path = os.path.join(out_root, index_name)
+    with SearchIndex(path) as index:
+        assert index.refresh(out_root) == {"updated": [], "removed": []}
+
+        index.add_volume(3, _entries(out_root)[0][1])
+        os.remove(os.path.join(out_root, "BMC_8", entries_name))
+        assert index.refresh(out_root) == {"updated": [], "removed": [3, 8]}
+        assert index.volumes == [1, 10]
+        assert all(x["volume"] != 8 for x in index.search("moriend*"))
+
+    assert main([out_root, "--shelfmark", "IA. 99999999"]) == 1
+    assert main([out_root, "--prefix", "IA"]) == 0
@@ -77,3 +77,17 @@ def test_re_performance():
     assert c_sm_check == known_c_sm_errors
     assert g_sm_check == known_g_sm_errors
     assert i_sm_check == known_i_sm_errors
+
+
+def test_find_shelfmarks_index():
+    # the index find_headings works from must agree with find_shelfmark line by line
+    lines = ("(" + bll01_index_df["bll01_shelfmark"]).tolist()
+    assert xmle.find_shelfmarks(lines) == [xmle.find_shelfmark(x) for x in lines]
+
+
+def test_find_shelfmark_prefilter():
+    # skipping lines without a candidate must find exactly what running every regex on every line does
+    shelfmarks = bll01_index_df["bll01_shelfmark"].tolist()
+    for lines in [shelfmarks, ["(" + x for x in shelfmarks]]:
+        assert [xmle.find_shelfmark(x) for x in lines] == [
+            xmle._find_shelfmark(x, [xmle.i_re, xmle.g_re, xmle.c_re]) for x in lines]
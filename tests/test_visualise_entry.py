@@ -0,0 +1,47 @@
+import os
+import pandas as pd
+from src.visualise.entry import gen_page_entries_lookup
+
+
+def test_gen_page_entries_lookup():
+    a, b, c, d, e = [[[(1, 2), (3, 4)]]], [[[(5, 6), (7, 8)]]], [], [[[(9, 9), (9, 9)]]], [[[(0, 1), (2, 3)]]]
+    df = pd.DataFrame(data={"xmls": [["J_2704_aa_30_8_0098_4"], ["J_2704_aa_30_8_0098_4", "J_2704_aa_30_8_0099_2"],
+                                     ["J_2704_aa_30_8_0099_2"]],
+                            "xml_start_line": [[1], [1, 2], [2]],
+                            "word_locations": [[a], [b, c], [d, e]]})
+    lookup = gen_page_entries_lookup(df)
+
+    assert lookup.index.tolist() == [1, 2]
+    assert lookup["xml"].tolist() == ["J_2704_aa_30_8_0098_4", "J_2704_aa_30_8_0099_2"]
+    assert lookup["word_locs"].tolist() == [[[a], [b]], [[c], [d, e]]]
+    assert lookup["n_entries"].tolist() == [2, 2]
+
+
+def test_render_volume(tmp_path, monkeypatch):
+    from PIL import Image
+    import src.visualise.image_registry as image_registry
+    from src.visualise.batch import render_volume
+
+    monkeypatch.setattr(image_registry, "cache_dir", str(tmp_path / "cache"))
+
+    for page in ["0001", "0002", "0003"]:
+        os.makedirs(tmp_path / "raw" / "BMC_3_2" / "1", exist_ok=True)
+        Image.new("RGB", (600, 900), (250, 250, 250)).save(tmp_path / "raw" / "BMC_3_2" / "1" / f"J_2704_aa_30_3_{page}.jpg")
+
+    line = [[(0, 0), (300, 450)]]
+    df = pd.DataFrame(data={"xmls": [["J_2704_aa_30_3_0001_2"], ["J_2704_aa_30_3_0002_2", "J_2704_aa_30_3_0003_2"]],
+                            "xml_start_line": [[1], [1, 2]],
+                            "word_locations": [[line], [line, [[0, 0, 300, 450]]]]})
+    lookup = gen_page_entries_lookup(df)
+
+    out_paths = render_volume(lookup, tmp_path / "pages", tmp_path / "raw", ext=".png")
+    assert [os.path.basename(x) for x in out_paths] == [f"J_2704_aa_30_3_{page}_2.png" for page in ["0001", "0002", "0003"]]
+    with Image.open(out_paths[0]) as im:
+        assert im.size == (100, 150)
+        assert im.getpixel((10, 10)) != im.getpixel((90, 140))
+
+    out_paths = render_volume(lookup, tmp_path / "sheets", tmp_path / "raw", workers=2, sheet_pages=2)
+    assert [os.path.basename(x) for x in out_paths] == ["J_2704_aa_30_3_0001_2-J_2704_aa_30_3_0002_2.jpg",
+                                                        "J_2704_aa_30_3_0003_2.jpg"]
+    with Image.open(out_paths[0]) as im:
+        assert im.size == (200, 150)
@@ -0,0 +1,57 @@
+import numpy as np
+from src.data.word_coords import WordCoords, LinePoints
+import src.data.xml_extraction as xmle
+
+nested = [
+    [[(311, 1292), (944, 1352)], [(974, 1294), (1281, 1354)]],
+    [],
+    [[(5, 6), (7, 8)]],
+]
+
+
+def test_from_nested():
+    coords = WordCoords.from_nested(nested)
+
+    assert len(coords) == 3
+    assert coords.points.dtype == np.int32
+    assert coords.points.shape == (6, 2)
+    assert coords.line_offsets.tolist() == [0, 2, 2, 3]
+    assert coords.word_offsets.tolist() == [0, 2, 4, 6]
+    assert [coords.tolist(i) for i in range(3)] == nested
+
+
+def test_line_points():
+    coords = WordCoords.from_nested(nested)
+    points = coords.line(0)
+
+    assert len(points) == 2
+    assert points == nested[0]
+    assert points[1] == [(974, 1294), (1281, 1354)]
+    assert list(points) == nested[0]
+    assert repr(points) == repr(nested[0])
+    assert repr(coords.line(1)) == "[]"
+    assert points.boxes().tolist() == [[311, 1292, 944, 1352], [974, 1294, 1281, 1354]]
+    assert coords.boxes(0, 3).tolist() == [[311, 1292, 944, 1352], [974, 1294, 1281, 1354], [5, 6, 7, 8]]
+
+
+def test_from_lines():
+    page_1 = WordCoords.from_nested(nested)
+    page_2 = WordCoords.from_nested(nested[::-1])
+    lines = [xmle.TextLine("a", page_1, i) for i in range(3)] + [xmle.TextLine("b", page_2, i) for i in range(3)]
+    lines.append(xmle.TextLine("no coords"))
+
+    coords = WordCoords.from_lines(lines)
+
+    assert len(coords) == 7
+    assert [coords.tolist(i) for i in range(7)] == nested + nested[::-1] + [[]]
+
+
+def test_text_line():
+    line = xmle.TextLine("Test line 1")
+    assert line.points is None
+    assert not hasattr(line, "__dict__")
+
+    line.points = nested[0]
+    assert isinstance(line.points, LinePoints)
+    assert line.points == nested[0]
+    assert line == "Test line 1"
@@ -2,10 +2,12 @@ import src.data.xml_extraction as xmle
 from xml.etree import ElementTree as ET
 import os
 import glob
+import random
 import pytest
 from numpy import nan, array_equal
 from tqdm import tqdm
 from functools import partialmethod
+from benchmarks.synthetic_xml import generate_volume
 
 tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
 
@@ -20,21 +22,59 @@ def xml_roots():
     return {k: xml_roots[k] for k in sorted(xml_roots)}
 
 
-def test_gen_xml_paths():
-    xmls_2, xmls_4 = xmle.gen_xml_paths("tests\\BMC_3_2\\*.pxml"), xmle.gen_xml_paths("tests\\BMC_3_4\\*.pxml")
-    assert xmls_2[0] == "tests\\BMC_3_2\\J_2704_aa_30_3_0052.pxml"
-    assert xmls_4[0] == "tests\\BMC_3_4\\J_2704_aa_30_3_0053.pxml"
+@pytest.fixture()
+def synthetic_xmls(tmp_path):
+    xmls, _ = generate_volume(tmp_path, 2, vol=3, first_page=52, n_regions=[2, 4])
+    return xmls
+
+
+def test_gen_xml_paths(tmp_path, synthetic_xmls):
+    xmls_2 = xmle.gen_xml_paths(os.path.join(tmp_path, "BMC_3_2", "*", "*.pxml"))
+    xmls_4 = xmle.gen_xml_paths(os.path.join(tmp_path, "BMC_3_4", "*", "*.pxml"))
+    assert xmls_2 == [synthetic_xmls[0]]
+    assert xmls_4 == [synthetic_xmls[1]]
+    assert os.path.basename(xmls_2[0]) == "J_2704_aa_30_3_0052.pxml"
+    assert os.path.basename(xmls_4[0]) == "J_2704_aa_30_3_0053.pxml"
 
 
-def test_gen_xml_trees():
-    xml_2 = ["tests\\BMC_3_2\\J_2704_aa_30_3_0052.pxml"]
-    xml_4 = ["tests\\BMC_3_4\\J_2704_aa_30_3_0053.pxml"]
-    roots = xmle.gen_xml_trees(xml_2 + xml_4)
+def test_gen_xml_trees(synthetic_xmls):
+    roots = xmle.gen_xml_trees(synthetic_xmls[::-1])
     assert len(roots) == 2
     assert list(roots.keys()) == ["J_2704_aa_30_3_0052_2", "J_2704_aa_30_3_0053_4"]
     assert type(roots["J_2704_aa_30_3_0052_2"]) == ET.Element
 
 
+def test_synthetic_volume_headings(tmp_path):
+    xmls, shelfmarks = generate_volume(tmp_path, 12, four_region_fraction=0.5, seed=1)
+    lines, xml_track_df = xmle.extract_lines_for_vol(xmle.gen_xml_trees(xmls))
+    title_shelfmarks, title_indices, ordered_lines = xmle.find_headings(lines)
+
+    assert title_shelfmarks == shelfmarks
+    assert {xml.split(os.sep)[-3] for xml in xmls} == {"BMC_3_2", "BMC_3_4"}
+    assert lines == xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))[0]
+
+
+def test_gen_xml_trees_workers():
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_10_*", "*", "*.pxml"))
+    roots = xmle.gen_xml_trees(xmls)
+    pool_roots = xmle.gen_xml_trees(xmls, workers=2)
+
+    assert list(pool_roots.keys()) == list(roots.keys())
+    assert list(roots.keys())[:2] == ["J_2740_aa_30_10_0118_2", "J_2740_aa_30_10_0119_2"]
+    assert list(roots.keys())[5] == "J_2740_aa_30_10_0124_4"
+    assert all(ET.tostring(pool_roots[k]) == ET.tostring(roots[k]) for k in roots)
+
+
+def test_gen_xml_lines():
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_10_*", "*", "*.pxml"))
+    all_lines, xml_track_df = xmle.extract_lines_for_vol(xmle.gen_xml_trees(xmls))
+    pool_lines, pool_xml_track_df = xmle.extract_lines_for_vol(xmle.gen_xml_lines(xmls, workers=2))
+
+    assert pool_lines == all_lines
+    assert [x.points for x in pool_lines] == [x.points for x in all_lines]
+    assert pool_xml_track_df.equals(xml_track_df)
+
+
 def test_extract_lines(xml_roots):
     lines = xmle.extract_lines(xml_roots["small_xml_example_1"])
 
@@ -51,12 +91,47 @@ def test_extract_lines_text_region_order():
     assert ordered_lines[3] == "Test line 4"
 
 
+def test_iter_page_lines():
+    for xml in ["4_TextRegion_xml_example.xml", "title_xml_example_1.xml"]:
+        root = ET.parse(os.path.join("tests", xml)).getroot()
+        lines = xmle.extract_lines(root)
+        streamed_lines = list(xmle.iter_page_lines(os.path.join("tests", xml)))
+
+        assert streamed_lines == lines
+        assert [x.points for x in streamed_lines] == [x.points for x in lines]
+
+
+def test_iter_vol_lines():
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_10_*", "*", "*.pxml"))
+    all_lines, xml_track_df = xmle.extract_lines_for_vol(xmle.gen_xml_trees(xmls))
+    streamed_lines, streamed_xml_track_df = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+
+    assert streamed_lines == all_lines
+    assert [x.points for x in streamed_lines] == [x.points for x in all_lines]
+    assert streamed_xml_track_df.equals(xml_track_df)
+
+    page_lines = xmle.iter_page_lines(os.path.join("tests", "title_xml_example_1.xml"))
+    title_shelfmarks, title_indices, o_l = xmle.find_headings(page_lines)
+    assert title_shelfmarks == ["IA. 123", "IA. 789"]
+
+
 def test_extract_lines_for_vol(xml_roots):
     all_lines, xml_track_df = xmle.extract_lines_for_vol(xml_roots)
 
     assert len(all_lines) == 6
     assert all_lines[-1] == "Test line 6"
 
+    assert all(x.coords is all_lines[0].coords for x in all_lines)  # one coordinate array for the volume
+    assert [x.index for x in all_lines] == list(range(6))
+
+    # the lines given are left viewing their own page's coordinates, so extracting them again gives the same volume
+    page_lines = [(xml, xmle.extract_lines(root)) for xml, root in xml_roots.items()]
+    page_points = [[x.points for x in lines] for _, lines in page_lines]
+    again, _ = xmle.extract_lines_for_vol(page_lines)
+    assert xmle.extract_lines_for_vol(page_lines)[0] == again == all_lines
+    assert [[x.points for x in lines] for _, lines in page_lines] == page_points
+    assert all(x.index == i for _, lines in page_lines for i, x in enumerate(lines))
+
     assert xml_track_df.shape == (6, 2)  # must be same length as all_lines
     assert xml_track_df['xml'].tolist() == [
         "small_xml_example_1", "small_xml_example_1", "small_xml_example_1",
@@ -90,6 +165,26 @@ def test_find_shelfmark():
     assert not bad_caps
 
 
+def test_find_shelfmark_prefilter():
+    # strings of the pieces of shelfmarks, so candidates that don't match are common
+    rng = random.Random(0)
+    pieces = ["I", "IA", "IB", "IC", " G", "(G", " C", "C", " C. 9. d", "(C.44.a", ".", ". ", ",", "12", "3", "a", "d",
+              "-", "*", "(", ")", " ", "\n", "\u201c"]
+    titles = ["".join(rng.choice(pieces) for _ in range(rng.randint(1, 12))) for _ in range(20000)]
+    titles += ["bound copy G. 10536.", "(IA. 22) and C. 9. d. 12", "xIA. 1 IB. 2", "NOTHING (C.44.a.1)."]
+    expected = [xmle._find_shelfmark(x, [xmle.i_re, xmle.g_re, xmle.c_re]) for x in titles]
+    assert [xmle.find_shelfmark(x) for x in titles] == expected
+    assert all(sum(x is not None and x[0] == letter for x in expected) > 10 for letter in "IGC")
+
+
+def test_find_shelfmarks(lines):
+    line_shelfmarks = xmle.find_shelfmarks(lines)
+
+    assert len(line_shelfmarks) == len(lines)
+    assert line_shelfmarks == [xmle.find_shelfmark(x) for x in lines]
+    assert [x for x in line_shelfmarks if x] == ["IA. 123", "IA. 456", "IA. 789", "IA. 353"]
+
+
 def test_date_check():
     date_check = xmle.date_check("1409")
     untitled_check = xmle.date_check("Undated")
@@ -151,6 +246,17 @@ def test_find_headings(xml_roots, lines, titles, indices):
     assert len(o_l) == 13
     assert (o_l[0], o_l[1], o_l[-1]) == ("Bought in 1456", "IA. 123.", "some line text")
 
+    # a precomputed shelfmark index gives the same headings
+    assert xmle.find_headings(lines, xmle.find_shelfmarks(lines)) == (title_shelfmarks, indices, o_l)
+
+
+def test_page_offsets(xml_roots):
+    all_lines, xml_track_df = xmle.extract_lines_for_vol(xml_roots)
+    offsets, labels = xmle.page_offsets(xml_track_df)
+
+    assert offsets.tolist() == [0, 3, 6]
+    assert labels == ["small_xml_example_1", "small_xml_example_2"]
+
 
 def test_extract_catalogue_entries():
     root_1 = ET.parse("tests\\title_xml_example_1.xml").getroot()
@@ -181,12 +287,36 @@ def test_extract_catalogue_entries():
     assert catalogue_entries["xml_start_line"].to_list() == [[6], [3], [2, 4]]
 
 
-def test_generate_xml(): # TODO update once generate_xml has been updated
-    pass
-    # in_xml = ET.parse("tests\\title_xml_example_1.xml")
-    # root = in_xml.getroot()
-    # all_lines = xmle.extract_lines(root)
-    # title, all_title_indices, o_l = xmle.find_headings(all_lines)
+def test_generate_xml(tmp_path):
+    lines = ["IA. 1", "HEADING ONE", "line 1", "line 2", "IA. 2", "line 3", "IB. 3", "HEADING", "THREE"]
+    title_indices = [[0, 1], [4], [6, 7, 8]]
+    out_xml = xmle.generate_xml(lines, title_indices, ["", "IA. 2", "IB. 3"])
+
+    entries = out_xml.getElementsByTagName("catalogue_entry")
+    assert [x.getAttribute("SHELFMARK") for x in entries] == ["IA. 2", "IB. 3"]
+    assert [x.getAttribute("HEADING") for x in entries] == ["IA. 1HEADING ONE", "IA. 2"]
+    # lines start from a heading's second line, or after a heading of one line
+    assert [[line.getAttribute("CONTENT") for line in x.getElementsByTagName("line")] for x in entries] == \
+           [["HEADING ONE", "line 1", "line 2"], ["line 3"]]
+
+    xmle.save_xml(lines, title_indices, ["", "IA. 2", "IB. 3"], str(tmp_path))
+    with open(tmp_path / "headings.xml", encoding="utf-8") as f:
+        assert f.read() == out_xml.toprettyxml(indent="\t")
+
 
-    # out_xml = xmle.generate_xml(all_title_indices, all_lines, )
 
+def test_save_xml(tmp_path):
+    xmls = glob.glob(os.path.join("data", "raw", "BMC_10_*", "*", "*.pxml"))
+    lines, xml_track_df = xmle.extract_lines_for_vol(xmle.iter_vol_lines(xmls))
+    title_shelfmarks, title_indices, o_l = xmle.find_headings(lines)
+    o_l[title_indices[1][1]] = xmle.TextLine('Escaped & <"quoted">')
+
+    xmle.save_xml(o_l, title_indices, title_shelfmarks, str(tmp_path / "lines"))
+    with open(tmp_path / "lines" / "headings.xml", encoding="utf-8") as f:
+        headings_xml = f.read()
+    assert headings_xml == xmle.generate_xml(o_l, title_indices, title_shelfmarks).toprettyxml(indent="\t")
+
+    catalogue_entries = xmle.extract_catalogue_entries(o_l, title_indices, title_shelfmarks, xml_track_df)
+    xmle.save_entries_xml(catalogue_entries, str(tmp_path / "df"))
+    with open(tmp_path / "df" / "headings.xml", encoding="utf-8") as f:
+        assert f.read() == headings_xml